@@ -0,0 +1,72 @@
+"""
+Benchmark: model-validated request path vs. the fast decoding path.
+
+For a tiled scenario of N events (see bench_json_to_nl_log.build_log), times
+and measures peak Python memory (tracemalloc) for:
+- model: parse JSON -> LogInput validation -> entry.dict() -> convert
+- fast:  convert_log_body on the raw bytes (parse -> LogEvent -> convert, GC paused)
+Decoding and conversion are reported separately. Memory is measured in a
+second, traced run so tracing does not skew the timings.
+
+Usage (from the backend directory):
+    python bench_event_decoding.py
+    python bench_event_decoding.py --scenario ../scenario1.json --size 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from bench_json_to_nl_log import build_log
+from converter import NLLogConverter
+from event_decoding import decode_log_body, orjson, paused_gc
+from main import LogInput
+
+
+def model_path(raw: bytes) -> Tuple[float, float]:
+    start = time.perf_counter()
+    log_input = LogInput(**json.loads(raw))
+    log_entries = [entry.dict() for entry in log_input.log_data]
+    decoded = time.perf_counter()
+    NLLogConverter().convert(log_entries)
+    return decoded - start, time.perf_counter() - decoded
+
+def fast_path(raw: bytes) -> Tuple[float, float]:
+    """Mirrors converter.convert_log_body, timing the two stages."""
+    with paused_gc():
+        start = time.perf_counter()
+        events, _ = decode_log_body(raw)
+        decoded = time.perf_counter()
+        NLLogConverter().convert_events(events)
+        return decoded - start, time.perf_counter() - decoded
+
+def peak_memory_mb(path: Callable[[bytes], Any], raw: bytes) -> float:
+    tracemalloc.start()
+    path(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def run(scenario_path: str, size: int, repeat: int) -> None:
+    with open(scenario_path) as f:
+        scenario = json.load(f)
+    log_data: List[Dict[str, Any]] = build_log(scenario, size)
+    raw = json.dumps({"log_data": log_data}).encode("utf-8")
+    print(f"{size} events, {len(raw) / 1e6:.1f} MB body, JSON parser: {'orjson' if orjson else 'json'}\n")
+
+    print(f"{'path':<8} {'decode s':>10} {'convert s':>10} {'total s':>10} {'us/event':>10} {'peak MB':>10}")
+    for name, path in (("model", model_path), ("fast", fast_path)):
+        decode_s, convert_s = min((path(raw) for _ in range(repeat)), key=sum)
+        total = decode_s + convert_s
+        print(f"{name:<8} {decode_s:>10.3f} {convert_s:>10.3f} {total:>10.3f} {total / size * 1e6:>10.2f} {peak_memory_mb(path, raw):>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare model-validated and fast-path log decoding.")
+    parser.add_argument("--scenario", default="../scenario4.json")
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N timed runs per path")
+    args = parser.parse_args()
+    run(args.scenario, args.size, args.repeat)
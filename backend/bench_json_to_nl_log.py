@@ -0,0 +1,67 @@
+"""
+Benchmark for the /json_to_nl_log conversion.
+
+Tiles a scenario file end-to-end (shifting timestamps) until the requested
+event count is reached, then times the conversion at each size so the
+growth rate can be eyeballed. Per-rule timings for the largest size are
+printed afterwards to show which mistake rules are hot.
+
+Usage (from the backend directory):
+    python bench_json_to_nl_log.py
+    python bench_json_to_nl_log.py --scenario ../scenario1.json --sizes 1000 10000 100000
+"""
+import argparse
+import copy
+import json
+import time
+from typing import Any, Dict, List
+
+from converter import NLLogConverter
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+
+def build_log(scenario: List[Dict[str, Any]], size: int) -> List[Dict[str, Any]]:
+    """Repeats the scenario's non-SETUP events after a single SETUP until `size` events exist."""
+    setup = [e for e in scenario if e["event_type"] == "SETUP"][:1]
+    body = [e for e in scenario if e["event_type"] != "SETUP"]
+    span = max(e["timestamp"] for e in scenario) + 1
+
+    log_data = list(setup)
+    offset = 0
+    while len(log_data) < size:
+        for event in body:
+            if len(log_data) >= size:
+                break
+            shifted = copy.copy(event)
+            shifted["timestamp"] = event["timestamp"] + offset
+            log_data.append(shifted)
+        offset += span
+    return log_data
+
+
+def run(scenario_path: str, sizes: List[int]) -> None:
+    with open(scenario_path) as f:
+        scenario = json.load(f)
+
+    print(f"{'events':>10} {'seconds':>10} {'us/event':>10}")
+    converter = None
+    for size in sizes:
+        log_data = build_log(scenario, size)
+        converter = NLLogConverter()
+        start = time.perf_counter()
+        converter.convert(log_data)
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {elapsed:>10.3f} {elapsed / size * 1e6:>10.2f}")
+
+    print(f"\n{'rule':<24} {'calls':>10} {'seconds':>10}")
+    for name, (calls, seconds) in converter.rule_timings.items():
+        print(f"{name:<24} {calls:>10} {seconds:>10.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark json_to_nl_log conversion time vs. log size.")
+    parser.add_argument("--scenario", default="../scenario4.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    args = parser.parse_args()
+    run(args.scenario, args.sizes)
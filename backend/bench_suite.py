@@ -0,0 +1,282 @@
+"""
+Benchmark suite for the conversion and /generate paths, with saved baselines.
+
+- conversion: for each size, a synthetic sortie (sortie_generator) is
+  converted through the request fast path (convert_log_body) several times
+  in a fresh process. Reports throughput, p50/p99 latency and peak RSS
+  (plus growth over the RSS with the request body loaded).
+- generate: starts mock_anthropic and the API with uvicorn on free ports,
+  then sends concurrent uncached /generate requests carrying a converted
+  sortie. Reports end-to-end p50/p99 latency and throughput.
+
+Results can be saved as a baseline and later runs compared against it;
+any metric more than --tolerance worse than the baseline is reported as a
+regression and the exit code is 1. With --rounds N the whole suite runs N
+times and every metric is the median across rounds, which keeps single
+noisy runs out of both baselines and comparisons. Baselines are
+machine-specific, so compare runs from the same host.
+
+Usage (from the backend directory):
+    python bench_suite.py                                  # run and compare with bench_baselines.json
+    python bench_suite.py --rounds 5 --save-baseline bench_baselines.json
+    python bench_suite.py --sizes 1000 10000 --skip-generate
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+import httpx
+
+from sortie_generator import generate_sortie
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, "bench_baselines.json")
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Metrics compared against the baseline (all "lower is better")
+COMPARED_METRICS = {
+    "conversion": ("p50_ms", "p99_ms", "peak_rss_mb"),
+    "generate": ("p50_ms", "p99_ms"),
+}
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000,
+    }
+
+def max_rss_mb() -> float:
+    """
+    Peak RSS of this process. Linux carries ru_maxrss over from the parent
+    across spawn, so the worker would report the generator's peak; VmHWM
+    starts afresh at exec.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KB on Linux
+
+
+# --- Conversion ---
+
+def conversion_worker(body_path: str, repeats: int) -> Dict[str, Any]:
+    """Runs in a fresh process so peak RSS belongs to this size alone."""
+    from converter import convert_log_body
+
+    with open(body_path, "rb") as f:
+        raw = f.read()
+    loaded_rss = max_rss_mb()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        convert_log_body(raw)
+        latencies.append(time.perf_counter() - start)
+    return {**latency_summary(latencies), "repeats": repeats, "peak_rss_mb": max_rss_mb(), "rss_growth_mb": max_rss_mb() - loaded_rss}
+
+def bench_conversion(sizes: List[int], seed: int) -> Dict[str, Any]:
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            body_path = os.path.join(tmp, f"body_{size}.json")
+            with open(body_path, "w") as f:
+                json.dump({"log_data": generate_sortie(size, seed)}, f)
+            repeats = max(3, 100_000 // size)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                result = pool.submit(conversion_worker, body_path, repeats).result()
+            result["events_per_second"] = size / (result["p50_ms"] / 1000)
+            results[str(size)] = result
+            print(f"conversion {size:>9} events: p50 {result['p50_ms']:9.1f} ms  p99 {result['p99_ms']:9.1f} ms  "
+                  f"{result['events_per_second']:10.0f} events/s  peak RSS {result['peak_rss_mb']:7.1f} MB")
+    return results
+
+
+# --- /generate against the mock LLM ---
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(app: str, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+async def wait_until_up(client: httpx.AsyncClient, url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.get(url)
+            return
+        except httpx.TransportError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.2)
+
+async def drive_generate(api_url: str, mock_url: str, user_text: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    failures = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=300, limits=httpx.Limits(max_connections=concurrency)) as client:
+        await wait_until_up(client, mock_url + "/state")
+        await wait_until_up(client, api_url + "/")
+
+        async def one(index: int) -> None:
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(api_url + "/generate", json={
+                    "user_text": f"{user_text}\n(run {index})", "bypass_cache": True,
+                })
+                latencies.append(time.perf_counter() - start)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(requests)))
+        elapsed = time.perf_counter() - start
+    return {**latency_summary(latencies), "requests": requests, "concurrency": concurrency, "failures": failures, "requests_per_second": requests / elapsed}
+
+def bench_generate(requests: int, concurrency: int, mock_delay: float, log_events: int, seed: int) -> Dict[str, Any]:
+    from converter import NLLogConverter
+
+    user_text = "\n".join(NLLogConverter().convert(generate_sortie(log_events, seed)))
+    mock_port, api_port = free_port(), free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        mock = start_server("mock_anthropic:app", mock_port, {"MOCK_DELAY": str(mock_delay)})
+        api = start_server("main:app", api_port, {
+            "ANTHROPIC_API_KEY": "bench",
+            "ANTHROPIC_API_URL": f"http://127.0.0.1:{mock_port}/v1/messages",
+            "RESPONSE_CACHE_PATH": os.path.join(tmp, "response_cache.sqlite3"),
+            "JOB_QUEUE_PATH": os.path.join(tmp, "job_queue.sqlite3"),
+            "MISTAKE_INDEX_PATH": os.path.join(tmp, "mistake_index.sqlite3"),
+            "LIVE_SESSION_PATH": os.path.join(tmp, "live_sessions.sqlite3"),
+            "TTP_INDEX_CACHE_DIR": os.path.join(tmp, "ttp_index_cache"),
+            "VIDEO_INDEX_CACHE_DIR": os.path.join(tmp, "video_index_cache"),
+        })
+        try:
+            result = asyncio.run(drive_generate(f"http://127.0.0.1:{api_port}", f"http://127.0.0.1:{mock_port}", user_text, requests, concurrency))
+        finally:
+            for process in (api, mock):
+                process.terminate()
+                process.wait(timeout=10)
+    result.update({"mock_delay_s": mock_delay, "log_events": log_events})
+    print(f"generate   {requests} requests x{concurrency}: p50 {result['p50_ms']:9.1f} ms  p99 {result['p99_ms']:9.1f} ms  "
+          f"{result['requests_per_second']:8.1f} req/s  failures {result['failures']}")
+    return result
+
+
+# --- Baselines ---
+
+def median_results(rounds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-metric median across rounds with the same structure; other values come from the first round."""
+    merged: Dict[str, Any] = {}
+    for key, value in rounds[0].items():
+        if isinstance(value, dict):
+            merged[key] = median_results([results[key] for results in rounds])
+        elif isinstance(value, float):
+            merged[key] = statistics.median(results[key] for results in rounds)
+        else:
+            merged[key] = value
+    return merged
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Returns a description of every metric more than `tolerance` worse than the baseline."""
+    regressions = []
+    for section, metrics in COMPARED_METRICS.items():
+        current, previous = results.get(section), baseline.get(section)
+        if not current or not previous:
+            continue
+        if section == "conversion":
+            pairs = [(f"{section} {size} events", current[size], previous[size]) for size in current if size in previous]
+        else:
+            pairs = [(section, current, previous)]
+        for label, now, before in pairs:
+            for metric in metrics:
+                if before.get(metric) and now[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(f"{label} {metric}: {now[metric]:.1f} vs baseline {before[metric]:.1f} (+{now[metric] / before[metric] - 1:.0%})")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark conversion and /generate, and compare against saved baselines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-generate", action="store_true")
+    parser.add_argument("--requests", type=int, default=200, help="/generate requests to send")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mock-delay", type=float, default=0.2, help="Mock LLM response time in seconds")
+    parser.add_argument("--log-events", type=int, default=2_000, help="Size of the sortie sent to /generate")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline to compare against")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging a regression")
+    parser.add_argument("--rounds", type=int, default=1, help="Run the suite this many times and use per-metric medians")
+    args = parser.parse_args()
+
+    rounds = []
+    for round_number in range(1, args.rounds + 1):
+        if args.rounds > 1:
+            print(f"--- round {round_number}/{args.rounds} ---")
+        current: Dict[str, Any] = {"conversion": bench_conversion(args.sizes, args.seed)}
+        if not args.skip_generate:
+            current["generate"] = bench_generate(args.requests, args.concurrency, args.mock_delay, args.log_events, args.seed)
+        rounds.append(current)
+    results: Dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "seed": args.seed, "rounds": args.rounds, "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        **median_results(rounds),
+    }
+    if args.rounds > 1:
+        for size, result in results["conversion"].items():
+            print(f"median conversion {size:>9} events: p50 {result['p50_ms']:9.1f} ms  p99 {result['p99_ms']:9.1f} ms  peak RSS {result['peak_rss_mb']:7.1f} MB")
+        if "generate" in results:
+            print(f"median generate: p50 {results['generate']['p50_ms']:9.1f} ms  p99 {results['generate']['p99_ms']:9.1f} ms")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,670 @@
+"""
+Request-scoped conversion of JSON wargame logs into natural language.
+
+Each NLLogConverter owns its asset table and mistake-rule state, so
+concurrent conversions never share data. The module deliberately has no
+FastAPI dependency so convert_log can run inside worker processes.
+
+Events are dispatched by (event_type, subtype), where the subtype is the
+action_type or status_type for event types that have one:
+- FORMATTERS maps each key to the function producing the event description.
+- RULES lists the mistake checks; each rule declares the keys it subscribes
+  to and only runs for those events, appending its annotation if any.
+Positions from SETUP, MOVEMENT and DETECTION events are recorded in the
+converter's TrackStore before the rules run, so rules can query 3D geometry
+over the sortie so far (own assets only if a rule lists them in
+`tracked_assets`).
+"""
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from event_decoding import LogEvent, decode_log_body, paused_gc
+from track_store import ClosestApproach, TrackStore, distance_nm, position_tuple
+
+logger = logging.getLogger("bane.converter")
+
+
+# --- Helper Functions for Natural Language Conversion ---
+
+def format_time(seconds: int) -> str:
+    """Converts seconds to hh:mm:ss format."""
+    h = seconds // 3600
+    m = (seconds % 3600) // 60
+    s = seconds % 60
+    return f"{h:02d}h{m:02d}m{s:02d}s"
+
+
+# --- Event keys ---
+
+EventKey = Tuple[str, Optional[str]]
+
+# Field in `details` that selects the formatter within an event type
+SUBTYPE_FIELDS = {
+    "PLAYER_ACTION": "action_type",
+    "COMBAT": "action_type",
+    "STATUS_CHANGE": "status_type",
+}
+
+def event_key(event_type: str, details: Dict[str, Any]) -> EventKey:
+    """Returns the (event_type, subtype) dispatch key for an event."""
+    subtype_field = SUBTYPE_FIELDS.get(event_type)
+    return (event_type, details.get(subtype_field) if subtype_field else None)
+
+
+# --- Formatter registry ---
+
+# (event_type, subtype) -> formatter. A subtype of None is the fallback for the event type.
+# Formatters return the event description, or None if the event should not be logged.
+Formatter = Callable[["NLLogConverter", int, Dict[str, Any]], Optional[str]]
+FORMATTERS: Dict[EventKey, Formatter] = {}
+
+def formatter(event_type: str, subtype: str | None = None):
+    """Registers the decorated function as the formatter for (event_type, subtype)."""
+    def register(func: Formatter) -> Formatter:
+        FORMATTERS[(event_type, subtype)] = func
+        return func
+    return register
+
+
+@formatter("SETUP")
+def format_setup(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    converter.asset_lookup = {asset['id']: asset for asset in details.get('blue_forces', [])}
+    converter.scenario_name = details.get("scenario_name")
+    if not converter.asset_lookup:
+        return "WARNING: SETUP event missing blue_forces list."
+
+    blue_desc = ", ".join([converter.get_asset_name(a['id']) for a in details.get('blue_forces', [])])
+    objectives = "; ".join(details.get('mission_objectives', ["Not Specified"]))
+    return f"Mission Start. Blue Forces: {blue_desc}. Objectives: {objectives}."
+
+
+def player_action_context(converter: "NLLogConverter", details: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    """Returns (actor_id, target_str, params) shared by all PLAYER_ACTION formatters."""
+    actor_id = details.get("actor_id", "Player") # Assuming player actions might have an actor ID
+    targets = [converter.get_asset_name(tid) for tid in details.get("target_ids", [])]
+    target_str = ", ".join(targets) if targets else "N/A"
+    return actor_id, target_str, details.get("parameters", {})
+
+@formatter("PLAYER_ACTION", "SET_FLIGHT_PATH")
+def format_set_flight_path(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    actor_id, target_str, params = player_action_context(converter, details)
+    dest_type = params.get("destination_type", "Unknown Dest")
+    coords = params.get("coordinates", {})
+    label = params.get("label", dest_type)
+    coord_str = f"[{coords.get('x', '?')},{coords.get('y', '?')}]" if coords else "No Coords"
+    return f"{actor_id} sets {label} for {target_str} to {coord_str}."
+
+@formatter("PLAYER_ACTION", "SET_POSTURE")
+def format_set_posture(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    actor_id, target_str, params = player_action_context(converter, details)
+    posture = params.get("posture", "UNKNOWN")
+    radar = params.get("radar", "UNCHANGED")
+    return f"{actor_id} sets posture for {target_str} to {posture} (Radar: {radar})."
+
+@formatter("PLAYER_ACTION", "COMMIT")
+def format_commit(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    actor_id, target_str, params = player_action_context(converter, details)
+    groups = ", ".join(params.get("commit_groups", ["Unknown Groups"]))
+    commit_range = params.get("commit_range_nm", None)
+    range_str = f" at {commit_range:.0f} NM" if commit_range is not None else ""
+    return f"{actor_id} commits MADDOG package ({target_str}) to engage {groups}{range_str}."
+
+@formatter("PLAYER_ACTION", "ASSIGN_TARGET")
+def format_assign_target(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    actor_id, target_str, params = player_action_context(converter, details)
+    enemy_target = params.get("enemy_group_id", "Unknown Enemy")
+    return f"{actor_id} assigns {target_str} to target {enemy_target}."
+
+@formatter("PLAYER_ACTION", "RTB")
+def format_rtb(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    actor_id, target_str, _ = player_action_context(converter, details)
+    return f"{actor_id} orders {target_str} to Return To Base (RTB)."
+
+@formatter("PLAYER_ACTION")
+def format_player_action(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    actor_id, target_str, params = player_action_context(converter, details)
+    action = details.get("action_type", "UNKNOWN_ACTION")
+    return f"{actor_id} action: {action} for {target_str} with params {params}."
+
+
+@formatter("MOVEMENT")
+def format_movement(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    # Generally ignore simple movement updates for brevity (the position still goes into the track store)
+    return None
+
+
+@formatter("DETECTION")
+def format_detection(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    detector = converter.get_asset_name(details.get("detector_id", "Unknown Detector"))
+    detected_assets = []
+    for group in details.get("detected_groups", []):
+        group_id = group.get("group_id", "Unknown Group")
+        comp = group.get("composition_estimate", ["?x Type?"])[0]
+        range_nm = group.get("range_nm")
+        detected_assets.append(f"{group_id} ({comp}) at {range_nm:.0f} NM" if range_nm is not None else f"{group_id} ({comp})")
+
+    if detected_assets:
+        return f"{detector} detects: {'; '.join(detected_assets)}."
+
+    # Handle single detection format if needed (less common with groups)
+    detected = converter.get_asset_name(details.get("detected_asset_id", "Unknown Asset"))
+    range_nm = details.get("range_nm")
+    range_str = f" at {range_nm:.0f} NM" if range_nm is not None else ""
+    return f"{detector} detects {detected}{range_str}."
+
+
+@formatter("COMBAT", "FIRE_MISSILE")
+def format_fire_missile(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    shooter = converter.get_asset_name(details.get("shooter_id", "?"))
+    target = converter.get_asset_name(details.get("target_id", "?"))
+    weapon = details.get("weapon_type", "?")
+    range_nm = details.get("range_nm")
+    range_str = f" at {range_nm:.0f} NM" if range_nm is not None else ""
+    return f"{shooter} fires {weapon} at {target}{range_str}."
+
+@formatter("COMBAT", "KILL")
+def format_kill(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    victim = converter.get_asset_name(details.get("asset_id", "?"))
+    source = converter.get_asset_name(details.get("source_id", "Unknown"))
+    return f"{victim} destroyed by {source}."
+
+@formatter("COMBAT", "BOMB_RUN")
+def format_bomb_run(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    shooter = converter.get_asset_name(details.get("shooter_id", "?"))
+    target = converter.get_asset_name(details.get("target_id", "?"))
+    weapon = details.get("weapon_type", "weapon")
+    result = details.get("result", "UNKNOWN")
+    return f"{shooter} attacks {target} with {weapon}. Result: {result}."
+
+@formatter("COMBAT")
+def format_combat(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    action = details.get("action_type", "UNKNOWN_COMBAT")
+    return f"Combat event: {action} involving {details.get('involved_assets', [])}."
+
+
+@formatter("STATUS_CHANGE")
+def format_status_change(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    asset = converter.get_asset_name(details.get("asset_id", "?"))
+    status_type = details.get("status_type", "?")
+    value = details.get("new_value", "?")
+    return f"{asset} status changed: {status_type} = {value}."
+
+@formatter("STATUS_CHANGE", "WAYPOINT_REACHED")
+def format_waypoint_reached(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    asset = converter.get_asset_name(details.get("asset_id", "?"))
+    return f"{asset} reached waypoint: {details.get('new_value', '?')}."
+
+@formatter("STATUS_CHANGE", "HVAA_DEFENSE")
+def format_hvaa_defense(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    if details.get("new_value", "?").upper() != "SLIDE_INITIATED":
+        return format_status_change(converter, timestamp, details)
+    asset = converter.get_asset_name(details.get("asset_id", "?"))
+    return f"{asset} initiates SLIDE maneuver."
+
+@formatter("STATUS_CHANGE", "SENSOR_REPORT")
+def format_sensor_report(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    if details.get("new_value", "?") != "PICTURE_CLEAN":
+        return format_status_change(converter, timestamp, details)
+    asset = converter.get_asset_name(details.get("asset_id", "?"))
+    return f"{asset} reports PICTURE CLEAN."
+
+@formatter("STATUS_CHANGE", "MISSION_PHASE")
+def format_mission_phase(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    if details.get("new_value", "?") != "MILLER_TIME":
+        return format_status_change(converter, timestamp, details)
+    asset = converter.get_asset_name(details.get("asset_id", "?"))
+    return f"{asset} reports MILLER TIME (Targets Destroyed)."
+
+@formatter("STATUS_CHANGE", "FUEL_STATE")
+def format_fuel_state(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    asset = converter.get_asset_name(details.get("asset_id", "?"))
+    return f"{asset} fuel state: {details.get('new_value', '?')}." # Example: Log fuel state changes
+
+@formatter("STATUS_CHANGE", "WEAPON_STATE")
+def format_weapon_state(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    # Could be very verbose, so only log "Winchester"
+    value = details.get("new_value", "?")
+    if isinstance(value, dict) and value.get("status") == "Winchester":
+        asset = converter.get_asset_name(details.get("asset_id", "?"))
+        return f"{asset} reports Winchester {value.get('weapon_type', '')}."
+    return None # Ignore detailed weapon counts for now
+
+
+@formatter("MISSION_END")
+def format_mission_end(converter: "NLLogConverter", timestamp: int, details: Dict[str, Any]) -> str | None:
+    outcome = details.get("outcome", "Unknown")
+    converter.outcome, converter.mission_end_time = outcome, timestamp
+    blue_losses = ", ".join([converter.get_asset_name(lid) for lid in details.get("losses_blue", []) if lid]) or "None"
+    objectives_met = "; ".join(details.get("objectives_met", [])) or "None"
+    objectives_failed = "; ".join(details.get("objectives_failed", [])) or "None"
+    event_description = f"Mission End. Outcome: {outcome}. Blue Losses: [{blue_losses}]. Objectives Met: [{objectives_met}]. Objectives Failed: [{objectives_failed}]."
+    if "Minimize friendly losses" in details.get("objectives_failed", []):
+        event_description += " *(Note: Tactical Objective Failed - Minimize friendly losses)*"
+    return event_description
+
+
+# Event types with a formatter; timings for any other type are grouped under "other"
+KNOWN_EVENT_TYPES = frozenset(event_type for event_type, _ in FORMATTERS)
+
+
+# --- Mistake rules ---
+
+class MistakeRule:
+    """
+    Base class for mistake checks. Subclasses set `events` to the
+    (event_type, subtype) keys they subscribe to and implement `check`,
+    which receives the event's key and returns an annotation to append to
+    the event line or None. Rules that query the track store list the
+    asset ids whose SETUP/MOVEMENT positions they need in `tracked_assets`
+    (detected-group positions are always recorded).
+    Rule instances hold per-log state, so each converter creates its own.
+    """
+    name: str = "rule"
+    events: Tuple[EventKey, ...] = ()
+    tracked_assets: Tuple[str, ...] = ()
+
+    def check(self, converter: "NLLogConverter", key: EventKey, timestamp: int, details: Dict[str, Any]) -> str | None:
+        raise NotImplementedError
+
+
+class CapPepzSpacingRule(MistakeRule):
+    """Fighter CAP should sit ~100 NM (90-110, 3D distance) from the bomber PEPZ."""
+    name = "cap_pepz_spacing"
+    events = (("PLAYER_ACTION", "SET_FLIGHT_PATH"),)
+
+    def __init__(self) -> None:
+        self.cap_position = None
+        self.pepz_position = None
+
+    def check(self, converter: "NLLogConverter", key: EventKey, timestamp: int, details: Dict[str, Any]) -> str | None:
+        params = details.get("parameters", {})
+        position = position_tuple(params.get("coordinates", {}))
+        label = params.get("label", params.get("destination_type", "Unknown Dest"))
+
+        if label == "Fighter CAP" and position is not None:
+            self.cap_position = position
+            if self.pepz_position is not None: # Check if PEPZ already set
+                distance = distance_nm(self.cap_position, self.pepz_position)
+                if distance < 90 or distance > 110:
+                    return f" *(Mistake: CAP distance to PEPZ is {distance:.0f} NM, TTP is ~100 NM)*"
+        elif label == "Bomber PEPZ" and position is not None:
+            self.pepz_position = position
+            if self.cap_position is not None: # Check if CAP already set
+                distance = distance_nm(self.cap_position, self.pepz_position)
+                if distance < 90 or distance > 110:
+                    return f" *(Mistake: PEPZ distance to CAP is {distance:.0f} NM, TTP is ~100 NM)*"
+        return None
+
+
+class CommitRangeRule(MistakeRule):
+    """Fighters should not commit beyond 80 NM."""
+    name = "commit_range"
+    events = (("PLAYER_ACTION", "COMMIT"),)
+
+    def check(self, converter: "NLLogConverter", key: EventKey, timestamp: int, details: Dict[str, Any]) -> str | None:
+        commit_range = details.get("parameters", {}).get("commit_range_nm", None)
+        if commit_range is not None and commit_range > 80:
+            return f" *(Mistake: Commit range {commit_range:.0f} NM > 80 NM TTP)*"
+        return None
+
+
+class F22TargetPriorityRule(MistakeRule):
+    """
+    F-22s should be assigned to the primary group. Simplified: red_grp_1 is
+    assumed highest priority once it has been committed on.
+    """
+    name = "f22_target_priority"
+    events = (("PLAYER_ACTION", "COMMIT"), ("PLAYER_ACTION", "ASSIGN_TARGET"))
+
+    def __init__(self) -> None:
+        self.committed_group_times: Dict[str, int] = {} # Earliest COMMIT timestamp per enemy group {group_id: timestamp}
+
+    def check(self, converter: "NLLogConverter", key: EventKey, timestamp: int, details: Dict[str, Any]) -> str | None:
+        params = details.get("parameters", {})
+        if key == ("PLAYER_ACTION", "COMMIT"):
+            # Index committed groups by earliest commit time so ASSIGN_TARGET checks are O(1)
+            for group_id in params.get("commit_groups", []):
+                if group_id not in self.committed_group_times or timestamp < self.committed_group_times[group_id]:
+                    self.committed_group_times[group_id] = timestamp
+            return None
+
+        enemy_target = params.get("enemy_group_id", "Unknown Enemy")
+        is_f22 = any("f22" in tid for tid in details.get("target_ids", []))
+        if is_f22 and enemy_target != "red_grp_1":
+            # Check if red_grp_1 was part of *any* commit action before this assignment
+            red_grp_1_commit_time = self.committed_group_times.get("red_grp_1")
+            if red_grp_1_commit_time is not None and red_grp_1_commit_time <= timestamp:
+                return f" *(Potential Mistake: F-22 assigned to non-primary group '{enemy_target}' while primary 'red_grp_1' was committed?)*"
+        return None
+
+
+class AwacsSlideRule(MistakeRule):
+    """
+    AWACS should slide within 30s of a threat detected inside 150 NM, and the
+    slide should open range from that threat. At MISSION_END the AWACS track
+    is checked for how far the slide moved it, and every group it detected
+    for a closest approach inside 100 NM (where the TTP is to SCRAM).
+    """
+    name = "awacs_slide"
+    events = (
+        ("DETECTION", None),
+        ("STATUS_CHANGE", "HVAA_DEFENSE"),
+        ("MISSION_END", None),
+    )
+    tracked_assets = ("awacs_1",)
+
+    def __init__(self) -> None:
+        self.last_awacs_detection_range = None
+        self.last_awacs_detection_time = None
+        self.threat_group_id = None # Group behind the latest < 150 NM detection
+        self.detected_group_ids: Dict[str, None] = {} # Every group AWACS detected, in first-seen order
+        self.approaches: Dict[str, ClosestApproach] = {} # Running AWACS closest approach per detected group
+        self.slide_time = None
+
+    def check(self, converter: "NLLogConverter", key: EventKey, timestamp: int, details: Dict[str, Any]) -> str | None:
+        if key[0] == "MISSION_END":
+            return self.check_geometry(converter)
+
+        if key[0] == "STATUS_CHANGE":
+            if details.get("new_value", "?").upper() != "SLIDE_INITIATED":
+                return None
+            # Check if this slide was timely. A slide *before* detection < 150NM is just pre-emptive.
+            if details.get("asset_id", "?") == "awacs_1" and self.last_awacs_detection_time is not None:
+                self.slide_time = timestamp
+                delay = timestamp - self.last_awacs_detection_time
+                if delay > 30: # Example threshold: Slide should happen within 30s
+                    return f" *(Mistake: AWACS slide initiated {delay}s after threat detected < 150NM)*"
+            return None
+
+        # DETECTION: record the *first* AWACS threat inside 150 NM, or a significantly closer one
+        if details.get("detector_id") != "awacs_1":
+            return None
+        groups = details.get("detected_groups", [])
+        for group in groups:
+            if isinstance(group.get("group_id"), str):
+                self.detected_group_ids[group["group_id"]] = None
+        if groups:
+            ranged = [(group.get("range_nm"), group.get("group_id")) for group in groups if group.get("range_nm") is not None]
+        else:
+            ranged = [(details.get("range_nm"), details.get("detected_asset_id"))] if details.get("range_nm") is not None else []
+        if not ranged:
+            return None
+        min_range_nm, group_id = min(ranged, key=lambda pair: pair[0])
+        if min_range_nm < 150:
+            if self.last_awacs_detection_time is None or min_range_nm < (self.last_awacs_detection_range or 150):
+                self.last_awacs_detection_range = min_range_nm
+                self.last_awacs_detection_time = timestamp
+                self.threat_group_id = group_id
+                return f" *(Note: Threat detected < 150NM at {min_range_nm:.0f} NM)*"
+        return None
+
+    def check_geometry(self, converter: "NLLogConverter") -> str | None:
+        """Slide distance and closest approaches from the AWACS and detected-group tracks."""
+        tracks = converter.tracks
+        if "awacs_1" not in tracks:
+            return None
+        annotations = []
+
+        # Only judge the slide if AWACS reported a position after it
+        last_report = tracks.last_report_time("awacs_1")
+        if self.slide_time is not None and last_report is not None and last_report >= self.slide_time:
+            moved = tracks.displacement("awacs_1", self.slide_time)
+            threat = self.threat_group_id
+            if threat in tracks:
+                # Range change to the threat's last reported position, from the slide to the last AWACS report
+                threat_position = tracks.last_position(threat)
+                opened = distance_nm(tracks.last_position("awacs_1"), threat_position) - distance_nm(tracks.position_at("awacs_1", self.slide_time), threat_position)
+                if opened <= 0:
+                    annotations.append(f" *(Mistake: AWACS slide moved {moved:.0f} NM but did not open range from {threat} ({opened:+.0f} NM))*")
+                else:
+                    annotations.append(f" *(Note: AWACS slide moved {moved:.0f} NM, opening range from {threat} by {opened:.0f} NM)*")
+            else:
+                annotations.append(f" *(Note: AWACS slide moved {moved:.0f} NM)*")
+
+        for group_id in self.detected_group_ids:
+            if group_id not in self.approaches:
+                self.approaches[group_id] = ClosestApproach("awacs_1", group_id)
+            approach = self.approaches[group_id].update(tracks)
+            if approach is not None and approach[1] < 100:
+                approach_time, range_nm, closure = approach
+                annotations.append(
+                    f" *(Mistake: {group_id} came within {range_nm:.0f} NM of AWACS at {format_time(int(approach_time))}"
+                    f" closing at {closure:.0f} kts; TTP is to SCRAM inside 100 NM)*"
+                )
+        return "".join(annotations) or None
+
+
+class PrematureColdTurnRule(MistakeRule):
+    """Fighters should not turn cold/passive before PICTURE CLEAN."""
+    name = "premature_cold_turn"
+    events = (
+        ("PLAYER_ACTION", "SET_POSTURE"),
+        ("STATUS_CHANGE", "SENSOR_REPORT"),
+        ("MISSION_END", None),
+    )
+
+    def __init__(self) -> None:
+        self.picture_clean_time = None
+        self.fighter_elements_cold = {} # Track which fighters went cold prematurely {timestamp: [asset_id]}
+
+    def describe_cold_turns(self, converter: "NLLogConverter", before: int | None = None) -> List[str]:
+        return [
+            f"{', '.join([converter.get_asset_name(aid) for aid in cold_asset_ids])} at {format_time(cold_time)}"
+            for cold_time, cold_asset_ids in self.fighter_elements_cold.items()
+            if before is None or cold_time < before
+        ]
+
+    def check(self, converter: "NLLogConverter", key: EventKey, timestamp: int, details: Dict[str, Any]) -> str | None:
+        if key == ("PLAYER_ACTION", "SET_POSTURE"):
+            params = details.get("parameters", {})
+            posture = params.get("posture", "UNKNOWN")
+            radar = params.get("radar", "UNCHANGED")
+            if posture.upper() in ["DEFENSIVE", "COLD"] and radar.upper() == "PASSIVE":
+                # Only flag fighters turning cold
+                target_ids = details.get("target_ids", [])
+                is_fighter = any("f22" in tid or "f16" in tid for tid in target_ids) # Example fighter types
+                if is_fighter and (self.picture_clean_time is None or timestamp < self.picture_clean_time):
+                    self.fighter_elements_cold[timestamp] = target_ids # Annotation added later when PICTURE_CLEAN occurs
+            return None
+
+        if key == ("STATUS_CHANGE", "SENSOR_REPORT"):
+            if details.get("new_value", "?") != "PICTURE_CLEAN":
+                return None
+            self.picture_clean_time = timestamp
+            premature_cold_turns = self.describe_cold_turns(converter, before=self.picture_clean_time)
+            if premature_cold_turns:
+                # Clear the logged cold turns to avoid re-annotating
+                self.fighter_elements_cold = {t: ids for t, ids in self.fighter_elements_cold.items() if t >= self.picture_clean_time}
+                return f" *(Mistake: Fighters turned cold prematurely before PICTURE CLEAN: {'; '.join(premature_cold_turns)})*"
+            return None
+
+        # MISSION_END: flag cold turns if picture was never clean
+        if self.picture_clean_time is None and self.fighter_elements_cold:
+            premature_cold_turns = self.describe_cold_turns(converter)
+            return f" *(Mistake: Fighters turned cold prematurely ({'; '.join(premature_cold_turns)}) and PICTURE CLEAN was never achieved)*"
+        return None
+
+
+# Rules run in this order, so annotations on a line appear in this order
+RULES: List[type[MistakeRule]] = [
+    CapPepzSpacingRule,
+    CommitRangeRule,
+    F22TargetPriorityRule,
+    AwacsSlideRule,
+    PrematureColdTurnRule,
+]
+
+
+class NLLogConverter:
+    """
+    Converts log entries one at a time, carrying the state the mistake
+    rules need between events. Create a new instance per log.
+    """
+
+    def __init__(self) -> None:
+        self.asset_lookup: Dict[str, Dict[str, Any]] = {}
+        self.tracks = TrackStore()
+        self.rules = [rule_cls() for rule_cls in RULES]
+        self.tracked_assets = frozenset(asset_id for rule in self.rules for asset_id in rule.tracked_assets)
+
+        # (event_type, subtype) -> subscribed rules, so each event only pays for its own rules
+        self.rule_index: Dict[EventKey, List[MistakeRule]] = {}
+        for rule in self.rules:
+            for key in rule.events:
+                self.rule_index.setdefault(key, []).append(rule)
+
+        # rule name -> [calls, total seconds]; event type -> [events, total seconds] (formatting and rules)
+        self.rule_timings: Dict[str, List[float]] = {rule.name: [0, 0.0] for rule in self.rules}
+        self.event_timings: Dict[str, List[float]] = {}
+
+        # What the sortie was and what the rules found, for the mistake index
+        self.scenario_name: str | None = None
+        self.outcome: str | None = None
+        self.mission_end_time: int | None = None
+        self.findings: List[Tuple[int, str, str]] = [] # (timestamp, rule name, annotation)
+
+    def get_asset_name(self, asset_id: str) -> str:
+        """Looks up callsign and type, e.g., 'SATAN 1 (F-22)'."""
+        asset = self.asset_lookup.get(asset_id)
+        if asset:
+            callsign = asset.get('callsign', 'Unknown Callsign')
+            asset_type = asset.get('type', 'Unknown Type')
+            return f"{callsign} ({asset_type})"
+        if asset_id and "red_" in asset_id:
+            return f"Enemy Asset ({asset_id.replace('red_', '')})"
+        return asset_id
+
+    def record_positions(self, event_type: str, timestamp: int, details: Dict[str, Any]) -> None:
+        """Adds the positions an event reports to the track store (own assets only if a rule tracks them)."""
+        if event_type == "MOVEMENT":
+            asset_id = details.get("asset_id")
+            if isinstance(asset_id, str) and asset_id in self.tracked_assets:
+                self.tracks.record(asset_id, timestamp, details.get("new_position"))
+        elif event_type == "DETECTION":
+            for group in details.get("detected_groups", ()):
+                self.tracks.record(group.get("group_id"), timestamp, group.get("position"))
+        elif event_type == "SETUP":
+            for asset in details.get("blue_forces", ()):
+                if isinstance(asset.get("id"), str) and asset["id"] in self.tracked_assets:
+                    self.tracks.record(asset.get("id"), timestamp, asset.get("initial_pos"))
+
+    def run_rules(self, key: EventKey, timestamp: int, details: Dict[str, Any]) -> List[str]:
+        """Runs the rules subscribed to `key` (or to its whole event type), timing each."""
+        annotations = []
+        rules = self.rule_index.get(key, [])
+        if key[1] is not None:
+            rules = rules + self.rule_index.get((key[0], None), [])
+        for rule in rules:
+            start = time.perf_counter()
+            annotation = rule.check(self, key, timestamp, details)
+            timing = self.rule_timings[rule.name]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+            if annotation:
+                annotations.append(annotation)
+                self.findings.append((timestamp, rule.name, annotation))
+        return annotations
+
+    def convert_entry(self, log_entry: Dict[str, Any]) -> str | None:
+        """
+        Converts a single log entry (dict with timestamp, event_type, details)
+        into a 'TIME: ...' line, or None if the event is not logged.
+        """
+        return self.convert_event(log_entry["timestamp"], log_entry["event_type"], log_entry["details"])
+
+    def convert_event(self, timestamp: int, event_type: str, details: Dict[str, Any]) -> str | None:
+        """Core of convert_entry, shared with the LogEvent fast path."""
+        time_str = format_time(timestamp)
+        start = time.perf_counter()
+
+        try: # Wrap processing in try-except for robustness
+            key = event_key(event_type, details)
+            format_event = FORMATTERS.get(key) or FORMATTERS.get((event_type, None))
+            if format_event is None:
+                return None # Unknown event type
+            event_description = format_event(self, timestamp, details)
+            self.record_positions(event_type, timestamp, details)
+            annotations = self.run_rules(key, timestamp, details)
+            if event_description is None: # Ignored event (rules may still have updated state)
+                return None
+            return f"TIME: {time_str} {event_description}{''.join(annotations)}"
+
+        except Exception as e:
+            # Log errors during processing specific entries but keep converting the rest
+            logger.exception("error processing log entry", extra={"fields": {"timestamp": timestamp, "event_type": event_type}})
+            return f"TIME: {time_str} ERROR processing event: {event_type} - {e}"
+
+        finally:
+            timing_key = event_type if event_type in KNOWN_EVENT_TYPES else "other"
+            timing = self.event_timings.get(timing_key)
+            if timing is None:
+                timing = self.event_timings[timing_key] = [0, 0.0]
+            timing[0] += 1
+            timing[1] += time.perf_counter() - start
+
+    def convert(self, log_data: List[Dict[str, Any]]) -> List[str]:
+        """Converts a full log, returning the natural language lines in order."""
+        natural_language_log_lines = []
+        for log_entry in log_data:
+            line = self.convert_entry(log_entry)
+            if line is not None:
+                natural_language_log_lines.append(line)
+        return natural_language_log_lines
+
+    def convert_events(self, events: List[LogEvent]) -> List[str]:
+        """Like convert, for LogEvent records from the fast decoding path."""
+        natural_language_log_lines = []
+        for event in events:
+            line = self.convert_event(event.timestamp, event.event_type, event.details)
+            if line is not None:
+                natural_language_log_lines.append(line)
+        return natural_language_log_lines
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Plain data about the conversion so far: per-event-type and per-rule
+        timings (for /metrics) and the sortie summary and rule findings (for
+        the mistake index).
+        """
+        return {
+            "events": self.event_timings,
+            "rules": self.rule_timings,
+            "scenario_name": self.scenario_name,
+            "outcome": self.outcome,
+            "mission_end_time": self.mission_end_time,
+            "findings": self.findings,
+        }
+
+
+def convert_log(log_data: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Converts a full log with a fresh converter and joins the lines.
+    Top-level so it can be submitted to a process pool. Returns the NL log
+    and the conversion report (NLLogConverter.report plus total seconds).
+    """
+    start = time.perf_counter()
+    converter = NLLogConverter()
+    natural_language_log = "\n".join(converter.convert(log_data))
+    return natural_language_log, {**converter.report(), "total": time.perf_counter() - start}
+
+
+def convert_log_body(raw: bytes, check_options: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[str, Dict[str, Any], Dict[str, Any]]:
+    """
+    Fast path for a raw `{"log_data": [...], ...}` request body: decodes and
+    converts it in the worker, so the event loop never builds per-event
+    models. Returns the NL log, the body's other top-level fields and the
+    conversion report (as convert_log, plus the decode seconds).
+    `check_options` sees the other fields before any event is converted.
+    Raises EventDecodeError if the body needs full model validation.
+    """
+    with paused_gc():
+        start = time.perf_counter()
+        events, options = decode_log_body(raw)
+        if check_options is not None:
+            check_options(options)
+        decoded = time.perf_counter()
+        converter = NLLogConverter()
+        natural_language_log = "\n".join(converter.convert_events(events))
+        end = time.perf_counter()
+        return natural_language_log, options, {**converter.report(), "decode": decoded - start, "total": end - start}
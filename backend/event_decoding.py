@@ -0,0 +1,107 @@
+"""
+Fast-path decoding of raw JSON log uploads into compact event records.
+
+The regular request path parses the body, validates every entry into a
+LogEntry model and then turns it back into a dict with `.dict()` before
+conversion: two full object graphs per event. Here the raw bytes are parsed
+once (with orjson when installed) and each entry becomes a slotted LogEvent
+that keeps the parsed `details` dict as-is. Only the envelope every event
+needs (integer timestamp, string event_type, dict details) is checked up
+front; detail fields are validated lazily by the formatters and rules that
+read them. Ids and type names are interned so repeated values share one
+string object. The cyclic garbage collector is paused while a body is
+decoded and converted: the parsed JSON is an acyclic tree, and otherwise
+every collection re-traverses hundreds of thousands of live containers.
+
+Anything the fast path cannot accept raises EventDecodeError, and callers
+fall back to full model validation (which also produces the usual 422 body).
+"""
+import gc
+import json
+import sys
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+try:
+    import orjson
+except ImportError: # Optional speed-up; the stdlib parser gives identical results
+    orjson = None
+
+
+def parse_json(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+@contextmanager
+def paused_gc() -> Iterator[None]:
+    """Disables cyclic GC for the block (reference counting still frees everything acyclic)."""
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+# Detail fields holding ids / enum-like values that repeat across a sortie
+INTERNED_FIELDS = (
+    "action_type", "status_type", "actor_id", "asset_id", "detector_id", "shooter_id",
+    "target_id", "source_id", "detected_asset_id", "weapon_type",
+)
+
+
+class EventDecodeError(ValueError):
+    """The body is not a plain, already well-typed log; validate it with the models instead."""
+
+
+class LogEvent:
+    """One log entry: timestamp, event type and the parsed details dict (not copied)."""
+
+    __slots__ = ("timestamp", "event_type", "details")
+
+    def __init__(self, timestamp: int, event_type: str, details: Dict[str, Any]) -> None:
+        self.timestamp = timestamp
+        self.event_type = event_type
+        self.details = details
+
+
+def intern_details(details: Dict[str, Any]) -> None:
+    """Interns the repeated id / type strings of an event's details in place."""
+    for field in INTERNED_FIELDS:
+        value = details.get(field)
+        if type(value) is str:
+            details[field] = sys.intern(value)
+    target_ids = details.get("target_ids")
+    if type(target_ids) is list:
+        details["target_ids"] = [sys.intern(value) if type(value) is str else value for value in target_ids]
+
+
+def decode_event(entry: Any, index: int = 0) -> LogEvent:
+    """Checks an entry's envelope and wraps it in a LogEvent. Raises EventDecodeError."""
+    if type(entry) is not dict:
+        raise EventDecodeError(f"log_data[{index}] is not an object")
+    timestamp = entry.get("timestamp")
+    event_type = entry.get("event_type")
+    details = entry.get("details")
+    # Exact types only (bool is not a timestamp); anything a model would coerce takes the slow path
+    if type(timestamp) is not int or type(event_type) is not str or type(details) is not dict:
+        raise EventDecodeError(f"log_data[{index}] does not have an int timestamp, str event_type and object details")
+    intern_details(details)
+    return LogEvent(timestamp, sys.intern(event_type), details)
+
+
+def decode_log_body(raw: bytes) -> Tuple[List[LogEvent], Dict[str, Any]]:
+    """
+    Decodes a `{"log_data": [...], ...}` request body. Returns the events and
+    the remaining top-level fields (e.g. /debrief options).
+    """
+    try:
+        body = parse_json(raw)
+    except ValueError as e: # json.JSONDecodeError and orjson.JSONDecodeError are both ValueErrors
+        raise EventDecodeError(f"invalid JSON: {e}")
+    if type(body) is not dict or type(body.get("log_data")) is not list or not body["log_data"]:
+        raise EventDecodeError("body has no non-empty log_data list")
+
+    log_data = body.pop("log_data")
+    return [decode_event(entry, index) for index, entry in enumerate(log_data)], body
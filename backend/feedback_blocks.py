@@ -0,0 +1,51 @@
+"""
+Helpers for splitting model feedback text into per-event TIME: blocks.
+
+Shared by the SSE streaming mode (emit each block as soon as it is
+complete) and the windowed evaluation (merge per-window blocks).
+"""
+import re
+from typing import List, Tuple
+
+# A feedback block starts at a line beginning with "TIME:" (optionally as a markdown bullet / bold label)
+FEEDBACK_BLOCK_START = re.compile(r"^[ \t]*(?:[*-][ \t]*)?(?:\*\*)?TIME:", re.MULTILINE)
+
+# Closing section written after the per-event blocks
+CLOSING_SECTION_START = re.compile(r"^[ \t]*(?:[*#-][ \t#]*)?(?:\*\*)?(?:OVERALL ASSESSMENT|OVERALL EVALUATION|DEBRIEF NOTES)", re.MULTILINE | re.IGNORECASE)
+
+# Timestamp as written by the converter and echoed by the model, e.g. 00h05m15s
+TIMESTAMP = re.compile(r"(\d+)h(\d{2})m(\d{2})s")
+
+
+def split_feedback_blocks(buffer: str) -> Tuple[List[str], str]:
+    """
+    Splits the completed blocks off the front of the streamed text. A block
+    is complete once the next TIME: line has started; the text from the last
+    TIME: line onwards is returned as the still-open remainder.
+    """
+    starts = [m.start() for m in FEEDBACK_BLOCK_START.finditer(buffer)]
+    boundaries = [0] + [start for start in starts if start > 0]
+    blocks = [buffer[begin:end] for begin, end in zip(boundaries, boundaries[1:])]
+    return [block for block in blocks if block.strip()], buffer[boundaries[-1]:]
+
+
+def extract_event_blocks(feedback_text: str) -> List[str]:
+    """
+    Returns only the TIME: blocks of a feedback text, dropping any preamble
+    and anything from the closing OVERALL ASSESSMENT / DEBRIEF NOTES onwards.
+    """
+    closing = CLOSING_SECTION_START.search(feedback_text)
+    if closing:
+        feedback_text = feedback_text[:closing.start()]
+    blocks, remainder = split_feedback_blocks(feedback_text)
+    blocks.append(remainder)
+    return [block.strip() for block in blocks if FEEDBACK_BLOCK_START.match(block)]
+
+
+def block_seconds(block: str) -> int:
+    """Timestamp of a TIME: block in seconds (0 if it cannot be parsed), used for ordering."""
+    match = TIMESTAMP.search(block)
+    if not match:
+        return 0
+    hours, minutes, seconds = (int(part) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
@@ -0,0 +1,275 @@
+"""
+Persistent queue of debrief jobs worked off by a fixed-size async worker pool.
+
+Jobs are stored in SQLite, so queued work survives a restart (jobs that were
+mid-flight are re-queued). A fixed number of worker tasks pull jobs in
+submission order, which bounds the load on the Anthropic API: a cohort of
+sorties submitted at once is processed at a steady rate instead of
+timing out as parallel long-held HTTP requests.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List
+
+from metrics import ERRORS
+
+# Handler called by the workers with (kind, request) and returning the job result
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+logger = logging.getLogger("bane.job_queue")
+
+
+class JobStats:
+    """Counters for queue depth, wait time (submit to start) and service time (start to finish)."""
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.requeued_on_start = 0
+        self.running = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.service_seconds_total = 0.0
+        self.service_seconds_max = 0.0
+
+    def record_start(self, waited: float) -> None:
+        self.running += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def record_finish(self, served: float, succeeded: bool) -> None:
+        self.running -= 1
+        self.service_seconds_total += served
+        self.service_seconds_max = max(self.service_seconds_max, served)
+        if succeeded:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+
+    def avg_service_seconds(self) -> float:
+        finished = self.succeeded + self.failed
+        return self.service_seconds_total / finished if finished else 0.0
+
+    def as_dict(self, queue_depth: int) -> Dict[str, Any]:
+        started = self.succeeded + self.failed + self.running
+        return {
+            "workers": self.workers,
+            "queue_depth": queue_depth,
+            "running": self.running,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "requeued_on_start": self.requeued_on_start,
+            "avg_wait_ms": (self.wait_seconds_total / started * 1000) if started else 0.0,
+            "max_wait_ms": self.wait_seconds_max * 1000,
+            "avg_service_ms": self.avg_service_seconds() * 1000,
+            "max_service_ms": self.service_seconds_max * 1000,
+            # Steady-state completion rate of the pool at the observed service time
+            "throughput_per_minute": (self.workers * 60 / self.avg_service_seconds()) if self.avg_service_seconds() else 0.0,
+        }
+
+
+class JobQueue:
+    """
+    SQLite-backed FIFO of jobs plus `workers` asyncio tasks that run them
+    through `handler`. Finished jobs are kept for `result_ttl_seconds` so
+    clients can fetch their results.
+    """
+
+    def __init__(self, path: str, handler: JobHandler, workers: int = 4, result_ttl_seconds: float = 24 * 3600) -> None:
+        self.handler = handler
+        self.workers = workers
+        self.result_ttl_seconds = result_ttl_seconds
+        self.stats = JobStats(workers)
+        self.pending: "asyncio.Queue[str]" = asyncio.Queue()
+        self.finished_events: Dict[str, asyncio.Event] = {}
+        self.worker_tasks: List[asyncio.Task] = []
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " request TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created_at ON jobs (status, created_at)")
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls, handler: JobHandler) -> "JobQueue":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "job_queue.sqlite3")
+        return cls(
+            os.getenv("JOB_QUEUE_PATH", default_path),
+            handler,
+            workers=int(os.getenv("JOB_WORKERS", 4)),
+            result_ttl_seconds=float(os.getenv("JOB_RESULT_TTL_SECONDS", 24 * 3600)),
+        )
+
+    def execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+            self.db.commit()
+            return rows
+
+    async def start(self) -> None:
+        """Re-queues unfinished jobs from a previous run, then starts the workers."""
+        requeued = self.execute("SELECT id FROM jobs WHERE status = ?", (RUNNING,))
+        self.execute("UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?", (QUEUED, RUNNING))
+        self.stats.requeued_on_start = len(requeued)
+        for row in self.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)):
+            self.pending.put_nowait(row["id"])
+        if self.pending.qsize():
+            logger.info("job queue resuming", extra={"fields": {"queued": self.pending.qsize(), "interrupted": len(requeued)}})
+        self.worker_tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stops the workers. Jobs they were running stay 'running' and are re-queued on the next start."""
+        for task in self.worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.worker_tasks, return_exceptions=True)
+        with self.lock:
+            self.db.close()
+
+    def insert(self, kind: str, request: Dict[str, Any]) -> str:
+        """Stores a new queued job (after dropping expired results) and returns its id."""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.result_ttl_seconds,))
+        self.execute(
+            "INSERT INTO jobs (id, kind, status, request, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, json.dumps(request, ensure_ascii=False), now),
+        )
+        return job_id
+
+    async def submit(self, kind: str, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Stores a new job, queues it and returns its status. The request can
+        be several MB of JSON, so encoding and SQLite work run in a thread.
+        """
+        job_id = await asyncio.to_thread(self.insert, kind, request)
+        self.pending.put_nowait(job_id)
+        self.stats.submitted += 1
+        return await asyncio.to_thread(self.get, job_id)
+
+    def get(self, job_id: str) -> Dict[str, Any] | None:
+        """Status of a job (with result or error once finished), or None if unknown."""
+        rows = self.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        job: Dict[str, Any] = {"job_id": row["id"], "kind": row["kind"], "status": row["status"], "created_at": row["created_at"]}
+        if row["status"] == QUEUED:
+            ahead = self.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, row["created_at"]))[0][0]
+            job["queue_position"] = ahead + 1
+            # Jobs ahead of this one (plus the ones running) are shared between the workers
+            job["estimated_start_seconds"] = (ahead + self.stats.running) / self.workers * self.stats.avg_service_seconds()
+        if row["started_at"] is not None:
+            job["started_at"] = row["started_at"]
+            job["wait_ms"] = (row["started_at"] - row["created_at"]) * 1000
+        if row["finished_at"] is not None:
+            job["finished_at"] = row["finished_at"]
+            job["service_ms"] = (row["finished_at"] - row["started_at"]) * 1000
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = json.loads(row["error"])
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Dict[str, Any] | None:
+        """Long-poll: returns once the job has finished or after `timeout` seconds, whichever is first."""
+        if timeout <= 0:
+            return await asyncio.to_thread(self.get, job_id)
+        # Registered before reading the status, so a job finishing in between still sets it
+        event = self.finished_events.setdefault(job_id, asyncio.Event())
+        job = await asyncio.to_thread(self.get, job_id)
+        if job is None or job["status"] in (SUCCEEDED, FAILED):
+            # Unknown or already done: release the event (and any other waiter) unless the worker already has
+            if self.finished_events.pop(job_id, None) is not None:
+                event.set()
+            return job
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return await asyncio.to_thread(self.get, job_id)
+
+    def finish(self, job_id: str, result: Dict[str, Any] | None, error: Dict[str, Any] | None, finished_at: float) -> None:
+        """Stores a finished job's result or error."""
+        self.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (
+                FAILED if error else SUCCEEDED,
+                json.dumps(result, ensure_ascii=False) if result is not None else None,
+                json.dumps(error) if error else None,
+                finished_at,
+                job_id,
+            ),
+        )
+
+    def queue_depth(self) -> int:
+        return self.pending.qsize()
+
+    async def worker(self) -> None:
+        while True:
+            job_id = await self.pending.get()
+            try:
+                await self.run_job(job_id)
+            except Exception:
+                # A store failure must not end the worker; the job stays 'running' and is re-queued on the next start
+                ERRORS.inc(source="job", status="500")
+                logger.exception("job worker error", extra={"fields": {"job_id": job_id}})
+
+    async def run_job(self, job_id: str) -> None:
+        """Claims a queued job, runs the handler and stores the result or error."""
+        rows = await asyncio.to_thread(self.execute, "SELECT kind, request, created_at FROM jobs WHERE id = ? AND status = ?", (job_id, QUEUED))
+        if not rows:
+            return # Expired or already handled
+        kind, request, created_at = rows[0]["kind"], json.loads(rows[0]["request"]), rows[0]["created_at"]
+
+        started_at = time.time()
+        await asyncio.to_thread(self.execute, "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (RUNNING, started_at, job_id))
+        self.stats.record_start(started_at - created_at)
+
+        result, error = None, None
+        try:
+            result = await self.handler(kind, request)
+        except asyncio.CancelledError:
+            self.stats.running -= 1
+            raise
+        except Exception as exc:
+            # HTTPException carries status_code/detail; anything else is reported as a 500
+            error = {"status": getattr(exc, "status_code", 500), "detail": getattr(exc, "detail", None) or str(exc)}
+            ERRORS.inc(source="job", status=str(error["status"]))
+            logger.warning("job failed", extra={"fields": {"job_id": job_id, "kind": kind, **error}})
+
+        finished_at = time.time()
+        try:
+            await asyncio.to_thread(self.finish, job_id, result, error, finished_at)
+        finally:
+            self.stats.record_finish(finished_at - started_at, succeeded=error is None)
+            event = self.finished_events.pop(job_id, None)
+            if event is not None:
+                event.set()
@@ -0,0 +1,208 @@
+"""
+Live sortie sessions: converter state kept across WebSocket messages and
+reconnects.
+
+A session owns one NLLogConverter (asset table, tracks and every rule's
+state) and the NL lines produced so far. Each message from the simulator
+only converts its new events. Sessions are snapshotted to SQLite (pickled
+converter state) every `snapshot_seconds` and when the connection drops, so
+a reconnect, even to a restarted server, resumes from the snapshot instead
+of re-sending and re-converting the whole log. The snapshot reports how many
+events it covers, so the client knows where to resume.
+
+Snapshots are written and read only by this server, so unpickling them is
+safe; never load a snapshot from elsewhere.
+"""
+import asyncio
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from converter import NLLogConverter
+
+
+class LiveSessionStats:
+    def __init__(self) -> None:
+        self.started = 0
+        self.resumed_in_memory = 0
+        self.resumed_from_snapshot = 0
+        self.superseded = 0
+        self.finished = 0
+        self.events = 0
+        self.snapshots = 0
+        self.snapshot_seconds_total = 0.0
+        self.last_snapshot_bytes = 0
+        self.expired = 0
+
+    def as_dict(self, active: int) -> Dict[str, Any]:
+        stats = dict(vars(self))
+        stats["active"] = active
+        stats["avg_snapshot_ms"] = (self.snapshot_seconds_total / self.snapshots * 1000) if self.snapshots else 0.0
+        return stats
+
+
+class LiveSession:
+    """
+    One live sortie. Everything except the connection and lock is pickled
+    as the snapshot. `owner` is the connection currently feeding the
+    session; messages from any other connection are ignored.
+    """
+
+    def __init__(self, session_id: str, team: str | None = None, scenario: str | None = None) -> None:
+        self.id = session_id
+        self.team = team
+        self.scenario = scenario
+        self.converter = NLLogConverter()
+        self.lines: List[str] = [] # NL lines so far, for the sortie id once the mission ends
+        self.events = 0 # Events received (invalid ones included): the client resumes from this index
+        self.snapshot_events = 0 # self.events at the last snapshot
+        self.snapshot_at = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.owner: Any = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(vars(self))
+        for transient in ("lock", "owner", "snapshot_at"):
+            del state[transient]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        vars(self).update(state)
+        self.snapshot_at = time.monotonic()
+        self.lock = asyncio.Lock()
+        self.owner = None
+
+    @property
+    def finished(self) -> bool:
+        return self.converter.mission_end_time is not None
+
+
+class LiveSessionStore:
+    """
+    Connected sessions by id, in memory, in front of a SQLite table of
+    snapshots. Snapshots not updated for `ttl_seconds` are dropped as
+    abandoned sorties.
+    """
+
+    def __init__(self, path: str, snapshot_seconds: float = 5.0, ttl_seconds: float = 6 * 3600) -> None:
+        self.snapshot_seconds = snapshot_seconds
+        self.ttl_seconds = ttl_seconds
+        self.stats = LiveSessionStats()
+        self.active: Dict[str, LiveSession] = {}
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS live_sessions ("
+            " id TEXT PRIMARY KEY,"
+            " events INTEGER NOT NULL,"
+            " state BLOB NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS live_sessions_updated_at ON live_sessions (updated_at)")
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls) -> "LiveSessionStore":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "live_sessions.sqlite3")
+        return cls(
+            os.getenv("LIVE_SESSION_PATH", default_path),
+            snapshot_seconds=float(os.getenv("LIVE_SNAPSHOT_SECONDS", 5)),
+            ttl_seconds=float(os.getenv("LIVE_SESSION_TTL_SECONDS", 6 * 3600)),
+        )
+
+    # --- SQLite (called from worker threads) ---
+
+    def load(self, session_id: str) -> LiveSession | None:
+        with self.lock:
+            expired = self.db.execute("DELETE FROM live_sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,)).rowcount
+            row = self.db.execute("SELECT state FROM live_sessions WHERE id = ?", (session_id,)).fetchone()
+            self.db.commit()
+        self.stats.expired += expired
+        return pickle.loads(row[0]) if row else None
+
+    def save(self, session_id: str, events: int, state: bytes) -> None:
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO live_sessions (id, events, state, updated_at) VALUES (?, ?, ?, ?)",
+                (session_id, events, state, time.time()),
+            )
+            self.db.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM live_sessions WHERE id = ?", (session_id,))
+            self.db.commit()
+
+    # --- Session lifecycle (event loop) ---
+
+    async def attach(self, session_id: str, owner: Any, team: str | None = None, scenario: str | None = None) -> Tuple[LiveSession, Any]:
+        """
+        Makes `owner` the session's connection, resuming the in-memory
+        session or its snapshot, or starting a new one. Returns the session
+        and the connection it took over from (None if there was none).
+        """
+        session = self.active.get(session_id)
+        if session is not None:
+            self.stats.resumed_in_memory += 1
+        else:
+            session = await asyncio.to_thread(self.load, session_id)
+            if session is not None:
+                self.stats.resumed_from_snapshot += 1
+            else:
+                session = LiveSession(session_id, team, scenario)
+                self.stats.started += 1
+            session = self.active.setdefault(session_id, session) # Another connection may have loaded it meanwhile
+
+        previous, session.owner = session.owner, owner
+        if previous is not None:
+            self.stats.superseded += 1
+        return session, previous
+
+    async def snapshot(self, session: LiveSession) -> None:
+        """Writes the session's snapshot. Holds the session lock, so no events are applied mid-pickle."""
+        async with session.lock:
+            if session.finished:
+                return
+            start = time.perf_counter()
+            state = pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+            await asyncio.to_thread(self.save, session.id, session.events, state)
+            session.snapshot_events = session.events
+            session.snapshot_at = time.monotonic()
+            self.stats.snapshots += 1
+            self.stats.snapshot_seconds_total += time.perf_counter() - start
+            self.stats.last_snapshot_bytes = len(state)
+
+    def snapshot_due(self, session: LiveSession) -> bool:
+        return session.events > session.snapshot_events and time.monotonic() - session.snapshot_at >= self.snapshot_seconds
+
+    async def detach(self, session: LiveSession, owner: Any) -> None:
+        """Snapshots and unloads the session when its current connection goes away."""
+        if session.owner is not owner:
+            return # Superseded: the newer connection owns the session now
+        session.owner = None
+        if session.events > session.snapshot_events:
+            await self.snapshot(session)
+        if session.owner is None: # Nobody reattached while the snapshot was written
+            self.active.pop(session.id, None)
+
+    async def finish(self, session: LiveSession) -> None:
+        """Forgets a session whose mission has ended."""
+        self.active.pop(session.id, None)
+        await asyncio.to_thread(self.delete, session.id)
+        self.stats.finished += 1
+
+    async def snapshot_active(self) -> None:
+        """Snapshots every connected session with unsaved events (on shutdown)."""
+        for session in list(self.active.values()):
+            if session.events > session.snapshot_events:
+                await self.snapshot(session)
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
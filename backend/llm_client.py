@@ -0,0 +1,466 @@
+"""
+Shared, long-lived HTTP client for the Anthropic Messages API.
+
+One AnthropicClient is created per app (see the lifespan in main.py) so
+connections are kept alive and reused across /generate calls instead of
+paying a fresh TCP + TLS handshake per debrief.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Dict
+
+import httpx
+
+from metrics import ERRORS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from rate_limiter import (
+    RETRYABLE_STATUSES, THROTTLE_STATUSES, AdaptiveConcurrency, RateLimitStats, TokenBucket,
+    backoff_delay, estimate_tokens, retry_after_seconds,
+)
+
+ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
+ANTHROPIC_VERSION = "2023-06-01"
+
+logger = logging.getLogger("bane.llm_client")
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, default))
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, default))
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (installed via httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class AnthropicStreamError(Exception):
+    """An `error` event received in the middle of a streamed response."""
+
+
+def text_block(text: str, cache: bool = False) -> Dict[str, Any]:
+    """A system/message text block, optionally marked as a prompt-cache breakpoint."""
+    block: Dict[str, Any] = {"type": "text", "text": text}
+    if cache:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+def system_text(payload: Dict[str, Any]) -> str:
+    """The full system prompt of a payload, whether given as a string or as text blocks."""
+    system = payload.get("system") or ""
+    if isinstance(system, str):
+        return system
+    return "".join(block.get("text", "") for block in system)
+
+
+# Usage fields reported per response -> bane_llm_tokens kind label
+USAGE_TOKEN_KINDS = {
+    "input_tokens": "input",
+    "cache_creation_input_tokens": "cache_creation",
+    "cache_read_input_tokens": "cache_read",
+    "output_tokens": "output",
+}
+
+def observe_usage(usage: Dict[str, Any]) -> None:
+    """Records one response's token counts in the bane_llm_tokens histogram."""
+    for field, kind in USAGE_TOKEN_KINDS.items():
+        if usage.get(field) is not None:
+            LLM_TOKENS.observe(usage[field], kind=kind)
+
+def observe_attempt(mode: str, start: float, outcome: str) -> None:
+    """Records one upstream attempt's latency; anything but a 200 or a cancellation also counts as an error."""
+    LLM_REQUEST_SECONDS.observe(time.perf_counter() - start, mode=mode, outcome=outcome)
+    if outcome not in ("200", "cancelled"):
+        ERRORS.inc(source="llm", status=outcome)
+
+
+class UsageStats:
+    """Token usage reported by the API, including prompt-cache reads and writes."""
+
+    def __init__(self) -> None:
+        self.responses = 0
+        self.input_tokens = 0 # Uncached input tokens
+        self.cache_creation_input_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.output_tokens = 0
+        self.responses_with_cache_read = 0
+
+    def record(self, usage: Dict[str, Any]) -> None:
+        self.input_tokens += usage.get("input_tokens") or 0
+        self.cache_creation_input_tokens += usage.get("cache_creation_input_tokens") or 0
+        self.cache_read_input_tokens += usage.get("cache_read_input_tokens") or 0
+        self.output_tokens += usage.get("output_tokens") or 0
+
+    def record_response(self, usage: Dict[str, Any]) -> None:
+        self.responses += 1
+        if usage.get("cache_read_input_tokens"):
+            self.responses_with_cache_read += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        total_input = self.input_tokens + self.cache_creation_input_tokens + self.cache_read_input_tokens
+        return {
+            **vars(self),
+            # Share of all input tokens served from the prompt cache
+            "cache_hit_ratio": self.cache_read_input_tokens / total_input if total_input else 0.0,
+            # Share of Messages responses that read any prompt-cache tokens (not the server's response cache)
+            "prompt_cache_hit_ratio": self.responses_with_cache_read / self.responses if self.responses else 0.0,
+        }
+
+
+class PoolStats:
+    """Counters describing how hard the connection pool is being used."""
+
+    def __init__(self, max_connections: int) -> None:
+        self.max_connections = max_connections
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.new_connections = 0 # Requests that had to open a TCP connection (vs. reusing a kept-alive one)
+        self.pool_timeouts = 0 # Requests that gave up waiting for a free connection
+        self.acquire_seconds_total = 0.0 # Time from send until request headers went out (pool wait + connect)
+        self.acquire_seconds_max = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        completed = self.requests_total - self.in_flight
+        return {
+            "max_connections": self.max_connections,
+            "requests_total": self.requests_total,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "saturation": self.in_flight / self.max_connections if self.max_connections else 0.0,
+            "new_connections": self.new_connections,
+            "reused_connections": max(completed - self.new_connections, 0),
+            "pool_timeouts": self.pool_timeouts,
+            "avg_acquire_ms": (self.acquire_seconds_total / completed * 1000) if completed else 0.0,
+            "max_acquire_ms": self.acquire_seconds_max * 1000,
+        }
+
+
+class SharedCall:
+    """An upstream call shared by identical concurrent requests, cancelled once nobody awaits it."""
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class AnthropicClient:
+    """
+    Wraps a pooled httpx.AsyncClient with keep-alive, optional HTTP/2 and
+    separate connect/read/write/pool timeouts. Calls pass through RPM/TPM
+    token buckets and an adaptive concurrency cap, and are retried with
+    backoff on 429/529/5xx and on connection failures. Other transport
+    errors (read timeouts, dropped connections) happen after the POST was
+    sent, when the API may already be generating, so they are not retried.
+    All knobs are read from the environment by `from_env`.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None,
+        api_url: str = ANTHROPIC_API_URL,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 120.0,
+        write_timeout: float = 30.0,
+        pool_timeout: float = 10.0,
+        http2: bool = True,
+        rpm_limit: float = 0,
+        tpm_limit: float = 0,
+        max_concurrency: int | None = None,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+    ) -> None:
+        if http2 and not http2_available():
+            logger.warning("h2 package not installed, falling back to HTTP/1.1 for Anthropic API calls")
+            http2 = False
+
+        self.api_url = api_url
+        self.stats = PoolStats(max_connections)
+        self.usage = UsageStats()
+        self.rpm_bucket = TokenBucket(rpm_limit)
+        self.tpm_bucket = TokenBucket(tpm_limit)
+        self.concurrency = AdaptiveConcurrency(max_concurrency or max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rate_stats = RateLimitStats()
+        self.paused_until = 0.0 # Set from retry-after: nothing is sent before this (monotonic) time
+        self.shared_calls: Dict[str, SharedCall] = {}
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                connect=connect_timeout,
+                read=read_timeout,
+                write=write_timeout,
+                pool=pool_timeout,
+            ),
+            headers={
+                "x-api-key": api_key or "",
+                "anthropic-version": ANTHROPIC_VERSION,
+                "content-type": "application/json",
+            },
+        )
+
+    @classmethod
+    def from_env(cls, api_key: str | None) -> "AnthropicClient":
+        return cls(
+            api_key,
+            api_url=os.getenv("ANTHROPIC_API_URL", ANTHROPIC_API_URL),
+            max_connections=env_int("ANTHROPIC_MAX_CONNECTIONS", 20),
+            max_keepalive_connections=env_int("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", 10),
+            keepalive_expiry=env_float("ANTHROPIC_KEEPALIVE_EXPIRY", 30.0),
+            connect_timeout=env_float("ANTHROPIC_CONNECT_TIMEOUT", 10.0),
+            read_timeout=env_float("ANTHROPIC_READ_TIMEOUT", 120.0),
+            write_timeout=env_float("ANTHROPIC_WRITE_TIMEOUT", 30.0),
+            pool_timeout=env_float("ANTHROPIC_POOL_TIMEOUT", 10.0),
+            http2=os.getenv("ANTHROPIC_HTTP2", "1") == "1",
+            rpm_limit=env_float("ANTHROPIC_RPM_LIMIT", 0), # 0 = no client-side limit
+            tpm_limit=env_float("ANTHROPIC_TPM_LIMIT", 0),
+            max_concurrency=env_int("ANTHROPIC_MAX_CONCURRENCY", 0) or None, # Defaults to max_connections
+            max_retries=env_int("ANTHROPIC_MAX_RETRIES", 4),
+            backoff_base=env_float("ANTHROPIC_BACKOFF_BASE", 1.0),
+            backoff_cap=env_float("ANTHROPIC_BACKOFF_CAP", 30.0),
+        )
+
+    def trace_hook(self) -> Callable:
+        """Builds a per-request httpcore trace callback that records connection reuse and acquire time."""
+        stats = self.stats
+        start = time.perf_counter()
+        acquired = False
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal acquired
+            if event_name == "connection.connect_tcp.started":
+                stats.new_connections += 1
+            elif event_name.endswith("send_request_headers.started") and not acquired:
+                acquired = True
+                waited = time.perf_counter() - start
+                stats.acquire_seconds_total += waited
+                stats.acquire_seconds_max = max(stats.acquire_seconds_max, waited)
+
+        return trace
+
+    def request_started(self) -> None:
+        self.stats.requests_total += 1
+        self.stats.in_flight += 1
+        self.stats.peak_in_flight = max(self.stats.peak_in_flight, self.stats.in_flight)
+
+    async def admit(self, payload: Dict[str, Any]) -> int:
+        """
+        Waits out any retry-after pause, then takes one request from the RPM
+        bucket, the estimated tokens from the TPM bucket and a concurrency
+        slot. Returns the token estimate so it can be settled later.
+        """
+        stats = self.rate_stats
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+            stats.throttle_wait_seconds_total += pause
+
+        waited = await self.rpm_bucket.acquire(1)
+        if waited:
+            stats.rpm_waits += 1
+            stats.throttle_wait_seconds_total += waited
+
+        estimate = estimate_tokens(payload)
+        waited = await self.tpm_bucket.acquire(estimate)
+        if waited:
+            stats.tpm_waits += 1
+            stats.throttle_wait_seconds_total += waited
+
+        await self.concurrency.acquire()
+        return estimate
+
+    def settle_tokens(self, estimate: int, usage: Dict[str, Any]) -> None:
+        """Replaces the TPM estimate with the tokens the API actually counted (cache reads are free)."""
+        actual = (usage.get("input_tokens") or 0) + (usage.get("cache_creation_input_tokens") or 0) + (usage.get("output_tokens") or 0)
+        self.tpm_bucket.adjust(actual - estimate)
+
+    def retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        """Backoff before retrying a retryable status; a retry-after also pauses every other call."""
+        if response.status_code == 429:
+            self.rate_stats.rate_limited += 1
+        elif response.status_code == 529:
+            self.rate_stats.overloaded += 1
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            self.rate_stats.retry_after_honored += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        return backoff_delay(attempt, self.backoff_base, self.backoff_cap, retry_after)
+
+    def count_final_failure(self, response: httpx.Response) -> None:
+        if response.status_code in RETRYABLE_STATUSES:
+            self.rate_stats.gave_up += 1
+            if response.status_code == 429:
+                self.rate_stats.rate_limited += 1
+            elif response.status_code == 529:
+                self.rate_stats.overloaded += 1
+
+    async def create_message(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        POSTs a Messages API payload and returns the decoded JSON response.
+        Identical payloads already in flight share one upstream call.
+        Raises httpx.HTTPStatusError / httpx.RequestError like httpx does,
+        once retries are exhausted.
+        """
+        key = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        call = self.shared_calls.get(key)
+        if call is None:
+            call = self.shared_calls[key] = SharedCall(asyncio.create_task(self.send_with_retries(payload)))
+            call.task.add_done_callback(lambda _: self.shared_calls.pop(key, None))
+        else:
+            self.rate_stats.deduplicated += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel() # Every caller went away (e.g. client disconnect)
+
+    async def send_with_retries(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            estimate = await self.admit(payload)
+            throttled, delay = False, 0.0
+            self.request_started()
+            start, outcome = time.perf_counter(), "error"
+            try:
+                response = await self.client.post(self.api_url, json=payload, extensions={"trace": self.trace_hook()})
+                outcome = str(response.status_code)
+                if response.status_code in RETRYABLE_STATUSES and not last_attempt:
+                    throttled = response.status_code in THROTTLE_STATUSES
+                    delay = self.retry_delay(response, attempt)
+                    self.tpm_bucket.adjust(-estimate) # Rejected calls cost nothing
+                else:
+                    if response.is_error:
+                        self.count_final_failure(response)
+                    response.raise_for_status()
+                    api_response = response.json()
+                    usage = api_response.get("usage") or {}
+                    self.usage.record(usage)
+                    self.usage.record_response(usage)
+                    self.settle_tokens(estimate, usage)
+                    observe_usage(usage)
+                    return api_response
+            except httpx.PoolTimeout:
+                self.stats.pool_timeouts += 1
+                outcome = "pool_timeout"
+                raise
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                outcome = "connect_error" # Nothing was sent, so retrying can't duplicate a generation
+                if last_attempt:
+                    self.rate_stats.gave_up += 1
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+            except httpx.TransportError:
+                outcome = "transport_error"
+                raise
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                self.stats.in_flight -= 1
+                self.concurrency.release(throttled)
+                observe_attempt("message", start, outcome)
+
+            self.rate_stats.retries += 1
+            logger.warning("anthropic call failed, retrying", extra={"fields": {"attempt": attempt + 1, "outcome": outcome, "delay_s": round(delay, 2)}})
+            await asyncio.sleep(delay)
+
+    async def stream_message(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        POSTs a Messages API payload with stream=true and yields text deltas
+        as they arrive. Closing the generator (e.g. when the downstream
+        client disconnects) closes the upstream response and cancels the call.
+        Retryable statuses and connection failures are retried like
+        create_message; other failures raise httpx errors, or
+        AnthropicStreamError for an error event mid-stream.
+        """
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            estimate = await self.admit(payload)
+            throttled, delay = False, 0.0
+            usage: Dict[str, Any] = {}
+            self.request_started()
+            start, outcome = time.perf_counter(), "error"
+            try:
+                async with self.client.stream(
+                    "POST", self.api_url, json={**payload, "stream": True}, extensions={"trace": self.trace_hook()}
+                ) as response:
+                    outcome = str(response.status_code)
+                    if response.status_code in RETRYABLE_STATUSES and not last_attempt:
+                        throttled = response.status_code in THROTTLE_STATUSES
+                        delay = self.retry_delay(response, attempt)
+                        self.tpm_bucket.adjust(-estimate)
+                    else:
+                        if response.is_error:
+                            self.count_final_failure(response)
+                            await response.aread() # Load the error body so callers can report it
+                            response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue # Event names are repeated in the data payload's "type"
+                            data = json.loads(line[len("data:"):])
+                            if data.get("type") == "content_block_delta" and data.get("delta", {}).get("type") == "text_delta":
+                                yield data["delta"]["text"]
+                            elif data.get("type") == "message_start":
+                                # Input and prompt-cache usage arrive up front; output tokens in message_delta
+                                usage = {**(data.get("message", {}).get("usage") or {}), "output_tokens": 0}
+                                self.usage.record(usage)
+                                self.usage.record_response(usage)
+                            elif data.get("type") == "message_delta":
+                                output_tokens = (data.get("usage") or {}).get("output_tokens") or 0
+                                usage["output_tokens"] = output_tokens
+                                self.usage.record({"output_tokens": output_tokens})
+                            elif data.get("type") == "error":
+                                outcome = "stream_error"
+                                raise AnthropicStreamError(data.get("error", {}).get("message", "Unknown streaming error"))
+                        self.settle_tokens(estimate, usage)
+                        observe_usage(usage)
+                        return
+            except httpx.PoolTimeout:
+                self.stats.pool_timeouts += 1
+                outcome = "pool_timeout"
+                raise
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                outcome = "connect_error"
+                if last_attempt:
+                    self.rate_stats.gave_up += 1
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+            except httpx.TransportError:
+                outcome = "transport_error"
+                raise
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled" # Downstream client went away
+                raise
+            finally:
+                self.stats.in_flight -= 1
+                self.concurrency.release(throttled)
+                observe_attempt("stream", start, outcome)
+
+            self.rate_stats.retries += 1
+            logger.warning("anthropic stream failed to start, retrying", extra={"fields": {"attempt": attempt + 1, "outcome": outcome, "delay_s": round(delay, 2)}})
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,210 @@
+"""
+Compaction of NL logs to a token budget before LLM evaluation.
+
+Long sorties repeat themselves: the same group is re-detected every few
+seconds, fuel states are re-reported and every missile of a salvo gets its
+own FIRE line. Compaction first folds each run of similar events into one
+summary line at the run's first timestamp, e.g.
+
+    TIME: 00h03m10s MAGIC (E-3) detects: red_grp_1 (4x Fighter) at 180->145 NM, min 92. [6x until 00h04m40s]
+
+then, if the log is still over the budget, drops the lowest-priority lines
+evenly across the mission. Annotated lines (mistakes, notes), processing
+errors and phase transitions are always kept verbatim.
+
+Token counts are estimated from characters (no tokenizer dependency).
+"""
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+from windowed_eval import line_seconds
+
+# Conservative chars/token for NL logs: numbers and callsigns tokenize denser than prose (~4)
+CHARS_PER_TOKEN = 3.5
+
+# Similar events further apart than this (mission seconds) start a new run
+RUN_GAP_SECONDS = 120
+
+# Lines containing these start a new phase of the mission: always kept, and no run spans them
+PHASE_MARKERS = ("Mission Start.", "Mission End.", "PICTURE CLEAN", "MILLER TIME", "initiates SLIDE", "MISSION_PHASE")
+
+# Lines dropped first when over budget (sensor and status chatter); everything else unprotected goes next
+LOW_PRIORITY_MARKERS = (" detects", " fuel state: ", " status changed: ")
+
+LINE_PATTERN = re.compile(r"^TIME: (\S+) (.*)$")
+RANGE_PATTERN = re.compile(r"\b(\d+) NM\b")
+FIRE_PATTERN = re.compile(r"^(.+? fires \S+ at )(.+?)((?: at \d+ NM)?\.)$")
+
+# Appended when lines were dropped, so the evaluator knows the log is incomplete
+OMITTED_NOTE = "[{dropped} lower-priority events omitted to fit the evaluation budget; repeated events are summarized as '[Nx until ...]'.]"
+
+# Fire targets listed in a salvo summary before "+N more"
+MAX_LISTED_TARGETS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def is_protected(line: str) -> bool:
+    """Lines compaction never folds or drops: non-event lines, annotations, errors and phase transitions."""
+    return not line.startswith("TIME:") or "*(" in line or "ERROR" in line or is_phase_transition(line)
+
+def is_phase_transition(line: str) -> bool:
+    return any(marker in line for marker in PHASE_MARKERS)
+
+def similarity_key(description: str) -> Tuple[str, List[List[str]]]:
+    """
+    (key, slots): events with the same key are "similar" and the slots
+    hold what differs between them. Ranges ("at 145 NM") are slots
+    everywhere; a FIRE line's target is a slot too, so a salvo folds into one line.
+    """
+    target_slot: List[List[str]] = []
+    fire = FIRE_PATTERN.match(description)
+    if fire:
+        description = fire.group(1) + "\x00" + fire.group(3)
+        target_slot = [[fire.group(2)]]
+    ranges = RANGE_PATTERN.findall(description)
+    key = RANGE_PATTERN.sub("\x01 NM", description)
+    return key, target_slot + [[value] for value in ranges]
+
+def render_targets(values: List[str]) -> str:
+    unique = list(dict.fromkeys(values))
+    listed = ", ".join(unique[:MAX_LISTED_TARGETS])
+    return listed + (f" +{len(unique) - MAX_LISTED_TARGETS} more" if len(unique) > MAX_LISTED_TARGETS else "")
+
+def render_range(values: List[str]) -> str:
+    """
+    First->last range of a run, plus the extremes the run passed beyond
+    them, so a dip inside a rule threshold isn't hidden: "151->145 NM, min 92".
+    """
+    first, last = int(values[0]), int(values[-1])
+    text = f"{first} NM" if first == last else f"{first}->{last} NM"
+    low, high = min(map(int, values)), max(map(int, values))
+    if low < min(first, last):
+        text += f", min {low}"
+    if high > max(first, last):
+        text += f", max {high}"
+    return text
+
+
+class EventRun:
+    """A run of similar events, rendered as one summary line at its first timestamp."""
+
+    def __init__(self, line: str, first_time: str, seconds: int, key: str, slots: List[List[str]]) -> None:
+        self.line = line
+        self.first_time = first_time
+        self.last_time = first_time
+        self.last_seconds = seconds
+        self.key = key
+        self.slots = slots
+        self.count = 1
+
+    def add(self, time_str: str, seconds: int, slots: List[List[str]]) -> None:
+        self.last_time = time_str
+        self.last_seconds = seconds
+        self.count += 1
+        for values, new in zip(self.slots, slots):
+            values.extend(new)
+
+    def render(self) -> str:
+        if self.count == 1:
+            return self.line
+        parts = self.key.split("\x00")
+        text = parts[0]
+        if len(parts) > 1: # FIRE line: the first slot is the target list
+            text += render_targets(self.slots[0]) + parts[1]
+        range_slots = self.slots[1:] if len(parts) > 1 else self.slots
+        for values in range_slots:
+            text = text.replace("\x01 NM", render_range(values), 1)
+        return f"TIME: {self.first_time} {text} [{self.count}x until {self.last_time}]"
+
+
+def fold_runs(lines: List[str], run_gap_seconds: int) -> Tuple[List[Any], int]:
+    """
+    Folds runs of similar unprotected events (same key, at most
+    `run_gap_seconds` apart, not across a phase transition). Returns the
+    output lines (EventRun objects for folded runs) and how many lines were folded away.
+    """
+    output: List[Any] = []
+    open_runs: Dict[str, EventRun] = {}
+    folded = 0
+    for line in lines:
+        if is_protected(line):
+            if is_phase_transition(line):
+                open_runs.clear()
+            output.append(line)
+            continue
+        match = LINE_PATTERN.match(line)
+        seconds = line_seconds(line)
+        if match is None or seconds is None:
+            output.append(line)
+            continue
+        time_str, description = match.groups()
+        key, slots = similarity_key(description)
+        run = open_runs.get(key)
+        if run is not None and seconds - run.last_seconds <= run_gap_seconds:
+            run.add(time_str, seconds, slots)
+            folded += 1
+        else:
+            run = open_runs[key] = EventRun(line, time_str, seconds, key, slots)
+            output.append(run)
+    return output, folded
+
+def drop_to_budget(lines: List[str], token_budget: int) -> Tuple[List[str], int]:
+    """
+    Drops unprotected lines, low-priority ones first, spread evenly over
+    the mission, until the text fits `token_budget` (or nothing droppable is
+    left). Returns the kept lines and the number dropped.
+    """
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    chars = len("\n".join(lines)) # Counted in characters: per-line token estimates would round the savings up
+    keep = [True] * len(lines)
+    dropped = 0
+    tiers = [
+        [i for i, line in enumerate(lines) if not is_protected(line) and any(marker in line for marker in LOW_PRIORITY_MARKERS)],
+        [i for i, line in enumerate(lines) if not is_protected(line) and not any(marker in line for marker in LOW_PRIORITY_MARKERS)],
+    ]
+    for tier in tiers:
+        while chars > budget_chars and tier:
+            tier_chars = sum(len(lines[i]) + 1 for i in tier)
+            # Drop the share of the tier the excess needs (at least one line), at even spacing
+            count = min(len(tier), math.ceil(len(tier) * (chars - budget_chars) / tier_chars))
+            positions = {int((k + 0.5) * len(tier) / count) for k in range(count)}
+            for position in positions:
+                keep[tier[position]] = False
+                chars -= len(lines[tier[position]]) + 1
+            dropped += len(positions)
+            tier = [i for position, i in enumerate(tier) if position not in positions]
+    return [line for line, kept in zip(lines, keep) if kept], dropped
+
+def compact_log(nl_log: str, token_budget: int | None = None, run_gap_seconds: int = RUN_GAP_SECONDS) -> Tuple[str, Dict[str, Any]]:
+    """
+    Compacts an NL log: folds runs of similar events, then drops lines to
+    fit `token_budget` estimated tokens (None or 0: fold only). Returns the
+    compacted log and a report with the token estimates and compression ratio.
+    """
+    lines = nl_log.split("\n")
+    folded_lines, folded = fold_runs(lines, run_gap_seconds)
+    compacted_lines = [line if isinstance(line, str) else line.render() for line in folded_lines]
+
+    dropped = 0
+    if token_budget and estimate_tokens("\n".join(compacted_lines)) > token_budget:
+        note_tokens = estimate_tokens(OMITTED_NOTE.format(dropped=len(compacted_lines))) + 1
+        compacted_lines, dropped = drop_to_budget(compacted_lines, max(token_budget - note_tokens, 0))
+    if dropped:
+        compacted_lines.append(OMITTED_NOTE.format(dropped=dropped))
+
+    compacted = "\n".join(compacted_lines)
+    original_tokens, compacted_tokens = estimate_tokens(nl_log), estimate_tokens(compacted)
+    return compacted, {
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "compression_ratio": round(original_tokens / compacted_tokens, 3) if compacted_tokens else 1.0,
+        "original_lines": len(lines),
+        "compacted_lines": len(compacted_lines),
+        "folded_lines": folded,
+        "dropped_lines": dropped,
+        "token_budget": token_budget or None,
+        "within_budget": not token_budget or compacted_tokens <= token_budget,
+    }
@@ -1,9 +1,17 @@
 import os
+import json
+import logging
+import time
+import asyncio
+import uuid
 import httpx
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
-from pydantic import BaseModel, Field
-from typing import Dict, Any, List
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Callable, Dict, Any, List, Literal, Tuple
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -11,19 +19,128 @@ from dotenv import load_dotenv
 
 # --- Import the system prompts ---
 from prompts import WARGAME_EVALUATOR_SYSTEM_PROMPT, PROMPT_EXTRACT_MISTAKES_SHORT # Added PROMPT_EXTRACT_MISTAKES_SHORT
+from prompts import PROMPT_WINDOW_EVALUATION_SUFFIX, PROMPT_REDUCE_FEEDBACK, PROMPT_SELECTIVE_EVALUATION_SUFFIX, PROMPT_STRUCTURED_OUTPUT_SUFFIX
+from converter import NLLogConverter, convert_log, convert_log_body
+from event_decoding import EventDecodeError, LogEvent, decode_event, parse_json
+from llm_client import AnthropicClient, AnthropicStreamError, system_text, text_block
+from response_cache import ResponseCache, cache_key
+from feedback_blocks import TIMESTAMP, split_feedback_blocks
+from job_queue import JobQueue
+from log_compaction import compact_log, estimate_tokens
+from live_session import LiveSession, LiveSessionStore
+from structured_feedback import StructuredFeedbackError, parse_structured_feedback, with_feedback_tool
+from selective_eval import clean_closing, clean_segments_note, clean_window_entries, mission_summary, partition_windows
+from mistake_index import MistakeIndex, parse_findings, sortie_hasher, sortie_id
+from ttp_corpus import TTPCorpus, format_sections
+from video_index import VideoIndexError, VideoLibrary
+from metrics import (
+    CONVERSION_EVENT_SECONDS, CONVERSION_EVENTS, CONVERSION_RULE_SECONDS, CONVERSION_SECONDS, ERRORS,
+    HTTP_REQUEST_SECONDS, HTTP_REQUESTS, JOB_QUEUE_DEPTH, JOBS_RUNNING, LIVE_SESSIONS, LLM_CONCURRENCY_LIMIT, LLM_IN_FLIGHT,
+    LOG_COMPACTED_TOKENS, LOG_COMPRESSION_RATIO,
+    REQUEST_VALIDATION_SECONDS, RESPONSE_CACHE_LOOKUPS, render_metrics,
+)
+from structured_log import configure_logging, log_sampled
+from windowed_eval import build_window_text, merge_window_feedback, mission_setup_line, split_log_windows
 
 # Load environment variables from .env file
 load_dotenv()
 
+# JSON log lines on stderr, written by a background thread; per-request info logs are sampled (LOG_SAMPLE_RATE)
+configure_logging()
+logger = logging.getLogger("bane.api")
+
 # Get the API key from environment variables
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
-ANTHROPIC_API_URL = "https://api.anthropic.com/v1/messages"
 
 if not ANTHROPIC_API_KEY:
-    print("Warning: ANTHROPIC_API_KEY environment variable not set. /generate endpoint will fail.")
+    logger.warning("ANTHROPIC_API_KEY environment variable not set, /generate endpoint will fail")
     # raise ValueError("ANTHROPIC_API_KEY environment variable not set.") # Optional: Keep if /generate MUST work
 
-app = FastAPI()
+# Number of worker processes for CPU-bound log conversion (defaults to CPU count)
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", os.cpu_count() or 1))
+
+# Mark the built-in system prompts as prompt-cache breakpoints so their prefill is reused across calls
+PROMPT_CACHING = os.getenv("PROMPT_CACHING", "1") == "1"
+
+# --- Windowed (map-reduce) evaluation settings ---
+WINDOW_SECONDS = int(os.getenv("WINDOW_SECONDS", 900)) # Mission time covered by one window
+WINDOW_MAX_CHARS = int(os.getenv("WINDOW_MAX_CHARS", 24000)) # ~6k input tokens of focus lines per window
+WINDOW_OVERLAP_LINES = int(os.getenv("WINDOW_OVERLAP_LINES", 3)) # Context lines shared with each neighbouring window
+WINDOW_CONCURRENCY = int(os.getenv("WINDOW_CONCURRENCY", 4)) # Window calls in flight per request
+SELECTIVE_WINDOW_SECONDS = int(os.getenv("SELECTIVE_WINDOW_SECONDS", 300)) # Shorter windows: less clean context sent around each finding
+
+# Estimated input tokens an NL log is compacted to before evaluation (0: only fold repeated events)
+LOG_TOKEN_BUDGET = int(os.getenv("LOG_TOKEN_BUDGET", 20000))
+
+# Longest a GET /jobs/{job_id}?wait=... long-poll may block
+JOB_MAX_WAIT_SECONDS = float(os.getenv("JOB_MAX_WAIT_SECONDS", 60))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bounded process pool so large logs convert in parallel without blocking the event loop
+    app.state.conversion_executor = ProcessPoolExecutor(max_workers=CONVERSION_WORKERS, initializer=configure_logging, initargs=(False,))
+    # One pooled Anthropic client for the app's lifetime so connections are kept alive between calls
+    app.state.anthropic = AnthropicClient.from_env(ANTHROPIC_API_KEY)
+    # Memory LRU + SQLite cache of generated feedback, keyed on the full request content
+    app.state.response_cache = ResponseCache.from_env()
+    # Persistent queue of /jobs submissions, worked off by a fixed number of async workers
+    app.state.job_queue = JobQueue.from_env(run_job)
+    # SQLite index of every converted sortie's findings, for /mistakes/trends
+    app.state.mistake_index = MistakeIndex.from_env()
+    # Converter state of live /live WebSocket sorties, snapshotted to SQLite for resumption
+    app.state.live_sessions = LiveSessionStore.from_env()
+    # BM25 index of the TTP reference documents (cached on disk by file hash), for prompt context
+    app.state.ttp_corpus = await asyncio.to_thread(TTPCorpus.from_env)
+    # Sortie recordings and their keyframe indexes (only the moov box is read; cached on disk), for seeking
+    app.state.videos = VideoLibrary.from_env()
+    await asyncio.to_thread(app.state.videos.warm)
+    await app.state.job_queue.start()
+    yield
+    await app.state.job_queue.stop()
+    await app.state.live_sessions.snapshot_active()
+    app.state.live_sessions.close()
+    app.state.mistake_index.close()
+    app.state.response_cache.close()
+    await app.state.anthropic.aclose()
+    app.state.conversion_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
+
+
+class MetricsMiddleware:
+    """
+    Records request counts, durations (until the response body is sent) and
+    error statuses per route template. Plain ASGI rather than
+    BaseHTTPMiddleware so streamed request and response bodies pass through untouched.
+    """
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500 # Reported if the app raises before starting a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # FastAPI sets scope["route"] once a route matched; templates keep label cardinality bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status))
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=route)
+            if status >= 400:
+                ERRORS.inc(source="http", status=str(status))
+
+app.add_middleware(MetricsMiddleware)
 
 # Allow CORS for your frontend
 app.add_middleware(
@@ -43,6 +160,21 @@ class GenerateTextInput(BaseModel):
     # or provide a custom prompt string directly.
     # If omitted or null, "default" will be used.
     system_prompt: str | None = None # Default to None, logic will handle it as "default"
+    # Skip the response cache lookup and force a fresh Anthropic call (the result still refreshes the cache)
+    bypass_cache: bool = False
+    # Stream the feedback back as server-sent events, one event per completed TIME: block
+    stream: bool = False
+    # Map-reduce evaluation for long sorties: evaluate time windows concurrently, then merge
+    windowed: bool = False
+    # Rule-first evaluation: only windows with rule findings go to the model, clean ones are rated locally
+    selective: bool = False
+    # Return the debrief as validated JSON ("feedback"), produced through a forced tool call, instead of free text
+    structured: bool = False
+    # TTP reference sections retrieved for the built-in prompts (None: TTP_TOP_K, 0: none)
+    ttp_sections: int | None = None
+    # Fold repeated events and fit a log over token_budget to it before evaluation (None: LOG_TOKEN_BUDGET, 0: always fold)
+    compact: bool = True
+    token_budget: int | None = None
 
 # --- Models for /json_to_nl_log endpoint (renamed and updated) ---
 class LogEntry(BaseModel):
@@ -52,68 +184,46 @@ class LogEntry(BaseModel):
 
 class LogInput(BaseModel):
     log_data: List[LogEntry]
+    # Mistake index keys; default to the SETUP scenario_name and the "Team N" in it
+    team: str | None = None
+    scenario: str | None = None
 
+# --- Model for /debrief endpoint ---
+class DebriefInput(BaseModel):
+    log_data: List[LogEntry]
+    # Same selector as GenerateTextInput.system_prompt ("default", "short" or custom text)
+    system_prompt: str | None = None
+    bypass_cache: bool = False
+    windowed: bool = False
+    selective: bool = False
+    structured: bool = False
+    ttp_sections: int | None = None
+    compact: bool = True
+    token_budget: int | None = None
+    team: str | None = None
+    scenario: str | None = None
 
-# --- Helper Functions for Natural Language Conversion ---
-
-def format_time(seconds: int) -> str:
-    """Converts seconds to hh:mm:ss format."""
-    h = seconds // 3600
-    m = (seconds % 3600) // 60
-    s = seconds % 60
-    return f"{h:02d}h{m:02d}m{s:02d}s"
-
-asset_lookup: Dict[str, Dict[str, Any]] = {}
-
-def get_asset_name(asset_id: str) -> str:
-    """Looks up callsign and type, e.g., 'SATAN 1 (F-22)'."""
-    asset = asset_lookup.get(asset_id)
-    if asset:
-        callsign = asset.get('callsign', 'Unknown Callsign')
-        asset_type = asset.get('type', 'Unknown Type')
-        return f"{callsign} ({asset_type})"
-    if asset_id and "red_" in asset_id:
-        return f"Enemy Asset ({asset_id.replace('red_', '')})"
-    return asset_id
-
-def calculate_distance_simple_y(pos1_y: float | int, pos2_y: float | int) -> float:
-    """Simplified distance calculation based only on Y coordinate for demo."""
-    return abs(pos1_y - pos2_y)
 
 # --- /generate endpoint (UPDATED logic for system_prompt) ---
-@app.post("/generate")
-async def generate_text(text_input: GenerateTextInput):
+def build_generate_payload(text_input: GenerateTextInput, ttp_corpus: TTPCorpus | None = None) -> Dict[str, Any]:
     """
-    Receives user text and a system prompt identifier/text, sends it to the
-    Anthropic API, and returns the generated text.
-    - system_prompt="default" or null: Uses WARGAME_EVALUATOR_SYSTEM_PROMPT.
-    - system_prompt="short": Uses PROMPT_EXTRACT_MISTAKES_SHORT.
-    - system_prompt=<other string>: Uses the provided string as a custom prompt.
-    (Requires ANTHROPIC_API_KEY)
+    Resolves the system prompt selector and builds the Anthropic Messages
+    payload. Built-in prompts are followed by the TTP sections from
+    `ttp_corpus` that best match the log, instead of the whole doctrine.
     """
-    if not ANTHROPIC_API_KEY:
-         raise HTTPException(status_code=503, detail="ANTHROPIC_API_KEY not configured for this endpoint.")
-
-    headers = {
-        "x-api-key": ANTHROPIC_API_KEY,
-        "anthropic-version": "2023-06-01",
-        "content-type": "application/json",
-    }
-
     # --- NEW: System Prompt Selection Logic ---
     system_prompt_to_use: str | None = None # Initialize
     prompt_input = text_input.system_prompt # Get the value from input
+    cache_system_prompt = PROMPT_CACHING # Built-in prompts are stable prefixes; custom ones may never repeat
 
     if prompt_input is None or prompt_input.strip().lower() == "default":
         system_prompt_to_use = WARGAME_EVALUATOR_SYSTEM_PROMPT
-        print("Using DEFAULT system prompt.")
     elif prompt_input.strip().lower() == "short":
         system_prompt_to_use = PROMPT_EXTRACT_MISTAKES_SHORT
-        print("Using SHORT system prompt.")
     else:
         # Use the provided string directly as a custom prompt
         system_prompt_to_use = prompt_input
-        print(f"Using CUSTOM system prompt: '{prompt_input[:50]}...'") # Log truncated prompt
+        cache_system_prompt = False
     # --- End of New Logic ---
 
     messages = [{"role": "user", "content": text_input.user_text}]
@@ -127,342 +237,864 @@ async def generate_text(text_input: GenerateTextInput):
 
     # Conditionally add the system prompt to the payload if one was determined
     if system_prompt_to_use:
-         payload["system"] = system_prompt_to_use
+         # Sent as text blocks so stable prompts can carry a cache_control breakpoint
+         payload["system"] = [text_block(system_prompt_to_use, cache=cache_system_prompt)]
+         if ttp_corpus is not None and system_prompt_to_use in (WARGAME_EVALUATOR_SYSTEM_PROMPT, PROMPT_EXTRACT_MISTAKES_SHORT):
+             # After the cached prompt block, so the per-log sections don't break its prefix cache
+             sections = ttp_corpus.retrieve(text_input.user_text, text_input.ttp_sections)
+             if sections:
+                 payload["system"].append(text_block(format_sections(sections)))
     else:
         # Handle case where no system prompt should be used (e.g., if logic determined None)
         # Depending on API requirements, you might need an empty string or omit the key.
         # Anthropic API allows omitting the 'system' key.
-        print("No system prompt will be sent to the API.")
+        logger.debug("no system prompt will be sent to the API")
+
+    return payload
 
+async def compact_for_evaluation(text_input: GenerateTextInput) -> Tuple[GenerateTextInput, Dict[str, Any] | None]:
+    """
+    Compacts text_input.user_text (see log_compaction). Windowed and
+    selective evaluation only fold repeated events: their windows already bound each call. Returns
+    the input to evaluate and the compaction report (None if disabled, or if the log already fits
+    the budget: compaction is CPU-bound and would otherwise run on every request).
+    """
+    if not text_input.compact:
+        return text_input, None
+    budget = 0 if text_input.windowed or text_input.selective else (LOG_TOKEN_BUDGET if text_input.token_budget is None else text_input.token_budget)
+    if budget and estimate_tokens(text_input.user_text) <= budget:
+        return text_input, None
+    compacted, compaction = await asyncio.to_thread(compact_log, text_input.user_text, budget)
+    LOG_COMPRESSION_RATIO.observe(compaction["compression_ratio"])
+    LOG_COMPACTED_TOKENS.observe(compaction["compacted_tokens"])
+    log_sampled(logger, "log compacted", **compaction)
+    return text_input.copy(update={"user_text": compacted}), compaction
+
+def payload_summary(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Log fields describing a Messages API payload without its (large) text."""
+    return {
+        "model": payload["model"],
+        "max_tokens": payload["max_tokens"],
+        "system_chars": len(system_text(payload)),
+        "user_chars": sum(len(message["content"]) for message in payload["messages"]),
+    }
+
+async def lookup_cached_response(request: Request, payload: Dict[str, Any], bypass_cache: bool) -> Tuple[str, Dict[str, Any] | None, str]:
+    """
+    Returns (cache key, cached content or None, X-Cache status) for a
+    Messages API payload. Only the memory tier is checked on the event loop;
+    the SQLite tier runs in a thread.
+    """
+    response_cache = request.app.state.response_cache
+    user_text = payload["messages"][0]["content"]
+    key = cache_key(payload["model"], payload.get("system"), user_text, payload["max_tokens"])
+    if bypass_cache:
+        response_cache.record_bypass()
+        RESPONSE_CACHE_LOOKUPS.inc(result="bypass")
+        return key, None, "BYPASS"
+    cached, tier = response_cache.get_memory(key), "memory"
+    if cached is None:
+        cached, tier = await asyncio.to_thread(response_cache.get_disk, key)
+    RESPONSE_CACHE_LOOKUPS.inc(result=tier if cached is not None else "miss")
+    return key, cached, f"HIT-{tier.upper()}" if cached is not None else "MISS"
+
+async def generate_from_payload(request: Request, payload: Dict[str, Any], bypass_cache: bool = False) -> Tuple[Dict[str, Any], str]:
+    """
+    Sends one Messages API payload through the response cache. Returns the
+    response content and its X-Cache status; raises HTTPException on errors.
+    """
+    # --- Response cache lookup ---
+    key, cached, cache_status = await lookup_cached_response(request, payload, bypass_cache)
+    if cached is not None:
+        return cached, cache_status
 
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            print(f"Sending payload to Anthropic: {payload}") # Debug: Log payload
-            response = await client.post(ANTHROPIC_API_URL, json=payload, headers=headers)
-            response.raise_for_status()
+        start = time.perf_counter()
+        api_response = await request.app.state.anthropic.create_message(payload)
+        log_sampled(
+            logger, "anthropic response", **payload_summary(payload),
+            latency_ms=round((time.perf_counter() - start) * 1000, 1),
+            stop_reason=api_response.get("stop_reason"), usage=api_response.get("usage"),
+        )
 
-        api_response = response.json()
-        print(f"Received response from Anthropic: {api_response}") # Debug: Log response
+        if "tools" in payload:
+            # Structured mode: validated once here and cached in parsed form, next to the raw JSON
+            content = parse_structured_feedback(api_response, payload["messages"][0]["content"])
+            await asyncio.to_thread(request.app.state.response_cache.set, key, content)
+            return content, cache_status
 
         if api_response.get("content") and len(api_response["content"]) > 0:
              generated_text = api_response["content"][0].get("text", "No text content found.")
+             # Only cache real completions; SQLite write happens off the event loop
+             await asyncio.to_thread(request.app.state.response_cache.set, key, {"generated_text": generated_text})
         else:
              generated_text = "No content generated or unexpected response structure."
 
-        return JSONResponse(content={"generated_text": generated_text})
+        return {"generated_text": generated_text}, cache_status
 
     except httpx.HTTPStatusError as exc:
-        print(f"HTTP error occurred: {exc}")
-        print(f"Response content: {exc.response.text}")
+        logger.warning("anthropic http error", extra={"fields": {"status": exc.response.status_code, "body": exc.response.text[:500]}})
         raise HTTPException(
             status_code=exc.response.status_code,
             detail=f"Error from Anthropic API: {exc.response.text}"
         )
     except httpx.RequestError as exc:
-        print(f"An error occurred while requesting {exc.request.url!r}: {exc}")
+        logger.warning("anthropic request error", extra={"fields": {"url": str(exc.request.url), "error": repr(exc)}})
         raise HTTPException(status_code=503, detail=f"Service unavailable: {exc}")
+    except StructuredFeedbackError as exc:
+        logger.warning("invalid structured feedback", extra={"fields": {"error": str(exc)[:500]}})
+        raise HTTPException(status_code=502, detail=f"Invalid structured feedback from Anthropic API: {exc}")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        logger.exception("unexpected error generating feedback")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def check_evaluation_modes(options: GenerateTextInput | DebriefInput) -> None:
+    if options.structured and (options.windowed or options.selective):
+        raise HTTPException(status_code=400, detail="structured mode cannot be combined with windowed or selective mode.")
 
-# --- /json_to_nl_log endpoint (Implementation remains the same) ---
-@app.post("/json_to_nl_log")
-async def json_to_nl_log(log_input: LogInput):
+async def generate_feedback(request: Request, text_input: GenerateTextInput) -> Tuple[Dict[str, Any], str]:
     """
-    Takes detailed JSON log data, processes it into a natural language format
-    with potential mistake annotations, and returns the text directly.
-    Does NOT call the Anthropic API.
+    Non-streaming core of /generate, shared with /debrief. Uses the
+    selective or windowed map-reduce evaluation when text_input.selective / .windowed is set.
     """
-    global asset_lookup # Allow modification of the global lookup
-    asset_lookup = {} # Clear lookup for each request
-    natural_language_log_lines = []
-    log_data = log_input.log_data
+    if not ANTHROPIC_API_KEY:
+         raise HTTPException(status_code=503, detail="ANTHROPIC_API_KEY not configured for this endpoint.")
 
+    check_evaluation_modes(text_input)
+
+    text_input, compaction = await compact_for_evaluation(text_input)
+    payload = build_generate_payload(text_input, request.app.state.ttp_corpus)
+    if text_input.structured:
+        system = (payload.get("system") or []) + [text_block(PROMPT_STRUCTURED_OUTPUT_SUFFIX)]
+        payload = with_feedback_tool({**payload, "system": system})
+    if text_input.selective:
+        content, cache_status = await generate_selective_feedback(request, text_input, payload)
+    elif text_input.windowed:
+        content, cache_status = await generate_windowed_feedback(request, text_input, payload)
+    else:
+        content, cache_status = await generate_from_payload(request, payload, text_input.bypass_cache)
+    if compaction is not None:
+        content = {**content, "compaction": compaction} # Not part of the cached response: it describes this request's log
+    return content, cache_status
+
+@app.post("/generate")
+async def generate_text(text_input: GenerateTextInput, request: Request):
+    """
+    Receives user text and a system prompt identifier/text, sends it to the
+    Anthropic API, and returns the generated text.
+    - system_prompt="default" or null: Uses WARGAME_EVALUATOR_SYSTEM_PROMPT.
+    - system_prompt="short": Uses PROMPT_EXTRACT_MISTAKES_SHORT.
+    - system_prompt=<other string>: Uses the provided string as a custom prompt.
+    - stream=true: Returns server-sent events instead of JSON (see stream_generate_events).
+    - windowed=true: Evaluates long logs window by window (see generate_windowed_feedback).
+    - selective=true: Evaluates only the windows the rule checks flagged (see generate_selective_feedback).
+    - structured=true: Also returns the debrief as validated JSON in "feedback" (see structured_feedback).
+    - compact/token_budget: A log over the token budget is compacted before evaluation (see compact_for_evaluation);
+      the response then reports the compression ratio ("compaction", or X-Log-Compression-Ratio when streaming).
+    (Requires ANTHROPIC_API_KEY)
+    """
+    if not ANTHROPIC_API_KEY:
+         raise HTTPException(status_code=503, detail="ANTHROPIC_API_KEY not configured for this endpoint.")
+
+    if text_input.stream:
+        if text_input.windowed or text_input.selective or text_input.structured:
+            raise HTTPException(status_code=400, detail="stream mode cannot be combined with windowed, selective or structured mode.")
+        text_input, compaction = await compact_for_evaluation(text_input)
+        payload = build_generate_payload(text_input, request.app.state.ttp_corpus)
+        key, cached, cache_status = await lookup_cached_response(request, payload, text_input.bypass_cache)
+        headers = {"X-Cache": cache_status, "Cache-Control": "no-cache"}
+        if compaction is not None:
+            headers["X-Log-Compression-Ratio"] = str(compaction["compression_ratio"])
+        return StreamingResponse(
+            stream_generate_events(request, payload, key, cached),
+            media_type="text/event-stream",
+            headers=headers,
+        )
+
+    content, cache_status = await generate_feedback(request, text_input)
+    return JSONResponse(content=content, headers={"X-Cache": cache_status})
+
+
+# --- Windowed (map-reduce) evaluation for long sorties ---
+async def generate_windowed_feedback(request: Request, text_input: GenerateTextInput, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """
+    Map: splits the NL log into overlapping time windows and evaluates them
+    concurrently (at most WINDOW_CONCURRENCY calls in flight).
+    Reduce: merges the per-window TIME: blocks chronologically, then for the
+    default evaluator prompt makes one more call that writes the
+    OVERALL ASSESSMENT / DEBRIEF NOTES closing section.
+    Short logs that fit in one window fall through to a single call.
+    """
+    nl_log = text_input.user_text
+    windows = split_log_windows(nl_log, WINDOW_SECONDS, WINDOW_MAX_CHARS, WINDOW_OVERLAP_LINES)
+    if len(windows) <= 1:
+        return await generate_from_payload(request, payload, text_input.bypass_cache)
+
+    log_sampled(logger, "windowed evaluation", windows=len(windows), concurrency=WINDOW_CONCURRENCY)
+    setup_line = mission_setup_line(nl_log)
+    window_texts = [build_window_text(window, setup_line, index, len(windows)) for index, window in enumerate(windows, start=1)]
+    results = await evaluate_windows(request, payload, window_texts, [], text_input.bypass_cache)
+
+    merged_feedback = merge_window_feedback([content["generated_text"] for content, _ in results])
+    cache_statuses = [status for _, status in results]
+
+    if system_text(payload).startswith(WARGAME_EVALUATOR_SYSTEM_PROMPT):
+        closing, reduce_status = await reduce_feedback(request, payload, merged_feedback, nl_log, text_input.bypass_cache)
+        cache_statuses.append(reduce_status)
+        merged_feedback += "\n\n" + closing
+
+    hits = sum(status.startswith("HIT") for status in cache_statuses)
+    return {"generated_text": merged_feedback, "windows": len(windows)}, f"WINDOWED-{hits}/{len(cache_statuses)}-HIT"
+
+async def evaluate_windows(request: Request, payload: Dict[str, Any], window_texts: List[str], extra_system: List[Dict[str, Any]], bypass_cache: bool) -> List[Tuple[Dict[str, Any], str]]:
+    """Map step: evaluates window user messages concurrently (at most WINDOW_CONCURRENCY in flight)."""
+    # Keep the evaluator prompt as its own cached block so windows share its prefix with regular calls
+    window_system = (payload.get("system") or []) + [text_block(PROMPT_WINDOW_EVALUATION_SUFFIX, cache=PROMPT_CACHING)] + extra_system
+    semaphore = asyncio.Semaphore(WINDOW_CONCURRENCY)
+
+    async def evaluate_window(window_text: str) -> Tuple[Dict[str, Any], str]:
+        window_payload = {**payload, "system": window_system, "messages": [{"role": "user", "content": window_text}]}
+        async with semaphore:
+            return await generate_from_payload(request, window_payload, bypass_cache)
+
+    tasks = [asyncio.create_task(evaluate_window(window_text)) for window_text in window_texts]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        # One window failed (or the request was cancelled): don't leave the others running
+        for task in tasks:
+            task.cancel()
+        raise
+
+async def reduce_feedback(request: Request, payload: Dict[str, Any], merged_feedback: str, nl_log: str, bypass_cache: bool) -> Tuple[str, str]:
+    """Reduce step for the default evaluator prompt: writes the closing section. Returns (closing text, X-Cache status)."""
+    closing_lines = [line for line in nl_log.split("\n") if "Mission End." in line or "ERROR" in line]
+    reduce_payload = {
+        **payload,
+        "system": [text_block(PROMPT_REDUCE_FEEDBACK, cache=PROMPT_CACHING)],
+        "messages": [{"role": "user", "content": merged_feedback + "\n\n" + "\n".join(closing_lines)}],
+    }
+    closing, reduce_status = await generate_from_payload(request, reduce_payload, bypass_cache)
+    return closing["generated_text"].strip(), reduce_status
+
+
+# --- Selective (rule-first) evaluation ---
+async def generate_selective_feedback(request: Request, text_input: GenerateTextInput, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """
+    Splits the NL log into SELECTIVE_WINDOW_SECONDS windows and sends only
+    those with rule findings (see selective_eval) to the model, each with the
+    mission summary as context. For the default evaluator prompt, the key
+    actions of clean windows get templated "Correct" entries, and the reduce
+    pass sees the model's entries plus one line describing the clean
+    segments; a sortie without findings needs no model call at all.
+    """
+    nl_log = text_input.user_text
+    windows = split_log_windows(nl_log, SELECTIVE_WINDOW_SECONDS, WINDOW_MAX_CHARS, WINDOW_OVERLAP_LINES)
+    flagged, clean = partition_windows(windows)
+    log_sampled(logger, "selective evaluation", windows=len(windows), flagged=len(flagged), concurrency=WINDOW_CONCURRENCY)
+
+    setup_line, summary = mission_setup_line(nl_log), mission_summary(nl_log)
+    window_texts = [build_window_text(window, setup_line, index, len(windows), summary) for index, window in flagged]
+    results = await evaluate_windows(
+        request, payload, window_texts, [text_block(PROMPT_SELECTIVE_EVALUATION_SUFFIX, cache=PROMPT_CACHING)], text_input.bypass_cache,
+    )
+    evaluated_feedback = merge_window_feedback([content["generated_text"] for content, _ in results])
+    cache_statuses = [status for _, status in results]
+
+    if not system_text(payload).startswith(WARGAME_EVALUATOR_SYSTEM_PROMPT):
+        # Other prompts (e.g. "short" mistake extraction) have nothing to say about clean segments
+        feedback = evaluated_feedback
+    else:
+        clean_entries = [entry for window in clean for entry in clean_window_entries(window)]
+        feedback = merge_window_feedback([evaluated_feedback] + clean_entries)
+        if flagged:
+            closing, reduce_status = await reduce_feedback(
+                request, payload, evaluated_feedback + "\n\n" + clean_segments_note(clean, len(clean_entries)), nl_log, text_input.bypass_cache,
+            )
+            cache_statuses.append(reduce_status)
+        else:
+            closing = clean_closing(nl_log)
+        feedback += "\n\n" + closing
+
+    hits = sum(status.startswith("HIT") for status in cache_statuses)
+    content = {"generated_text": feedback, "windows": len(windows), "evaluated_windows": len(flagged)}
+    return content, f"SELECTIVE-{hits}/{len(cache_statuses)}-HIT"
+
+
+# --- Streaming (SSE) mode for /generate ---
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formats one server-sent event with a JSON data payload (keeps newlines safe)."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_generate_events(request: Request, payload: Dict[str, Any], key: str, cached: Dict[str, Any] | None):
+    """
+    Relays the upstream token stream as SSE:
+    - `block`: {"text": ...} for each complete TIME: feedback block (and the preamble / closing assessment)
+    - `done`: {"generated_text": ...} with the full text once the model finishes
+    - `error`: {"status": ..., "detail": ...} if the upstream call fails after the response started
+    If the client disconnects, Starlette cancels this generator, which closes
+    the upstream stream and cancels the Anthropic request.
+    """
+    if cached is not None:
+        blocks, remainder = split_feedback_blocks(cached["generated_text"])
+        for block in blocks + [remainder]:
+            if block.strip():
+                yield sse_event("block", {"text": block})
+        yield sse_event("done", cached)
+        return
+
+    generated_parts: List[str] = []
+    buffer = ""
+    try:
+        log_sampled(logger, "anthropic stream", **payload_summary(payload))
+        async for text_delta in request.app.state.anthropic.stream_message(payload):
+            generated_parts.append(text_delta)
+            buffer += text_delta
+            blocks, buffer = split_feedback_blocks(buffer)
+            for block in blocks:
+                yield sse_event("block", {"text": block})
+    except httpx.HTTPStatusError as exc:
+        logger.warning("anthropic http error while streaming", extra={"fields": {"status": exc.response.status_code, "body": exc.response.text[:500]}})
+        yield sse_event("error", {"status": exc.response.status_code, "detail": f"Error from Anthropic API: {exc.response.text}"})
+        return
+    except httpx.RequestError as exc:
+        logger.warning("anthropic request error while streaming", extra={"fields": {"url": str(exc.request.url), "error": repr(exc)}})
+        yield sse_event("error", {"status": 503, "detail": f"Service unavailable: {exc}"})
+        return
+    except AnthropicStreamError as exc:
+        logger.warning("anthropic stream error", extra={"fields": {"error": str(exc)}})
+        yield sse_event("error", {"status": 502, "detail": f"Error from Anthropic API: {exc}"})
+        return
+
+    if buffer.strip():
+        yield sse_event("block", {"text": buffer})
+    generated_text = "".join(generated_parts)
+    if generated_text:
+        await asyncio.to_thread(request.app.state.response_cache.set, key, {"generated_text": generated_text})
+    else:
+        generated_text = "No content generated or unexpected response structure."
+    yield sse_event("done", {"generated_text": generated_text})
+
+
+# --- /json_to_nl_log endpoint ---
+def record_conversion_metrics(report: Dict[str, Any]) -> None:
+    """Records the timings from a conversion report (see NLLogConverter.report)."""
+    if "total" in report:
+        CONVERSION_SECONDS.observe(report["total"])
+    if "decode" in report:
+        REQUEST_VALIDATION_SECONDS.observe(report["decode"], path="fast")
+    for event_type, (count, seconds) in report["events"].items():
+        CONVERSION_EVENTS.inc(count, event_type=event_type)
+        CONVERSION_EVENT_SECONDS.observe(seconds, event_type=event_type)
+    for rule, (calls, seconds) in report["rules"].items():
+        if calls:
+            CONVERSION_RULE_SECONDS.observe(seconds, rule=rule)
+
+async def index_sortie(request: Request, natural_language_log: str, report: Dict[str, Any], team: str | None, scenario: str | None) -> str:
+    """Records a converted sortie's findings in the mistake index (off the event loop) and returns its sortie id."""
+    sortie = sortie_id(natural_language_log)
+    await asyncio.to_thread(request.app.state.mistake_index.record, sortie, report, team, scenario)
+    return sortie
+
+async def run_conversion(request: Request, log_data: List[LogEntry]) -> Tuple[str, Dict[str, Any]]:
+    """Converts validated log entries in the conversion process pool. Returns (NL log, conversion report)."""
     if not log_data:
         raise HTTPException(status_code=400, detail="log_data cannot be empty.")
 
-    # --- State variables for mistake checks ---
-    cap_y_coord = None
-    pepz_y_coord = None
-    last_awacs_detection_range = None
-    last_awacs_detection_time = None
-    awacs_last_pos = None
-    fighter_commit_range = None
-    picture_clean_time = None
-    f22_target_prio = None # Track if F22s targeted lower prio group
-    fighter_elements_cold = {} # Track which fighters went cold prematurely {timestamp: [asset_id]}
-
-    # --- Main Conversion Logic Loop ---
-    for entry in log_data:
-        log_entry = entry.dict() # Convert Pydantic model to dict for easier access
-        timestamp = log_entry["timestamp"]
-        time_str = format_time(timestamp)
-        event_type = log_entry["event_type"]
-        details = log_entry["details"]
-        event_description = "Unknown Event" # Default
-
-        try: # Wrap processing in try-except for robustness
-            if event_type == "SETUP":
-                asset_lookup = {asset['id']: asset for asset in details.get('blue_forces', [])}
-                if not asset_lookup:
-                     natural_language_log_lines.append(f"TIME: {time_str} WARNING: SETUP event missing blue_forces list.")
-                     continue
-
-                blue_desc = ", ".join([get_asset_name(a['id']) for a in details.get('blue_forces', [])])
-                objectives = "; ".join(details.get('mission_objectives', ["Not Specified"]))
-                event_description = f"Mission Start. Blue Forces: {blue_desc}. Objectives: {objectives}."
-                # Initialize AWACS position if present
-                for asset in details.get('blue_forces', []):
-                    if asset.get('id') == 'awacs_1':
-                        awacs_last_pos = asset.get('position') # Store initial position
-
-            elif event_type == "PLAYER_ACTION":
-                action = details.get("action_type", "UNKNOWN_ACTION")
-                actor_id = details.get("actor_id", "Player") # Assuming player actions might have an actor ID
-                target_ids = details.get("target_ids", [])
-                targets = [get_asset_name(tid) for tid in target_ids]
-                target_str = ", ".join(targets) if targets else "N/A"
-                params = details.get("parameters", {})
-
-                if action == "SET_FLIGHT_PATH":
-                    dest_type = params.get("destination_type", "Unknown Dest")
-                    coords = params.get("coordinates", {})
-                    label = params.get("label", dest_type)
-                    coord_str = f"[{coords.get('x', '?')},{coords.get('y', '?')}]" if coords else "No Coords"
-                    event_description = f"{actor_id} sets {label} for {target_str} to {coord_str}."
-
-                    # Store coords for mistake checks
-                    if label == "Fighter CAP" and 'y' in coords:
-                        cap_y_coord = coords['y']
-                        if pepz_y_coord is not None: # Check if PEPZ already set
-                            distance = calculate_distance_simple_y(cap_y_coord, pepz_y_coord)
-                            if distance < 90 or distance > 110:
-                                event_description += f" *(Mistake: CAP distance to PEPZ is {distance:.0f} NM, TTP is ~100 NM)*"
-                    elif label == "Bomber PEPZ" and 'y' in coords:
-                        pepz_y_coord = coords['y']
-                        if cap_y_coord is not None: # Check if CAP already set
-                            distance = calculate_distance_simple_y(cap_y_coord, pepz_y_coord)
-                            if distance < 90 or distance > 110:
-                                event_description += f" *(Mistake: PEPZ distance to CAP is {distance:.0f} NM, TTP is ~100 NM)*"
-
-                elif action == "SET_POSTURE":
-                    posture = params.get("posture", "UNKNOWN")
-                    radar = params.get("radar", "UNCHANGED")
-                    event_description = f"{actor_id} sets posture for {target_str} to {posture} (Radar: {radar})."
-                    # Check for premature cold turn
-                    if posture.upper() in ["DEFENSIVE", "COLD"] and radar.upper() == "PASSIVE":
-                        # Only flag fighters turning cold
-                        is_fighter = any("f22" in tid or "f16" in tid for tid in target_ids) # Example fighter types
-                        if is_fighter and (picture_clean_time is None or timestamp < picture_clean_time):
-                             fighter_elements_cold[timestamp] = target_ids
-                             # Annotation added later when PICTURE_CLEAN occurs
-
-                elif action == "COMMIT":
-                    groups = ", ".join(params.get("commit_groups", ["Unknown Groups"]))
-                    fighter_commit_range = params.get("commit_range_nm", None)
-                    range_str = f" at {fighter_commit_range:.0f} NM" if fighter_commit_range is not None else ""
-                    event_description = f"{actor_id} commits MADDOG package ({target_str}) to engage {groups}{range_str}."
-                    if fighter_commit_range is not None and fighter_commit_range > 80:
-                        event_description += f" *(Mistake: Commit range {fighter_commit_range:.0f} NM > 80 NM TTP)*"
-
-
-                elif action == "ASSIGN_TARGET":
-                    enemy_target = params.get("enemy_group_id", "Unknown Enemy")
-                    event_description = f"{actor_id} assigns {target_str} to target {enemy_target}."
-                    # Check for F-22 targeting mistake (requires knowledge of group priority)
-                    # This check is complex and depends on how group priorities are established/logged.
-                    # Simplified Example: Assume red_grp_1 is always highest priority if present during commit.
-                    is_f22 = any("f22" in tid for tid in target_ids)
-                    if is_f22 and enemy_target != "red_grp_1":
-                        # Check if red_grp_1 was part of *any* commit action before this assignment
-                        commit_logs = [
-                            p for p in log_data
-                            if p.get("timestamp", 0) <= timestamp and
-                               p.get("event_type") == "PLAYER_ACTION" and
-                               p.get("details",{}).get("action_type") == "COMMIT"
-                        ]
-                        committed_groups = set()
-                        for log in commit_logs:
-                            committed_groups.update(log.get("details",{}).get("parameters",{}).get("commit_groups",[]))
-
-                        if "red_grp_1" in committed_groups:
-                            f22_target_prio = "low" # Flagging potential mistake
-                            event_description += f" *(Potential Mistake: F-22 assigned to non-primary group '{enemy_target}' while primary 'red_grp_1' was committed?)*"
-
-                elif action == "RTB":
-                    event_description = f"{actor_id} orders {target_str} to Return To Base (RTB)."
-
-                else:
-                    event_description = f"{actor_id} action: {action} for {target_str} with params {params}."
-
-            elif event_type == "MOVEMENT":
-                 asset_id = details.get("asset_id")
-                 new_pos = details.get("new_position")
-                 # Log AWACS slide initiation based on movement away from initial spot after threat detected
-                 if asset_id == "awacs_1" and awacs_last_pos is not None and new_pos != awacs_last_pos:
-                     # Check if this movement constitutes the 'slide'
-                     if last_awacs_detection_time is not None and timestamp > last_awacs_detection_time:
-                         # Check if it moved significantly away from the initial position
-                         # This requires comparing new_pos to the *initial* position, not just the last one.
-                         # Let's assume the STATUS_CHANGE event is more reliable for the slide trigger.
-                         # event_description = f"{get_asset_name(asset_id)} maneuvering." # Less informative
-                         pass # Defer to STATUS_CHANGE for slide logging
-                     awacs_last_pos = new_pos # Update last known position
-
-                 # Optionally log other significant movements if needed, otherwise ignore
-                 continue # Generally ignore simple movement updates for brevity
-
-            elif event_type == "DETECTION":
-                detector = get_asset_name(details.get("detector_id", "Unknown Detector"))
-                detected_assets = []
-                min_range_nm = float('inf')
-                is_awacs_detect = details.get("detector_id") == "awacs_1"
-
-                for group in details.get("detected_groups", []):
-                    group_id = group.get("group_id", "Unknown Group")
-                    comp = group.get("composition_estimate", ["?x Type?"])[0]
-                    range_nm = group.get("range_nm")
-                    detected_assets.append(f"{group_id} ({comp}) at {range_nm:.0f} NM" if range_nm is not None else f"{group_id} ({comp})")
-                    if range_nm is not None:
-                        min_range_nm = min(min_range_nm, range_nm)
-
-                if detected_assets:
-                    event_description = f"{detector} detects: {'; '.join(detected_assets)}."
-                    # Check for AWACS slide trigger condition
-                    if is_awacs_detect and min_range_nm < 150:
-                        # Only record the *first* time this happens or if range decreases significantly
-                        if last_awacs_detection_time is None or min_range_nm < (last_awacs_detection_range or 150):
-                            last_awacs_detection_range = min_range_nm
-                            last_awacs_detection_time = timestamp
-                            # Check if AWACS hasn't initiated slide yet (using awacs_last_pos as proxy)
-                            # A dedicated 'is_sliding' state would be better.
-                            # Check if awacs_last_pos is still the initial position (needs initial pos stored)
-                            # Simplified: Assume if awacs_last_pos hasn't been updated by a SLIDE event, it hasn't moved.
-                            # We need a better state flag for 'is_sliding'. Let's rely on the STATUS_CHANGE event.
-                            # Add a note here indicating the condition is met.
-                            event_description += f" *(Note: Threat detected < 150NM at {min_range_nm:.0f} NM)*"
-
-                else: # Handle single detection format if needed (less common with groups)
-                    detected = get_asset_name(details.get("detected_asset_id", "Unknown Asset"))
-                    range_nm = details.get("range_nm")
-                    range_str = f" at {range_nm:.0f} NM" if range_nm is not None else ""
-                    event_description = f"{detector} detects {detected}{range_str}."
-                    if is_awacs_detect and range_nm is not None and range_nm < 150:
-                         if last_awacs_detection_time is None or range_nm < (last_awacs_detection_range or 150):
-                             last_awacs_detection_range = range_nm
-                             last_awacs_detection_time = timestamp
-                             event_description += f" *(Note: Threat detected < 150NM at {range_nm:.0f} NM)*"
-
-
-            elif event_type == "COMBAT":
-                action = details.get("action_type", "UNKNOWN_COMBAT")
-                if action == "FIRE_MISSILE":
-                    shooter = get_asset_name(details.get("shooter_id", "?"))
-                    target = get_asset_name(details.get("target_id", "?"))
-                    weapon = details.get("weapon_type", "?")
-                    range_nm = details.get("range_nm")
-                    range_str = f" at {range_nm:.0f} NM" if range_nm is not None else ""
-                    event_description = f"{shooter} fires {weapon} at {target}{range_str}."
-                elif action == "KILL":
-                    victim = get_asset_name(details.get("asset_id", "?"))
-                    source = get_asset_name(details.get("source_id", "Unknown"))
-                    event_description = f"{victim} destroyed by {source}."
-                elif action == "BOMB_RUN":
-                    shooter = get_asset_name(details.get("shooter_id", "?"))
-                    target = get_asset_name(details.get("target_id", "?"))
-                    weapon = details.get("weapon_type", "weapon")
-                    result = details.get("result", "UNKNOWN")
-                    event_description = f"{shooter} attacks {target} with {weapon}. Result: {result}."
-                else:
-                    event_description = f"Combat event: {action} involving {details.get('involved_assets', [])}."
-
-            elif event_type == "STATUS_CHANGE":
-                asset_id = details.get("asset_id", "?")
-                asset = get_asset_name(asset_id)
-                status_type = details.get("status_type", "?")
-                value = details.get("new_value", "?")
-
-                if status_type == "WAYPOINT_REACHED":
-                    event_description = f"{asset} reached waypoint: {value}."
-                elif status_type == "HVAA_DEFENSE" and value.upper() == "SLIDE_INITIATED":
-                    event_description = f"{asset} initiates SLIDE maneuver."
-                    # Check if this slide was timely
-                    if asset_id == "awacs_1" and last_awacs_detection_time is not None:
-                        delay = timestamp - last_awacs_detection_time
-                        if delay > 30: # Example threshold: Slide should happen within 30s
-                           event_description += f" *(Mistake: AWACS slide initiated {delay}s after threat detected < 150NM)*"
-                        # Mark AWACS as having moved/slid (crude state update)
-                        awacs_last_pos = {"status": "sliding"} # Use a status dict instead of coords
-                    else:
-                         # If slide happens *before* detection < 150NM, it's not necessarily wrong, just early/pre-emptive.
-                         pass
-
-                elif status_type == "SENSOR_REPORT" and value == "PICTURE_CLEAN":
-                    event_description = f"{asset} reports PICTURE CLEAN."
-                    picture_clean_time = timestamp
-                    # Check for premature cold turns logged earlier
-                    premature_cold_turns = []
-                    for cold_time, cold_asset_ids in fighter_elements_cold.items():
-                        if cold_time < picture_clean_time:
-                            assets_str = ", ".join([get_asset_name(aid) for aid in cold_asset_ids])
-                            premature_cold_turns.append(f"{assets_str} at {format_time(cold_time)}")
-                    if premature_cold_turns:
-                         annotation = f" *(Mistake: Fighters turned cold prematurely before PICTURE CLEAN: {'; '.join(premature_cold_turns)})*"
-                         event_description += annotation
-                         # Clear the logged cold turns to avoid re-annotating
-                         fighter_elements_cold = {t: ids for t, ids in fighter_elements_cold.items() if t >= picture_clean_time}
-
-
-                elif status_type == "MISSION_PHASE" and value == "MILLER_TIME":
-                    event_description = f"{asset} reports MILLER TIME (Targets Destroyed)."
-                elif status_type == "FUEL_STATE":
-                     event_description = f"{asset} fuel state: {value}." # Example: Log fuel state changes
-                elif status_type == "WEAPON_STATE":
-                     # Could be very verbose, maybe only log "Winchester" or low states
-                     if isinstance(value, dict) and value.get("status") == "Winchester":
-                         event_description = f"{asset} reports Winchester {value.get('weapon_type', '')}."
-                     else:
-                         continue # Ignore detailed weapon counts for now
-                else:
-                    event_description = f"{asset} status changed: {status_type} = {value}."
-
-            elif event_type == "MISSION_END":
-                outcome = details.get("outcome", "Unknown")
-                blue_losses = ", ".join([get_asset_name(lid) for lid in details.get("losses_blue", []) if lid]) or "None"
-                objectives_met = "; ".join(details.get("objectives_met", [])) or "None"
-                objectives_failed = "; ".join(details.get("objectives_failed", [])) or "None"
-                event_description = f"Mission End. Outcome: {outcome}. Blue Losses: [{blue_losses}]. Objectives Met: [{objectives_met}]. Objectives Failed: [{objectives_failed}]."
-                if "Minimize friendly losses" in details.get("objectives_failed", []):
-                     event_description += " *(Note: Tactical Objective Failed - Minimize friendly losses)*"
-                # Add check for premature cold turn if picture was never clean
-                if picture_clean_time is None and fighter_elements_cold:
-                    premature_cold_turns = []
-                    for cold_time, cold_asset_ids in fighter_elements_cold.items():
-                         assets_str = ", ".join([get_asset_name(aid) for aid in cold_asset_ids])
-                         premature_cold_turns.append(f"{assets_str} at {format_time(cold_time)}")
-                    if premature_cold_turns:
-                        annotation = f" *(Mistake: Fighters turned cold prematurely ({'; '.join(premature_cold_turns)}) and PICTURE CLEAN was never achieved)*"
-                        event_description += annotation
-
-
-            # Append the generated line for this entry
-            if event_description != "Unknown Event": # Avoid logging ignored events
-                natural_language_log_lines.append(f"TIME: {time_str} {event_description}")
-
-        except Exception as e:
-            # Log errors during processing specific entries but continue if possible
-            print(f"Error processing log entry at timestamp {timestamp}: {e}")
-            import traceback
-            traceback.print_exc() # Print full traceback for debugging
-            natural_language_log_lines.append(f"TIME: {time_str} ERROR processing event: {event_type} - {e}")
-
-
-    # Join all lines into a single string
-    final_log_string = "\n".join(natural_language_log_lines)
+    # Convert Pydantic models to dicts so they can be shipped to a worker
+    log_entries = [entry.dict() for entry in log_data]
+
+    # Run the CPU-bound conversion off the event loop with a fresh converter per request
+    loop = asyncio.get_running_loop()
+    natural_language_log, report = await loop.run_in_executor(request.app.state.conversion_executor, convert_log, log_entries)
+    record_conversion_metrics(report)
+    return natural_language_log, report
+
+async def run_body_conversion(request: Request, raw_body: bytes, check_options: Callable[[Dict[str, Any]], None] | None = None) -> Tuple[str, Dict[str, Any], Dict[str, Any]] | None:
+    """
+    Fast path: ships the raw request body to the process pool, which parses
+    and converts it without building per-event models. Returns (NL log,
+    other top-level fields, conversion report), or None if the body needs
+    full model validation. `check_options` runs in the worker before
+    conversion (see check_debrief_options).
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        natural_language_log, options, report = await loop.run_in_executor(request.app.state.conversion_executor, convert_log_body, raw_body, check_options)
+    except EventDecodeError:
+        return None
+    record_conversion_metrics(report)
+    return natural_language_log, options, report
+
+def validate_body(model_cls: type[BaseModel], data: bytes | Dict[str, Any]) -> BaseModel:
+    """Full model validation for bodies the fast path rejected; failures become the usual 422."""
+    start = time.perf_counter()
+    try:
+        return model_cls.parse_raw(data) if isinstance(data, bytes) else model_cls(**data)
+    except ValidationError as e:
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in e.errors()])
+    finally:
+        REQUEST_VALIDATION_SECONDS.observe(time.perf_counter() - start, path="model")
+
+@app.post("/json_to_nl_log")
+async def json_to_nl_log(request: Request):
+    """
+    Takes detailed JSON log data ({"log_data": [LogEntry, ...]}), processes
+    it into a natural language format with potential mistake annotations,
+    and returns the text directly, with the sortie id it was recorded under
+    in the mistake index.
+    Does NOT call the Anthropic API.
+    """
+    raw_body = await request.body()
+    converted = await run_body_conversion(request, raw_body)
+    if converted is not None:
+        final_log_string, options, report = converted
+        log_input = validate_body(LogInput, {**options, "log_data": []})
+    else:
+        log_input = validate_body(LogInput, raw_body)
+        final_log_string, report = await run_conversion(request, log_input.log_data)
+    sortie = await index_sortie(request, final_log_string, report, log_input.team, log_input.scenario)
 
     # Return as JSON containing the text
-    return JSONResponse(content={"natural_language_log": final_log_string})
+    return JSONResponse(content={"natural_language_log": final_log_string, "sortie_id": sortie})
+
+
+# --- /debrief endpoint (conversion + evaluation in one round trip) ---
+def check_debrief_options(options: Dict[str, Any]) -> None:
+    """Runs in the conversion worker: a body whose /debrief options would be rejected takes the full validation path."""
+    try:
+        check_evaluation_modes(DebriefInput(**options, log_data=[]))
+    except (ValidationError, HTTPException) as e:
+        raise EventDecodeError(f"invalid /debrief options: {e}")
+
+@app.post("/debrief")
+async def debrief(request: Request):
+    """
+    Converts the raw JSON log (a DebriefInput body) and feeds the NL log
+    straight into the Anthropic evaluation, so the browser makes one
+    request instead of /json_to_nl_log followed by /generate. Returns both
+    texts plus per-stage timings in milliseconds.
+    (Requires ANTHROPIC_API_KEY)
+    """
+    if not ANTHROPIC_API_KEY:
+         raise HTTPException(status_code=503, detail="ANTHROPIC_API_KEY not configured for this endpoint.")
+    start = time.perf_counter()
+    raw_body = await request.body()
+    converted = await run_body_conversion(request, raw_body, check_debrief_options)
+    if converted is not None:
+        natural_language_log, options, report = converted
+        debrief_input = validate_body(DebriefInput, {**options, "log_data": []})
+    else:
+        # Invalid options also land here, so they are reported before anything is converted
+        debrief_input = validate_body(DebriefInput, raw_body)
+        if not debrief_input.log_data:
+            raise HTTPException(status_code=400, detail="log_data cannot be empty.")
+        check_evaluation_modes(debrief_input)
+        natural_language_log, report = await run_conversion(request, debrief_input.log_data)
+
+    content, cache_status = await evaluate_debrief(request, debrief_input, natural_language_log, report, start)
+    return JSONResponse(content=content, headers={"X-Cache": cache_status})
+
+async def run_debrief(request: Request, debrief_input: DebriefInput) -> Tuple[Dict[str, Any], str]:
+    """Conversion + evaluation core of /debrief, shared with debrief jobs. Returns (content, X-Cache status)."""
+    start = time.perf_counter()
+    natural_language_log, report = await run_conversion(request, debrief_input.log_data)
+    return await evaluate_debrief(request, debrief_input, natural_language_log, report, start)
+
+async def evaluate_debrief(request: Request, debrief_input: DebriefInput, natural_language_log: str, report: Dict[str, Any], start: float) -> Tuple[Dict[str, Any], str]:
+    """
+    Indexes and evaluates an already converted NL log, and builds the
+    /debrief response with timings since `start`.
+    """
+    # Indexed before the Anthropic call, so the findings are kept even if evaluation fails
+    sortie = await index_sortie(request, natural_language_log, report, debrief_input.team, debrief_input.scenario)
+    converted = time.perf_counter()
+
+    content, cache_status = await generate_feedback(request, GenerateTextInput(
+        user_text=natural_language_log,
+        system_prompt=debrief_input.system_prompt,
+        bypass_cache=debrief_input.bypass_cache,
+        windowed=debrief_input.windowed,
+        selective=debrief_input.selective,
+        structured=debrief_input.structured,
+        ttp_sections=debrief_input.ttp_sections,
+        compact=debrief_input.compact,
+        token_budget=debrief_input.token_budget,
+    ))
+    generated = time.perf_counter()
+
+    return {
+        "natural_language_log": natural_language_log,
+        "sortie_id": sortie,
+        **content,
+        "timings_ms": {
+            "conversion": (converted - start) * 1000,
+            "generation": (generated - converted) * 1000,
+            "total": (generated - start) * 1000,
+        },
+    }, cache_status
+
+
+# --- Asynchronous job API (/jobs) ---
+async def run_job(kind: str, job_request: Dict[str, Any]) -> Dict[str, Any]:
+    """Job handler for the worker pool: runs a queued generate or debrief request."""
+    # Workers have no HTTP request of their own; the helpers only need request.app
+    request = Request({"type": "http", "app": app})
+    if kind == "generate":
+        content, cache_status = await generate_feedback(request, GenerateTextInput(**job_request))
+    else:
+        content, cache_status = await run_debrief(request, DebriefInput(**job_request))
+    return {**content, "cache": cache_status}
+
+def job_response(job: Dict[str, Any] | None) -> JSONResponse:
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return JSONResponse(content=job, status_code=202 if job["status"] in ("queued", "running") else 200)
+
+@app.post("/jobs/generate", status_code=202)
+async def submit_generate_job(text_input: GenerateTextInput, request: Request):
+    """
+    Queues a /generate request and returns its job id immediately. Poll
+    GET /jobs/{job_id} for the result instead of holding the connection open.
+    (Requires ANTHROPIC_API_KEY)
+    """
+    if not ANTHROPIC_API_KEY:
+         raise HTTPException(status_code=503, detail="ANTHROPIC_API_KEY not configured for this endpoint.")
+    if text_input.stream:
+        raise HTTPException(status_code=400, detail="stream mode is not available for jobs.")
+    return await request.app.state.job_queue.submit("generate", text_input.dict())
+
+@app.post("/jobs/debrief", status_code=202)
+async def submit_debrief_job(debrief_input: DebriefInput, request: Request):
+    """Queues a /debrief request (conversion + evaluation) and returns its job id immediately."""
+    if not ANTHROPIC_API_KEY:
+         raise HTTPException(status_code=503, detail="ANTHROPIC_API_KEY not configured for this endpoint.")
+    if not debrief_input.log_data:
+        raise HTTPException(status_code=400, detail="log_data cannot be empty.")
+    return await request.app.state.job_queue.submit("debrief", debrief_input.dict())
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, wait: float = 0):
+    """
+    Returns the job's status, queue position and timings, plus `result` (the
+    /generate or /debrief response body) or `error` once finished.
+    wait=<seconds> long-polls until the job finishes, up to JOB_MAX_WAIT_SECONDS.
+    Responds 202 while the job is queued or running and 200 once it is done.
+    """
+    job = await request.app.state.job_queue.wait(job_id, min(max(wait, 0), JOB_MAX_WAIT_SECONDS))
+    return job_response(job)
+
+
+# --- Streaming /json_to_nl_log/stream endpoint ---
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that does not listen for disconnects while streaming.
+    The default listener consumes receive() messages, which would swallow the
+    request body chunks the body iterator is still reading.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def convert_ndjson_lines(converter: NLLogConverter, raw_lines: List[bytes], first_line_no: int) -> List[str]:
+    """Validates and converts a batch of NDJSON event lines with a shared converter."""
+    natural_language_log_lines = []
+    for line_no, raw_line in enumerate(raw_lines, start=first_line_no):
+        if not raw_line.strip():
+            continue
+        try:
+            event = decode_event(parse_json(raw_line))
+        except ValueError:
+            # Not a plain well-typed event: let the model coerce it, or report why it is invalid
+            try:
+                log_entry = LogEntry(**json.loads(raw_line)).dict()
+            except (ValueError, TypeError, ValidationError) as e:
+                # The response has already started, so report bad lines inline instead of a 400
+                natural_language_log_lines.append(f"ERROR: invalid event on line {line_no}: {e}")
+                continue
+            event = LogEvent(log_entry["timestamp"], log_entry["event_type"], log_entry["details"])
+        line = converter.convert_event(event.timestamp, event.event_type, event.details)
+        if line is not None:
+            natural_language_log_lines.append(line)
+    return natural_language_log_lines
+
+async def stream_nl_log_lines(request: Request):
+    """
+    Reads NDJSON events as they arrive and yields converted lines per
+    received chunk. The sortie is indexed once the upload completes, under
+    the `team` / `scenario` query parameters if given.
+    """
+    converter = NLLogConverter()
+    hasher = sortie_hasher()
+    buffer = b""
+    line_no = 1
+    async for chunk in request.stream():
+        buffer += chunk
+        *raw_lines, buffer = buffer.split(b"\n")
+        if not raw_lines:
+            continue
+        natural_language_log_lines = convert_ndjson_lines(converter, raw_lines, line_no)
+        line_no += len(raw_lines)
+        if natural_language_log_lines:
+            text = "\n".join(natural_language_log_lines) + "\n"
+            hasher.update(text.encode("utf-8"))
+            yield text
+    # Last event may not be newline-terminated
+    natural_language_log_lines = convert_ndjson_lines(converter, [buffer], line_no)
+    text = "\n".join(natural_language_log_lines) + "\n" if natural_language_log_lines else ""
+    hasher.update(text.encode("utf-8"))
+
+    report = converter.report()
+    record_conversion_metrics(report) # No total: the stream's duration is set by the upload
+    await asyncio.to_thread(
+        request.app.state.mistake_index.record, hasher.hexdigest(), report,
+        request.query_params.get("team"), request.query_params.get("scenario"),
+    )
+    if text:
+        yield text
+
+@app.post("/json_to_nl_log/stream")
+async def json_to_nl_log_stream(request: Request):
+    """
+    Streaming variant of /json_to_nl_log. Accepts newline-delimited JSON
+    events (one log entry per line) and streams back 'TIME: ...' lines as
+    each chunk of the upload is converted, so memory stays flat regardless
+    of sortie length.
+    """
+    return DuplexStreamingResponse(stream_nl_log_lines(request), media_type="text/plain")
+
+
+# --- Live sortie sessions over WebSocket ---
+def apply_live_events(session: LiveSession, message: bytes) -> Dict[str, Any]:
+    """Converts the NDJSON events of one WebSocket message and returns the update to send back."""
+    converter = session.converter
+    raw_lines = [raw_line for raw_line in message.split(b"\n") if raw_line.strip()]
+    first_finding = len(converter.findings)
+    natural_language_log_lines = convert_ndjson_lines(converter, raw_lines, session.events + 1)
+    session.events += len(raw_lines)
+    session.lines.extend(natural_language_log_lines)
+    return {
+        "type": "update",
+        "events": session.events,
+        "lines": natural_language_log_lines,
+        "findings": [
+            {"timestamp": timestamp, "rule": rule, "kind": kind, "text": text}
+            for timestamp, rule, kind, text in parse_findings(converter.findings[first_finding:])
+        ],
+    }
+
+async def finish_live_session(websocket: WebSocket, session: LiveSession) -> None:
+    """Indexes a session whose mission has ended, tells the client its sortie id and closes."""
+    sessions = websocket.app.state.live_sessions
+    natural_language_log = "\n".join(session.lines)
+    report = session.converter.report()
+    record_conversion_metrics(report)
+    sortie = sortie_id(natural_language_log)
+    await asyncio.to_thread(websocket.app.state.mistake_index.record, sortie, report, session.team, session.scenario)
+    await sessions.finish(session)
+    await websocket.send_json({"type": "end", "events": session.events, "sortie_id": sortie})
+    await websocket.close()
+
+@app.websocket("/live")
+async def live_session(websocket: WebSocket, session_id: str | None = None, team: str | None = None, scenario: str | None = None):
+    """
+    Live conversion of a sortie in progress. The simulator sends events as
+    they happen, as NDJSON text (or binary) messages of one or more events;
+    each message is answered with {"type": "update", "events": <received so
+    far>, "lines": [new 'TIME: ...' lines], "findings": [new rule findings]}.
+
+    The first server message is {"type": "session", "session_id", "events"}.
+    To resume after a disconnect, reconnect with ?session_id=... and send
+    the events from index `events` on: the converter state is restored from
+    memory or its last snapshot, so nothing before that is re-sent or
+    re-converted. A newer connection to the same session takes it over.
+    Once MISSION_END is converted the sortie is added to the mistake index,
+    {"type": "end", "events", "sortie_id"} is sent and the socket closed.
+    """
+    await websocket.accept()
+    sessions = websocket.app.state.live_sessions
+    session, previous = await sessions.attach(session_id or uuid.uuid4().hex, websocket, team, scenario)
+    if previous is not None:
+        try:
+            await previous.close(code=4000, reason="Superseded by a newer connection to this session.")
+        except RuntimeError:
+            pass # Already closed
+    await websocket.send_json({"type": "session", "session_id": session.id, "events": session.events})
+    if session.finished: # Reconnected between MISSION_END and its end message
+        await finish_live_session(websocket, session)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            async with session.lock:
+                if session.owner is not websocket:
+                    break
+                received = session.events
+                update = apply_live_events(session, message.get("bytes") or message.get("text", "").encode("utf-8"))
+                sessions.stats.events += session.events - received
+            await websocket.send_json(update)
+            if session.finished:
+                await finish_live_session(websocket, session)
+                return
+            if sessions.snapshot_due(session):
+                await sessions.snapshot(session)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await sessions.detach(session, websocket)
+
+
+# --- Mistake trends across sorties ---
+@app.get("/mistakes/trends")
+async def mistake_trends(
+    request: Request,
+    team: str | None = None,
+    scenario: str | None = None,
+    rule: str | None = None,
+    kind: Literal["mistake", "potential_mistake", "note"] | None = None,
+    last_sorties: int | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    bucket: Literal["day", "week", "sortie"] = "day",
+):
+    """
+    Aggregates the rule findings of indexed sorties without re-converting any logs.
+    Sorties are selected by team, scenario and recorded time (since/until, Unix
+    seconds), optionally only the most recent `last_sorties`. Returns per-rule
+    totals and sortie rates, plus a series bucketed by day, week or sortie.
+    e.g. /mistakes/trends?team=23&rule=commit_range&last_sorties=200
+    """
+    if last_sorties is not None and last_sorties < 1:
+        raise HTTPException(status_code=400, detail="last_sorties must be at least 1.")
+    return await asyncio.to_thread(
+        request.app.state.mistake_index.trends, team, scenario, rule, kind, last_sorties, since, until, bucket,
+    )
+
+
+# --- Sortie videos (HTTP Range) and keyframe seeking ---
+class VideoFileResponse(FileResponse):
+    # Larger reads for Range responses; full-file responses use the server's zero-copy pathsend when it offers one
+    chunk_size = 1024 * 1024
+
+def video_path(request: Request, name: str) -> str:
+    path = request.app.state.videos.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Video not found: {name}")
+    return path
+
+async def load_video_index(request: Request, name: str) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(request.app.state.videos.index, video_path(request, name))
+    except VideoIndexError as exc:
+        raise HTTPException(status_code=422, detail=f"Cannot index video {name}: {exc}")
+
+@app.get("/videos")
+async def list_videos(request: Request):
+    """Returns the file names of the available sortie recordings."""
+    return {"videos": await asyncio.to_thread(request.app.state.videos.names)}
+
+@app.get("/videos/{name}")
+async def get_video(name: str, request: Request):
+    """
+    Streams a sortie recording. Honours Range / If-Range headers (206 partial
+    content), so a player seeking to an event fetches only the bytes it needs.
+    """
+    return VideoFileResponse(video_path(request, name), headers={"Cache-Control": "public, max-age=3600"})
+
+@app.get("/videos/{name}/index")
+async def get_video_index(name: str, request: Request):
+    """Returns the recording's keyframe index: [presentation seconds, byte offset] per keyframe, plus the moov box range."""
+    return await load_video_index(request, name)
+
+@app.get("/videos/{name}/seek")
+async def seek_video(name: str, request: Request, t: float | None = None, timestamp: str | None = None):
+    """
+    Maps an event time, in seconds (t) or as in TIME: lines (timestamp=00h05m15s),
+    to the keyframe at or before it and the byte range to fetch from there.
+    e.g. /videos/video_000410.mp4/seek?timestamp=00h00m07s
+    """
+    if timestamp is not None:
+        match = TIMESTAMP.fullmatch(timestamp.strip())
+        if match is None:
+            raise HTTPException(status_code=400, detail="timestamp must look like 00h05m15s.")
+        hours, minutes, seconds = (int(part) for part in match.groups())
+        t = hours * 3600 + minutes * 60 + seconds
+    if t is None or t < 0:
+        raise HTTPException(status_code=400, detail="Provide a non-negative t (seconds) or a timestamp.")
+    index = await load_video_index(request, name)
+    return request.app.state.videos.seek(index, t)
+
+@app.get("/video_stats")
+async def video_stats(request: Request):
+    """Returns keyframe index builds / cache hits and seek counts."""
+    videos = request.app.state.videos
+    return videos.stats.as_dict(len(videos.indexes))
+
+
+# --- Anthropic connection pool stats ---
+@app.get("/llm_pool_stats")
+async def llm_pool_stats(request: Request):
+    """Returns connection pool usage for the shared Anthropic client."""
+    return request.app.state.anthropic.stats.as_dict()
+
+# --- Anthropic rate limiting / retry stats ---
+@app.get("/llm_rate_limit_stats")
+async def llm_rate_limit_stats(request: Request):
+    """Returns throttling, retry and deduplication counters plus the current adaptive concurrency limit."""
+    anthropic = request.app.state.anthropic
+    return anthropic.rate_stats.as_dict(anthropic.concurrency)
+
+# --- Anthropic token usage and prompt-cache stats ---
+@app.get("/llm_usage_stats")
+async def llm_usage_stats(request: Request):
+    """Returns token usage, including prompt-cache reads/writes and the cache hit ratio."""
+    return request.app.state.anthropic.usage.as_dict()
+
+# --- Job queue stats ---
+@app.get("/job_queue_stats")
+async def job_queue_stats(request: Request):
+    """Returns queue depth, running jobs and average/max wait and service times for /jobs."""
+    job_queue = request.app.state.job_queue
+    return job_queue.stats.as_dict(job_queue.queue_depth())
+
+# --- Live session stats ---
+@app.get("/live_session_stats")
+async def live_session_stats(request: Request):
+    """Returns live session counts (started, resumed, superseded, finished) and snapshot sizes and times."""
+    live_sessions = request.app.state.live_sessions
+    return live_sessions.stats.as_dict(len(live_sessions.active))
+
+# --- TTP corpus stats ---
+@app.get("/ttp_corpus_stats")
+async def ttp_corpus_stats(request: Request):
+    """Returns indexed documents and chunks, index cache hits, and the average TTP text added per prompt vs the full corpus."""
+    return request.app.state.ttp_corpus.stats.as_dict()
+
+# --- Response cache stats ---
+@app.get("/cache_stats")
+async def cache_stats(request: Request):
+    """Returns hit/miss counters for the /generate response cache."""
+    return request.app.state.response_cache.stats.as_dict()
+
+
+# --- Prometheus metrics ---
+@app.get("/metrics")
+async def metrics(request: Request):
+    """
+    Prometheus text exposition of request, validation, conversion (per event
+    type and mistake rule), upstream LLM latency, token, cache and error metrics.
+    """
+    anthropic, job_queue = request.app.state.anthropic, request.app.state.job_queue
+    LLM_IN_FLIGHT.set(anthropic.stats.in_flight)
+    LLM_CONCURRENCY_LIMIT.set(anthropic.concurrency.limit)
+    JOB_QUEUE_DEPTH.set(job_queue.queue_depth())
+    JOBS_RUNNING.set(job_queue.stats.running)
+    LIVE_SESSIONS.set(len(request.app.state.live_sessions.active))
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 # --- Root endpoint ---
@@ -0,0 +1,145 @@
+"""
+Minimal Prometheus metrics registry, rendered in the text exposition format
+by GET /metrics.
+
+Only what the API needs: labelled counters, gauges and cumulative
+histograms. Values live in this process; conversion timings measured in
+the worker processes are shipped back with each result and recorded here.
+"""
+import threading
+from typing import Dict, List, Tuple
+
+# Request / stage latencies in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Per-request time spent on one event type or rule inside a conversion
+FINE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 200000)
+RATIO_BUCKETS = (1.0, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 50.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}" for key, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {format_value(series[-1])}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# --- Metrics recorded by the API ---
+
+HTTP_REQUESTS = Counter("bane_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram("bane_http_request_duration_seconds", "HTTP request duration, until the response body is sent.", ("method", "route"))
+ERRORS = Counter("bane_errors_total", "Error responses by source (http = returned to clients, llm = from the Anthropic API) and status.", ("source", "status"))
+
+REQUEST_VALIDATION_SECONDS = Histogram("bane_request_validation_seconds", "Time to decode and validate a log upload (fast path or model fallback).", ("path",))
+CONVERSION_SECONDS = Histogram("bane_conversion_seconds", "Time to convert one log to the NL log, in the worker.")
+CONVERSION_EVENTS = Counter("bane_conversion_events_total", "Events converted, by event type.", ("event_type",))
+CONVERSION_EVENT_SECONDS = Histogram("bane_conversion_event_type_seconds", "Per-request time spent formatting and checking one event type.", ("event_type",), FINE_BUCKETS)
+CONVERSION_RULE_SECONDS = Histogram("bane_conversion_rule_seconds", "Per-request time spent in one mistake rule.", ("rule",), FINE_BUCKETS)
+
+LLM_REQUEST_SECONDS = Histogram("bane_llm_request_seconds", "Anthropic API call latency per attempt (full stream for streaming calls).", ("mode", "outcome"))
+LLM_TOKENS = Histogram("bane_llm_tokens", "Tokens per Anthropic response, by kind.", ("kind",), TOKEN_BUCKETS)
+LOG_COMPRESSION_RATIO = Histogram("bane_log_compression_ratio", "Estimated tokens before / after compacting an NL log for evaluation.", (), RATIO_BUCKETS)
+LOG_COMPACTED_TOKENS = Histogram("bane_log_compacted_tokens", "Estimated input tokens of NL logs sent for evaluation, after compaction.", (), TOKEN_BUCKETS)
+RESPONSE_CACHE_LOOKUPS = Counter("bane_response_cache_lookups_total", "Response cache lookups by result (memory, disk, miss, bypass).", ("result",))
+
+LLM_IN_FLIGHT = Gauge("bane_llm_in_flight", "Anthropic API calls currently in flight.")
+LLM_CONCURRENCY_LIMIT = Gauge("bane_llm_concurrency_limit", "Current adaptive concurrency limit for Anthropic API calls.")
+JOB_QUEUE_DEPTH = Gauge("bane_job_queue_depth", "Jobs waiting in the /jobs queue.")
+JOBS_RUNNING = Gauge("bane_jobs_running", "Jobs currently being processed.")
+LIVE_SESSIONS = Gauge("bane_live_sessions", "Live WebSocket sortie sessions currently connected.")
@@ -0,0 +1,218 @@
+"""
+Persistent index of converted sorties and the mistakes the rules found.
+
+Every conversion records one row per sortie (team, scenario, outcome,
+event counts) and one row per rule annotation, keyed by scenario, team and
+rule. Trend queries such as "how often did Team 23 commit beyond 80 NM
+over its last 200 sorties" are then answered from SQLite indexes,
+without re-uploading or re-converting any logs.
+
+Sorties are content-addressed (sha256 of the NL log), so uploading the same
+sortie twice does not count its mistakes twice.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+# One annotation as the rules write it: " *(Mistake: ...)*", " *(Potential Mistake: ...)*" or " *(Note: ...)*".
+# A rule may return several back to back, so each ends at ")*" followed by the next one or the end.
+ANNOTATION_PATTERN = re.compile(r"\*\((Potential Mistake|Mistake|Note): (.*?)\)\*(?=\s*\*\(|\s*$)")
+FINDING_KINDS = {"Mistake": "mistake", "Potential Mistake": "potential_mistake", "Note": "note"}
+
+TEAM_PATTERN = re.compile(r"\bTeam\s+(\w+)", re.IGNORECASE)
+
+# Trend series bucket -> SQLite expression over the sortie's recorded_at
+BUCKETS = {
+    "day": "date(s.recorded_at, 'unixepoch')",
+    "week": "strftime('%Y-W%W', s.recorded_at, 'unixepoch')",
+    "sortie": "s.id",
+}
+
+
+def parse_findings(findings: List[Tuple[int, str, str]]) -> List[Tuple[int, str, str, str]]:
+    """Splits (timestamp, rule, annotation) findings into (timestamp, rule, kind, text) rows."""
+    rows = []
+    for timestamp, rule, annotation in findings:
+        for match in ANNOTATION_PATTERN.finditer(annotation):
+            rows.append((timestamp, rule, FINDING_KINDS[match.group(1)], match.group(2)))
+    return rows
+
+def sortie_hasher() -> Any:
+    """
+    Incremental sortie id: feed it every NL log line, each with a trailing
+    newline (the streaming endpoint does so chunk by chunk), then call hexdigest().
+    """
+    return hashlib.sha256()
+
+def sortie_id(natural_language_log: str) -> str:
+    """Sortie id of a complete NL log; equals sortie_hasher fed the same lines."""
+    hasher = sortie_hasher()
+    hasher.update((natural_language_log + "\n").encode("utf-8"))
+    return hasher.hexdigest()
+
+def team_from_scenario(scenario_name: str | None) -> str | None:
+    """'Team 23 Practice Sortie 2' -> '23', used when the upload names no team."""
+    match = TEAM_PATTERN.search(scenario_name or "")
+    return match.group(1) if match else None
+
+
+class MistakeIndex:
+    """SQLite tables of sorties, their event counts and their findings. Safe to call from worker threads."""
+
+    def __init__(self, path: str) -> None:
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(
+            "CREATE TABLE IF NOT EXISTS sorties ("
+            " id TEXT PRIMARY KEY,"
+            " team TEXT,"
+            " scenario TEXT,"
+            " outcome TEXT,"
+            " events INTEGER NOT NULL,"
+            " mission_seconds INTEGER,"
+            " recorded_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sorties_team ON sorties (team, recorded_at);"
+            "CREATE INDEX IF NOT EXISTS sorties_scenario ON sorties (scenario, recorded_at);"
+            "CREATE INDEX IF NOT EXISTS sorties_recorded_at ON sorties (recorded_at);"
+            "CREATE TABLE IF NOT EXISTS sortie_events ("
+            " sortie_id TEXT NOT NULL,"
+            " event_type TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " PRIMARY KEY (sortie_id, event_type));"
+            # team/scenario/recorded_at are copied from the sortie so rule aggregates can use one index
+            "CREATE TABLE IF NOT EXISTS findings ("
+            " sortie_id TEXT NOT NULL,"
+            " team TEXT,"
+            " scenario TEXT,"
+            " rule TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " mission_time INTEGER NOT NULL,"
+            " text TEXT NOT NULL,"
+            " recorded_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS findings_sortie ON findings (sortie_id, rule);"
+            "CREATE INDEX IF NOT EXISTS findings_team_rule ON findings (team, rule, recorded_at);"
+            "CREATE INDEX IF NOT EXISTS findings_scenario_rule ON findings (scenario, rule, recorded_at);"
+        )
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls) -> "MistakeIndex":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mistake_index.sqlite3")
+        return cls(os.getenv("MISTAKE_INDEX_PATH", default_path))
+
+    def record(self, sortie_id: str, report: Dict[str, Any], team: str | None = None, scenario: str | None = None) -> None:
+        """
+        Indexes one converted sortie from its id (see sortie_id) and
+        conversion report (see NLLogConverter.report). Team and scenario
+        default to what the SETUP event names. Re-recording a sortie is a no-op.
+        """
+        scenario = scenario or report.get("scenario_name")
+        team = team or team_from_scenario(scenario)
+        now = time.time()
+        event_counts = [(sortie_id, event_type, int(count)) for event_type, (count, _) in report["events"].items()]
+        findings = [
+            (sortie_id, team, scenario, rule, kind, timestamp, text, now)
+            for timestamp, rule, kind, text in parse_findings(report["findings"])
+        ]
+
+        with self.lock:
+            inserted = self.db.execute(
+                "INSERT OR IGNORE INTO sorties (id, team, scenario, outcome, events, mission_seconds, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (sortie_id, team, scenario, report.get("outcome"), sum(count for _, _, count in event_counts), report.get("mission_end_time"), now),
+            ).rowcount
+            if inserted:
+                self.db.executemany("INSERT INTO sortie_events (sortie_id, event_type, count) VALUES (?, ?, ?)", event_counts)
+                self.db.executemany(
+                    "INSERT INTO findings (sortie_id, team, scenario, rule, kind, mission_time, text, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    findings,
+                )
+            self.db.commit()
+
+    def trends(
+        self,
+        team: str | None = None,
+        scenario: str | None = None,
+        rule: str | None = None,
+        kind: str | None = None,
+        last_sorties: int | None = None,
+        since: float | None = None,
+        until: float | None = None,
+        bucket: str = "day",
+    ) -> Dict[str, Any]:
+        """
+        Aggregates findings over the selected sorties (team/scenario/time
+        window, optionally only the most recent `last_sorties`):
+        - by_rule: per rule and kind, total findings, sorties with at least one and that share of all selected sorties
+        - series: per bucket ("day", "week" or "sortie"), selected sorties and findings per rule
+        """
+        sortie_filters, sortie_params = [], []
+        for column, value in (("team", team), ("scenario", scenario)):
+            if value is not None:
+                sortie_filters.append(f"{column} = ?")
+                sortie_params.append(value)
+        if since is not None:
+            sortie_filters.append("recorded_at >= ?")
+            sortie_params.append(since)
+        if until is not None:
+            sortie_filters.append("recorded_at < ?")
+            sortie_params.append(until)
+        selected = (
+            "WITH selected AS (SELECT id, recorded_at FROM sorties"
+            + (" WHERE " + " AND ".join(sortie_filters) if sortie_filters else "")
+            + " ORDER BY recorded_at DESC"
+            + (" LIMIT ?" if last_sorties is not None else "")
+            + ") "
+        )
+        if last_sorties is not None:
+            sortie_params.append(last_sorties)
+
+        finding_filters, finding_params = [], []
+        for column, value in (("rule", rule), ("kind", kind)):
+            if value is not None:
+                finding_filters.append(f"f.{column} = ?")
+                finding_params.append(value)
+        finding_where = " WHERE " + " AND ".join(finding_filters) if finding_filters else ""
+        bucket_expr = BUCKETS[bucket]
+
+        with self.lock:
+            sorties = self.db.execute(selected + "SELECT COUNT(*) FROM selected", sortie_params).fetchone()[0]
+            by_rule = self.db.execute(
+                selected + "SELECT f.rule, f.kind, COUNT(*), COUNT(DISTINCT f.sortie_id)"
+                " FROM findings f JOIN selected s ON f.sortie_id = s.id" + finding_where +
+                " GROUP BY f.rule, f.kind ORDER BY COUNT(*) DESC",
+                sortie_params + finding_params,
+            ).fetchall()
+            bucket_sorties = self.db.execute(
+                selected + f"SELECT {bucket_expr}, COUNT(*), MIN(s.recorded_at) FROM selected s GROUP BY 1 ORDER BY 3",
+                sortie_params,
+            ).fetchall()
+            bucket_findings = self.db.execute(
+                selected + f"SELECT {bucket_expr}, f.rule, COUNT(*)"
+                " FROM findings f JOIN selected s ON f.sortie_id = s.id" + finding_where + " GROUP BY 1, 2",
+                sortie_params + finding_params,
+            ).fetchall()
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for bucket_key, rule_name, count in bucket_findings:
+            counts.setdefault(bucket_key, {})[rule_name] = count
+        return {
+            "sorties": sorties,
+            "by_rule": [
+                {"rule": rule_name, "kind": finding_kind, "findings": total, "sorties_with": with_finding, "sortie_rate": with_finding / sorties if sorties else 0.0}
+                for rule_name, finding_kind, total, with_finding in by_rule
+            ],
+            "series": [
+                {"bucket": bucket_key, "start": started, "sorties": count, "findings": counts.get(bucket_key, {})}
+                for bucket_key, count, started in bucket_sorties
+            ],
+        }
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,169 @@
+"""
+Local stand-in for the Anthropic Messages API, for development and load tests.
+
+Run with `uvicorn mock_anthropic:app --port 8766` and point the backend at
+it with ANTHROPIC_API_URL=http://127.0.0.1:8766/v1/messages. It returns a
+canned debrief (plain, streamed, or as a forced tool call) and simulates prompt caching: the first
+time a cache_control prefix is seen its tokens are reported as
+cache_creation_input_tokens, afterwards as cache_read_input_tokens.
+
+Failure injection, for exercising the client's rate limiter and retries:
+- MOCK_DELAY: per-response (or per streamed chunk) delay in seconds
+- MOCK_429_RATE / MOCK_529_RATE: fraction of requests answered 429 / 529
+- MOCK_MAX_CONCURRENCY: answer 429 while more than this many requests are in flight (0 = off)
+- MOCK_RETRY_AFTER: retry-after seconds sent with 429s (empty = no header)
+- MOCK_SLOW_RATE / MOCK_SLOW_DELAY: fraction of requests delayed by an extra MOCK_SLOW_DELAY seconds
+"""
+import asyncio
+import json
+import os
+import random
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+
+FEEDBACK = "Here is my debrief:\n\n" + "".join(
+    f"TIME: 00h0{i}m00s\nEVENT: Event {i}\nEVALUATION: Correct\nRATIONALE: Mock rationale.\n"
+    f"RECOMMENDATION: None\nDEBRIEF NOTE: No\n\n"
+    for i in range(5)
+) + "OVERALL ASSESSMENT:\nMock assessment.\n"
+
+# Input of a forced tool call (structured mode)
+STRUCTURED_FEEDBACK = {
+    "events": [
+        {"timestamp": f"00h0{i}m00s", "evaluation": "Correct", "rationale": "Mock rationale.", "recommendation": "", "debrief_note": "No"}
+        for i in range(5)
+    ],
+    "overall_assessment": "Mock assessment.",
+    "debrief_notes": [],
+}
+
+STREAM_CHUNK_CHARS = 20
+
+state: Dict[str, int] = {
+    "requests": 0, "in_flight": 0, "peak_in_flight": 0, "injected_429": 0, "injected_529": 0, "slowed": 0,
+    "streams_started": 0, "streams_finished": 0, "streams_cancelled": 0,
+}
+cached_prefixes: set = set()
+
+
+def count_tokens(value: Any) -> int:
+    """Rough token estimate (~4 characters per token)."""
+    return max(1, len(json.dumps(value, ensure_ascii=False)) // 4)
+
+def prompt_blocks(body: Dict[str, Any]) -> List[Any]:
+    """Tools, system blocks and message content, in the order the API caches them."""
+    system = body.get("system") or []
+    blocks: List[Any] = list(body.get("tools") or [])
+    blocks.extend([{"type": "text", "text": system}] if isinstance(system, str) else system)
+    for message in body.get("messages", []):
+        content = message.get("content")
+        blocks.extend([{"type": "text", "text": content}] if isinstance(content, str) else content)
+    return blocks
+
+def usage_for(body: Dict[str, Any]) -> Dict[str, int]:
+    """Splits input tokens at the last cache_control breakpoint into cache write/read and uncached parts."""
+    blocks = prompt_blocks(body)
+    breakpoint_index = max((i for i, block in enumerate(blocks) if isinstance(block, dict) and block.get("cache_control")), default=-1)
+    prefix, rest = blocks[:breakpoint_index + 1], blocks[breakpoint_index + 1:]
+
+    usage = {"input_tokens": count_tokens(rest), "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0, "output_tokens": count_tokens(STRUCTURED_FEEDBACK if body.get("tool_choice") else FEEDBACK)}
+    if prefix:
+        prefix_key = json.dumps(prefix, sort_keys=True)
+        if prefix_key in cached_prefixes:
+            usage["cache_read_input_tokens"] = count_tokens(prefix)
+        else:
+            cached_prefixes.add(prefix_key)
+            usage["cache_creation_input_tokens"] = count_tokens(prefix)
+    return usage
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name) or default)
+
+def injected_error() -> JSONResponse | None:
+    """A 429/529 response if this request should fail, else None."""
+    max_concurrency = int(env_float("MOCK_MAX_CONCURRENCY", 0))
+    if random.random() < env_float("MOCK_429_RATE", 0) or (max_concurrency and state["in_flight"] > max_concurrency):
+        state["injected_429"] += 1
+        retry_after = os.getenv("MOCK_RETRY_AFTER")
+        return JSONResponse(
+            {"type": "error", "error": {"type": "rate_limit_error", "message": "Mock rate limit"}},
+            status_code=429,
+            headers={"retry-after": retry_after} if retry_after else None,
+        )
+    if random.random() < env_float("MOCK_529_RATE", 0):
+        state["injected_529"] += 1
+        return JSONResponse({"type": "error", "error": {"type": "overloaded_error", "message": "Mock overloaded"}}, status_code=529)
+    return None
+
+def sse(data: Dict[str, Any]) -> str:
+    return f"event: {data['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/v1/messages")
+async def messages(request: Request):
+    body = await request.json()
+    state["requests"] += 1
+    state["in_flight"] += 1
+    state["peak_in_flight"] = max(state["peak_in_flight"], state["in_flight"])
+    try:
+        error = injected_error()
+        if error is not None:
+            return error
+        delay = env_float("MOCK_DELAY", 0.05)
+        if random.random() < env_float("MOCK_SLOW_RATE", 0):
+            state["slowed"] += 1
+            await asyncio.sleep(env_float("MOCK_SLOW_DELAY", 5.0))
+        return await respond(body, delay)
+    finally:
+        state["in_flight"] -= 1
+
+async def respond(body: Dict[str, Any], delay: float):
+    usage = usage_for(body)
+
+    if body.get("stream"):
+        async def events():
+            state["streams_started"] += 1
+            try:
+                start_usage = {**usage, "output_tokens": 1}
+                yield sse({"type": "message_start", "message": {"model": body["model"], "usage": start_usage}})
+                for i in range(0, len(FEEDBACK), STREAM_CHUNK_CHARS):
+                    await asyncio.sleep(delay)
+                    delta = {"type": "text_delta", "text": FEEDBACK[i:i + STREAM_CHUNK_CHARS]}
+                    yield sse({"type": "content_block_delta", "index": 0, "delta": delta})
+                yield sse({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": usage["output_tokens"]}})
+                yield sse({"type": "message_stop"})
+                state["streams_finished"] += 1
+            except asyncio.CancelledError:
+                state["streams_cancelled"] += 1
+                raise
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(delay)
+    tool_choice = body.get("tool_choice") or {}
+    if tool_choice.get("type") == "tool":
+        return {
+            "id": f"msg_mock_{state['requests']}",
+            "type": "message",
+            "role": "assistant",
+            "model": body["model"],
+            "content": [{"type": "tool_use", "id": f"toolu_mock_{state['requests']}", "name": tool_choice["name"], "input": STRUCTURED_FEEDBACK}],
+            "stop_reason": "tool_use",
+            "usage": usage,
+        }
+    return {
+        "id": f"msg_mock_{state['requests']}",
+        "type": "message",
+        "role": "assistant",
+        "model": body["model"],
+        "content": [{"type": "text", "text": FEEDBACK}],
+        "stop_reason": "end_turn",
+        "usage": usage,
+    }
+
+@app.get("/state")
+async def get_state():
+    return {**state, "cached_prefixes": len(cached_prefixes)}
@@ -103,3 +103,46 @@ You are an AI assistant reviewing a **pre-processed, natural language, time-stam
 
 **(Start listing extracted mistakes directly below based on the annotated input log provided by the user, following the specified output format.)**
 """
+
+# Appended to the evaluator system prompt for each window of a map-reduce (windowed) evaluation
+PROMPT_WINDOW_EVALUATION_SUFFIX = """
+
+**Windowed Evaluation:**
+
+You are evaluating ONE time window of a longer sortie. The user message contains:
+* `MISSION SETUP` and `PRECEDING EVENTS` / `FOLLOWING EVENTS` sections: context only. Do NOT produce entries for these lines.
+* `EVENTS TO EVALUATE`: produce entries (in the Output Format above) only for significant lines in this section.
+
+Do NOT write an introduction, an overall assessment, or a list of processing errors. These are written separately once all windows are evaluated.
+"""
+
+# Appended after PROMPT_WINDOW_EVALUATION_SUFFIX for selective (rule-first) evaluation
+PROMPT_SELECTIVE_EVALUATION_SUFFIX = """
+**Selective Evaluation:**
+
+Only the windows in which the TTP rule checks flagged something are sent for evaluation; the other segments are rated locally. The `MISSION SUMMARY` section lists the phase transitions and every rule finding of the whole sortie: context only. Focus on the annotated lines in `EVENTS TO EVALUATE` and the decisions that led to them.
+"""
+
+# Appended for structured (JSON) output: the debrief goes into the record_debrief tool instead of text
+PROMPT_STRUCTURED_OUTPUT_SUFFIX = """
+**Structured Output:**
+
+Do not write the debrief as text. Call the `record_debrief` tool exactly once, with one `events` entry per identified point (TIME, EVALUATION, RATIONALE, RECOMMENDATION and DEBRIEF NOTE of the Output Format above; leave `recommendation` empty when there is nothing to change). Do not repeat the EVENT text: it is taken from the log line with that timestamp. Put the overall assessment in `overall_assessment`, the critical learning points in `debrief_notes`, and any processing errors in `processing_errors`. Keep each field concise.
+"""
+
+# System prompt for the reduce pass that closes a map-reduce (windowed) evaluation
+PROMPT_REDUCE_FEEDBACK = """
+You are an expert evaluator for an Air Force wargame simulation. A long sortie has been evaluated event by event in separate time windows. You will be given the merged per-event evaluations (TIME / EVENT / EVALUATION / RATIONALE / RECOMMENDATION / DEBRIEF NOTE entries) in chronological order, followed by the `Mission End` log line and any processing errors from the log.
+
+**Your Task:**
+
+Do NOT repeat or rewrite the per-event entries. Write ONLY the closing section of the debrief, in exactly this format:
+
+OVERALL ASSESSMENT:
+[Assessment of mission and tactical objective achievement, primarily based on the Mission End line, and the trainee's overall tactical decision-making across the whole sortie. Call out recurring patterns that span several windows.]
+
+DEBRIEF NOTES:
+[One line per critical learning point, drawn from the entries marked DEBRIEF NOTE: Yes, most important first.]
+
+If processing errors are listed, mention them briefly at the very end.
+"""
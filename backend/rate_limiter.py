@@ -0,0 +1,149 @@
+"""
+Client-side flow control for Anthropic API calls.
+
+- TokenBucket: requests-per-minute and tokens-per-minute budgets, refilled
+  continuously, so bursts are smoothed instead of being rejected upstream.
+- AdaptiveConcurrency: an AIMD cap on calls in flight. It halves when the API
+  answers 429/529 and creeps back up by one slot per window of successes.
+- backoff_delay: exponential backoff with full jitter, or the server's
+  retry-after when it sent one.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+import httpx
+
+# Statuses worth retrying: rate limited, overloaded, and transient gateway errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504, 529}
+THROTTLE_STATUSES = {429, 529}
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to a burst of `per_minute`. A limit of 0 disables the bucket."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock() # Waiters are served in arrival order
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> float:
+        """Waits until `amount` units are available, takes them and returns the seconds waited."""
+        if not self.capacity:
+            return 0.0
+        # A single request larger than the whole budget waits for a full bucket, then goes into debt
+        amount_needed = min(amount, self.capacity)
+        waited = 0.0
+        async with self.lock:
+            self.refill()
+            while self.tokens < amount_needed:
+                delay = (amount_needed - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self.refill()
+            self.tokens -= amount
+        return waited
+
+    def adjust(self, amount: float) -> None:
+        """Corrects an earlier estimate once the real cost is known (negative amounts refund)."""
+        if self.capacity:
+            self.refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class AdaptiveConcurrency:
+    """Semaphore whose limit adapts between 1 and `max_limit` (additive increase, multiplicative decrease)."""
+
+    def __init__(self, max_limit: int, decrease_interval: float = 1.0) -> None:
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        # A burst of 429s from calls that were already in flight counts as one signal
+        self.decrease_interval = decrease_interval
+        self.last_decrease = 0.0
+
+    async def acquire(self) -> None:
+        if not self.waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as we were cancelled: give it to the next waiter
+                self.in_flight -= 1
+                self.wake()
+            raise
+
+    def release(self, throttled: bool = False) -> None:
+        """Frees a slot; a throttled (429/529) outcome halves the limit, a success grows it by 1/limit."""
+        self.in_flight -= 1
+        if throttled:
+            now = time.monotonic()
+            if now - self.last_decrease >= self.decrease_interval:
+                self.limit = max(1.0, self.limit / 2)
+                self.last_decrease = now
+        else:
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+        self.wake()
+
+    def wake(self) -> None:
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    """The retry-after header (seconds form) of a response, if present."""
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (0-based); retry-after wins when longer."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, retry_after) if retry_after is not None else delay
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """Rough input + output token cost of a Messages payload (~4 characters per token) for the TPM bucket."""
+    prompt_chars = len(str(payload.get("system") or "")) + sum(len(str(message.get("content"))) for message in payload.get("messages", []))
+    return prompt_chars // 4 + payload.get("max_tokens", 0)
+
+
+class RateLimitStats:
+    """Counters for throttling, retries and request deduplication."""
+
+    def __init__(self) -> None:
+        self.rpm_waits = 0
+        self.tpm_waits = 0
+        self.throttle_wait_seconds_total = 0.0
+        self.retries = 0
+        self.rate_limited = 0 # 429 responses
+        self.overloaded = 0 # 529 responses
+        self.retry_after_honored = 0
+        self.gave_up = 0 # Calls that still failed after the last retry
+        self.deduplicated = 0 # Calls served by an identical request already in flight
+
+    def as_dict(self, concurrency: AdaptiveConcurrency) -> Dict[str, Any]:
+        return {
+            **vars(self),
+            "concurrency_limit": int(concurrency.limit),
+            "concurrency_max": concurrency.max_limit,
+            "concurrency_in_flight": concurrency.in_flight,
+        }
@@ -0,0 +1,164 @@
+"""
+Content-addressed cache for /generate responses.
+
+Entries are keyed on a hash of everything that determines the completion
+(model, resolved system prompt, user text, max_tokens). A bounded
+in-memory LRU sits in front of a persistent SQLite table, so repeat
+debriefs return without another Anthropic call, even across restarts.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+
+def cache_key(model: str, system_prompt: str | List[Dict[str, Any]] | None, user_text: str, max_tokens: int) -> str:
+    """Stable sha256 over the request fields that determine the completion."""
+    raw = json.dumps([model, system_prompt, user_text, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.writes = 0
+        self.expired = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        stats = dict(vars(self))
+        stats["hit_ratio"] = (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        return stats
+
+
+class ResponseCache:
+    """
+    Two-tier cache: an OrderedDict LRU of at most `memory_entries` items in
+    front of a SQLite table of at most `disk_entries` rows. Entries older
+    than `ttl_seconds` are treated as misses and dropped. Safe to call from
+    the event loop and worker threads.
+    """
+
+    def __init__(self, path: str, memory_entries: int = 256, disk_entries: int = 10_000, ttl_seconds: float = 7 * 24 * 3600) -> None:
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self.memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " value TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+        self.db.commit()
+        # Rows on disk, kept up to date by every insert and delete so writes never count the table
+        self.disk_rows = self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "response_cache.sqlite3")
+        return cls(
+            os.getenv("RESPONSE_CACHE_PATH", default_path),
+            memory_entries=int(os.getenv("RESPONSE_CACHE_MEMORY_ENTRIES", 256)),
+            disk_entries=int(os.getenv("RESPONSE_CACHE_DISK_ENTRIES", 10_000)),
+            ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+        )
+
+    def remember(self, key: str, created_at: float, value: Dict[str, Any]) -> None:
+        """Inserts into the memory LRU, evicting the least recently used entry if full. Caller holds the lock."""
+        self.memory[key] = (created_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+            self.stats.memory_evictions += 1
+
+    def get(self, key: str) -> Tuple[Dict[str, Any] | None, str]:
+        """Returns (value, tier) where tier is 'memory', 'disk' or 'miss'."""
+        value = self.get_memory(key)
+        if value is not None:
+            return value, "memory"
+        return self.get_disk(key)
+
+    def get_memory(self, key: str) -> Dict[str, Any] | None:
+        """The memory tier alone: cheap enough to call on the event loop. A None isn't counted as a miss yet."""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self.memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    return value
+                del self.memory[key]
+            return None
+
+    def get_disk(self, key: str) -> Tuple[Dict[str, Any] | None, str]:
+        """
+        The SQLite tier, for after a memory miss: (value, 'disk') or
+        (None, 'miss'). Runs a query (and a commit if the row expired), so
+        async callers run it in a thread.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT created_at, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                created_at, raw_value = row
+                if now - created_at <= self.ttl_seconds:
+                    value = json.loads(raw_value)
+                    self.remember(key, created_at, value)
+                    self.stats.disk_hits += 1
+                    return value, "disk"
+                self.disk_rows -= self.db.execute("DELETE FROM responses WHERE key = ?", (key,)).rowcount
+                self.db.commit()
+                self.stats.expired += 1
+
+            self.stats.misses += 1
+            return None, "miss"
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Stores a value in both tiers, then trims expired and excess disk rows."""
+        now = time.time()
+        with self.lock:
+            self.remember(key, now, value)
+            raw_value = json.dumps(value, ensure_ascii=False)
+            # Insert and update separately (not INSERT OR REPLACE) to know whether a row was added
+            if self.db.execute("INSERT OR IGNORE INTO responses (key, created_at, value) VALUES (?, ?, ?)", (key, now, raw_value)).rowcount:
+                self.disk_rows += 1
+            else:
+                self.db.execute("UPDATE responses SET created_at = ?, value = ? WHERE key = ?", (now, raw_value, key))
+            self.disk_rows -= self.db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+            excess = self.disk_rows - self.disk_entries
+            if excess > 0:
+                evicted = self.db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY created_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+                self.disk_rows -= evicted
+                self.stats.disk_evictions += evicted
+            self.db.commit()
+            self.stats.writes += 1
+
+    def record_bypass(self) -> None:
+        with self.lock:
+            self.stats.bypasses += 1
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
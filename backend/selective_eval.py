@@ -0,0 +1,81 @@
+"""
+Rule-first selective evaluation: only the time windows the deterministic
+mistake rules flagged are sent to the model.
+
+The converter's rules already annotate every mistake they find (`*(...)*`)
+and processing errors are marked ERROR, so a window without either is a
+clean segment. Flagged windows are evaluated by the model with a compact
+mission summary as context; the key actions of clean windows get templated
+"Correct" entries locally, so model calls scale with the number of flagged
+windows rather than with sortie length.
+"""
+from typing import List, Tuple
+
+from log_compaction import is_phase_transition
+from windowed_eval import LogWindow, is_key_event
+
+# Rationale of the locally templated entries for clean segments
+CLEAN_RATIONALE = "No TTP rule check flagged this action or the events around it; it was not reviewed individually."
+
+
+def is_flagged(window: LogWindow) -> bool:
+    """A window needs the model if a rule annotated (or failed to process) one of its focus events."""
+    return any(is_key_event(line) for line in window.focus_lines)
+
+def partition_windows(windows: List[LogWindow]) -> Tuple[List[Tuple[int, LogWindow]], List[LogWindow]]:
+    """(flagged windows with their 1-based index, clean windows)."""
+    flagged = [(index, window) for index, window in enumerate(windows, start=1) if is_flagged(window)]
+    flagged_ids = {id(window) for _, window in flagged}
+    return flagged, [window for window in windows if id(window) not in flagged_ids]
+
+def mission_summary(nl_log: str) -> List[str]:
+    """
+    Compact whole-mission context for flagged windows: the phase
+    transitions, and every rule finding reduced to its time and annotation,
+    so a window's evaluation can refer to what happened elsewhere without
+    the model reading the whole log. The setup line is passed separately
+    (see build_window_text).
+    """
+    summary = []
+    for line in nl_log.split("\n")[1:]:
+        if is_phase_transition(line):
+            summary.append(line)
+        elif is_key_event(line):
+            time_str = line.split(" ", 2)[1] if line.startswith("TIME:") else ""
+            annotation = line[line.index("*("):] if "*(" in line else line
+            summary.append(f"TIME: {time_str} {annotation}" if time_str else annotation)
+    return summary
+
+def is_key_action(line: str) -> bool:
+    """Lines the evaluator would write an entry for: trainee decisions and mission phase transitions."""
+    if not line.startswith("TIME:") or "Mission Start." in line or "Mission End." in line:
+        return False
+    return " player " in line or is_phase_transition(line)
+
+def clean_window_entries(window: LogWindow) -> List[str]:
+    """Templated TIME: blocks, in the evaluator's output format, for the key actions of a clean window."""
+    entries = []
+    for line in window.focus_lines:
+        if is_key_action(line):
+            time_str, _, event = line[len("TIME: "):].partition(" ")
+            entries.append(
+                f"TIME: {time_str}\nEVENT: {event}\nEVALUATION: Correct\n"
+                f"RATIONALE: {CLEAN_RATIONALE}\nRECOMMENDATION: None\nDEBRIEF NOTE: No"
+            )
+    return entries
+
+def clean_segments_note(clean: List[LogWindow], entries: int) -> str:
+    """One line telling the reduce pass what was rated locally instead of the per-entry text."""
+    ranges = ", ".join(window.time_range() for window in clean)
+    return f"RULE-CHECKED CLEAN SEGMENTS (not sent for evaluation; {entries} key actions rated Correct): {ranges or 'none'}"
+
+def clean_closing(nl_log: str) -> str:
+    """Closing section for a sortie no rule flagged, written without a model call."""
+    end_lines = [line for line in nl_log.split("\n") if "Mission End." in line]
+    outcome = end_lines[-1].partition("Mission End.")[2].strip() if end_lines else ""
+    return (
+        "OVERALL ASSESSMENT:\n"
+        + (f"{outcome}\n" if outcome else "")
+        + "No TTP rule check flagged any event in this sortie, so no entries needed detailed review.\n\n"
+        + "DEBRIEF NOTES:\nNone."
+    )
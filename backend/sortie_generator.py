@@ -0,0 +1,210 @@
+"""
+Synthetic sortie generator for load testing and benchmarks.
+
+Scales the hand-written scenarios up to realistic log sizes (10^3 - 10^6
+events): the package and red-group counts grow with the requested size,
+every package flies several engagement cycles modelled on scenario1-4,
+and the gaps between scripted events are filled with dense MOVEMENT and
+DETECTION traffic. The first engagement always contains every mistake
+the converter's rules look for; later ones repeat each with
+`mistake_rate`. Output is deterministic for a given seed.
+
+Usage (from the backend directory):
+    python sortie_generator.py 100000 > /tmp/sortie_100k.json
+    python sortie_generator.py 1000000 --seed 7 --body > /tmp/body_1m.json
+"""
+import argparse
+import json
+import math
+import random
+import sys
+from typing import Any, Dict, List, Tuple
+
+CYCLE_SECONDS = 600 # One engagement per package every 10 minutes
+PACKAGE_STAGGER_SECONDS = 15 # Packages start their cycles slightly apart
+
+# Mistakes the converter's rules annotate; the first engagement triggers all of them
+MISTAKES = ("cap_pepz_spacing", "commit_range", "f22_target_priority", "awacs_slide", "premature_cold_turn", "blue_loss")
+
+
+class Package:
+    """One MADDOG fighter package (2x F-22, 2x F-15EX) plus its STRIKE bomber."""
+
+    def __init__(self, index: int) -> None:
+        n = index * 2
+        self.index = index
+        self.f22s = [f"f22_{n + 1}", f"f22_{n + 2}"]
+        self.f15s = [f"f15_{n + 1}", f"f15_{n + 2}"]
+        self.fighters = self.f22s + self.f15s
+        self.bomber = f"b1_{index + 1}"
+        self.x = index * 40 # Packages fly parallel lanes
+        self.cap_y = 80
+
+    def assets(self) -> List[Dict[str, Any]]:
+        n = self.index * 2
+        return [
+            {"id": self.f22s[0], "type": "F-22", "callsign": f"SATAN {n + 1}", "package": f"MADDOG {self.index + 1}", "initial_pos": {"x": self.x, "y": 0, "z": 30000}},
+            {"id": self.f22s[1], "type": "F-22", "callsign": f"SATAN {n + 2}", "package": f"MADDOG {self.index + 1}", "initial_pos": {"x": self.x + 5, "y": 0, "z": 30000}},
+            {"id": self.f15s[0], "type": "F-15EX", "callsign": f"HOSS {n + 1}", "package": f"MADDOG {self.index + 1}", "initial_pos": {"x": self.x, "y": 5, "z": 30000}},
+            {"id": self.f15s[1], "type": "F-15EX", "callsign": f"HOSS {n + 2}", "package": f"MADDOG {self.index + 1}", "initial_pos": {"x": self.x + 5, "y": 5, "z": 30000}},
+            {"id": self.bomber, "type": "B-1", "callsign": f"STRIKE {self.index + 1}", "package": f"STRIKE {self.index + 1}", "weapons": ["LRASM"], "initial_pos": {"x": self.x, "y": -20, "z": 25000}},
+        ]
+
+
+def event(timestamp: int, event_type: str, details: Dict[str, Any]) -> Dict[str, Any]:
+    return {"timestamp": timestamp, "event_type": event_type, "details": details}
+
+def player_action(timestamp: int, action_type: str, target_ids: List[str], parameters: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    details: Dict[str, Any] = {"action_type": action_type, "actor_id": "player", "target_ids": target_ids}
+    if parameters is not None:
+        details["parameters"] = parameters
+    return event(timestamp, "PLAYER_ACTION", details)
+
+def status_change(timestamp: int, asset_id: str, status_type: str, new_value: Any) -> Dict[str, Any]:
+    return event(timestamp, "STATUS_CHANGE", {"asset_id": asset_id, "status_type": status_type, "new_value": new_value})
+
+def flight_path(timestamp: int, target_ids: List[str], destination_type: str, x: int, y: int, z: int, label: str) -> Dict[str, Any]:
+    return player_action(timestamp, "SET_FLIGHT_PATH", target_ids, {
+        "destination_type": destination_type, "coordinates": {"x": x, "y": y, "z": z}, "label": label,
+    })
+
+
+def engagement(package: Package, red_groups: List[str], start: int, cycle: int, mistakes: set, rng: random.Random) -> List[Dict[str, Any]]:
+    """Scripted events of one engagement cycle, modelled on the sample scenarios."""
+    p = package
+    group = red_groups[(p.index + cycle) % len(red_groups)]
+    secondary = red_groups[(p.index + cycle + 1) % len(red_groups)]
+    pepz_y = p.cap_y - (30 if "cap_pepz_spacing" in mistakes else 100)
+    detect_t = start + 190
+    slide_t = detect_t + (45 if "awacs_slide" in mistakes else 20)
+    picture_clean_t = start + 380
+
+    events = [
+        flight_path(start + 2, p.fighters, "CAP", p.x, p.cap_y, 35000, "Fighter CAP"),
+        flight_path(start + 6, [p.bomber], "WAYPOINT", p.x, 180, 25000, "Bomber Transit WP1"),
+        flight_path(start + 8, [p.bomber], "PEPZ", p.x, pepz_y, 25000, "Bomber PEPZ"),
+        player_action(start + 15, "SET_POSTURE", p.fighters, {"posture": "ASSERTIVE", "radar": "ACTIVE"}),
+        status_change(start + 145, p.bomber, "WAYPOINT_REACHED", "Bomber PEPZ"),
+        event(detect_t, "DETECTION", {"detector_id": "awacs_1", "detected_groups": [{
+            "group_id": group, "composition_estimate": ["4x Fighter"],
+            "position": {"x": p.x + 20, "y": 290, "z": 30000}, "range_nm": rng.randint(120, 149), "bearing_deg": 15,
+        }]}),
+        status_change(start + 210, p.f22s[0], "WAYPOINT_REACHED", "Fighter CAP"),
+        event(start + 230, "DETECTION", {"detector_id": p.f22s[0], "detected_asset_id": group, "range_nm": 100}),
+        player_action(start + 250, "COMMIT", p.fighters, {
+            # red_grp_1 is the primary group the F-22 priority rule checks against
+            "commit_groups": ["red_grp_1", secondary] if "f22_target_priority" in mistakes else [group],
+            "commit_range_nm": rng.randint(90, 120) if "commit_range" in mistakes else rng.randint(50, 80),
+        }),
+        player_action(start + 255, "ASSIGN_TARGET", p.f22s, {
+            "enemy_group_id": secondary if "f22_target_priority" in mistakes and secondary != "red_grp_1" else "red_grp_1",
+        }),
+        player_action(start + 257, "ASSIGN_TARGET", p.f15s, {"enemy_group_id": secondary}),
+        player_action(start + 260, "SET_FLIGHT_PATH", [p.bomber], {
+            "destination_type": "TARGET_AREA", "coordinates": {"x": p.x, "y": 400, "z": 25000}, "label": "Enemy Ships",
+        }),
+        event(start + 270, "COMBAT", {"action_type": "FIRE_MISSILE", "shooter_id": p.f22s[0], "target_id": f"red_fighter_{group[8:]}a", "weapon_type": "AIM-120", "range_nm": 40}),
+        event(start + 300, "COMBAT", {"action_type": "KILL", "asset_id": f"red_fighter_{group[8:]}a", "result": "destroyed", "source_id": p.f22s[0]}),
+        status_change(start + 305, p.f22s[0], "WEAPON_STATE", {"status": "Winchester", "weapon_type": "AIM-120"}),
+        status_change(start + 306, p.f22s[1], "WEAPON_STATE", {"AIM-120": 2, "AIM-9X": 2}),
+        status_change(slide_t, "awacs_1", "HVAA_DEFENSE", "SLIDE_INITIATED"),
+        flight_path(slide_t + 1, ["awacs_1"], "WAYPOINT", -70, -120, 35000, "AWACS Slide WP"),
+        status_change(picture_clean_t, "awacs_1", "SENSOR_REPORT", "PICTURE_CLEAN"),
+        event(start + 480, "COMBAT", {"action_type": "BOMB_RUN", "shooter_id": p.bomber, "target_id": f"red_ship_{p.index + 1}", "weapon_type": "LRASM", "result": "HIT"}),
+        status_change(start + 485, p.bomber, "MISSION_PHASE", "MILLER_TIME"),
+        status_change(start + 488, p.f15s[0], "FUEL_STATE", "JOKER"),
+        player_action(start + 490, "RTB", [p.bomber] + p.fighters),
+    ]
+    if "premature_cold_turn" in mistakes:
+        # Turning cold/passive before PICTURE CLEAN
+        events.append(player_action(picture_clean_t - 40, "SET_POSTURE", p.f22s, {"posture": "COLD", "radar": "PASSIVE"}))
+    if "blue_loss" in mistakes:
+        events.append(event(start + 320, "COMBAT", {"action_type": "KILL", "asset_id": p.f15s[1], "result": "destroyed", "source_id": f"red_fighter_{group[8:]}b"}))
+    return events
+
+
+def filler_event(timestamp: int, packages: List[Package], red_groups: List[str], rng: random.Random) -> Dict[str, Any]:
+    """Background traffic: position updates (~75%) and long-range detections."""
+    package = rng.choice(packages)
+    if rng.random() < 0.75:
+        asset_id = "awacs_1" if rng.random() < 0.05 else rng.choice(package.fighters + [package.bomber])
+        return event(timestamp, "MOVEMENT", {"asset_id": asset_id, "new_position": {
+            "x": package.x + rng.randint(-10, 10), "y": rng.randint(-120, 400), "z": rng.choice((25000, 30000, 32000, 35000)),
+        }})
+    if rng.random() < 0.5:
+        return event(timestamp, "DETECTION", {"detector_id": rng.choice(package.fighters), "detected_asset_id": rng.choice(red_groups), "range_nm": rng.randint(60, 200)})
+    # AWACS picture outside the 150 NM threat ring, so it does not move the slide timer
+    return event(timestamp, "DETECTION", {"detector_id": "awacs_1", "detected_groups": [{
+        "group_id": rng.choice(red_groups), "composition_estimate": [rng.choice(("2x Fighter", "4x Fighter", "1x Surface Group"))],
+        "position": {"x": package.x + rng.randint(-40, 40), "y": rng.randint(300, 500), "z": 30000},
+        "range_nm": rng.randint(151, 260), "bearing_deg": rng.randint(0, 359),
+    }]})
+
+
+def sortie_shape(events: int) -> Tuple[int, int, int]:
+    """(packages, red groups, engagement cycles per package) for a target event count."""
+    packages = max(1, min(48, round(math.sqrt(events) / 25)))
+    cycles = max(2, min(12, events // (packages * 5000) + 2))
+    return packages, packages * 2 + 1, cycles
+
+
+def generate_sortie(events: int, seed: int = 0, mistake_rate: float = 0.2) -> List[Dict[str, Any]]:
+    """Returns a time-ordered log of exactly `events` entries (at least 50)."""
+    events = max(events, 50)
+    rng = random.Random(seed)
+    package_count, red_group_count, cycles = sortie_shape(events)
+    packages = [Package(index) for index in range(package_count)]
+    red_groups = [f"red_grp_{index + 1}" for index in range(red_group_count)]
+
+    awacs = {"id": "awacs_1", "type": "E-3", "callsign": "MAGIC", "package": "HVAA", "initial_pos": {"x": -50, "y": -100, "z": 35000}}
+    setup = event(0, "SETUP", {
+        "scenario_name": f"Synthetic sortie ({events} events, seed {seed})",
+        "blue_forces": [asset for package in packages for asset in package.assets()] + [awacs],
+        "red_forces_estimate": ["Fighter Groups", "Naval Surface Group"],
+        "mission_objectives": ["Destroy Red Surface Combatants", "Ensure STRIKE RTBs", "Ensure MAGIC survives", "Minimize friendly losses"],
+    })
+
+    scripted: List[Dict[str, Any]] = []
+    blue_losses: List[str] = []
+    for cycle in range(cycles):
+        for package in packages:
+            mistakes = set(MISTAKES) if cycle == 0 and package.index == 0 else {m for m in MISTAKES if rng.random() < mistake_rate}
+            start = cycle * CYCLE_SECONDS + package.index * PACKAGE_STAGGER_SECONDS
+            scripted.extend(engagement(package, red_groups, start, cycle, mistakes, rng))
+            if "blue_loss" in mistakes:
+                blue_losses.append(package.f15s[1])
+    scripted.sort(key=lambda entry: entry["timestamp"]) # Stable, so same-second events keep script order
+    scripted = scripted[:events - 2]
+    end_time = scripted[-1]["timestamp"] + 60
+
+    # Spread the filler uniformly over the mission, then merge it with the script
+    filler_count = events - 2 - len(scripted)
+    filler_times = sorted(rng.randint(1, end_time - 1) for _ in range(filler_count))
+    log_data = [setup]
+    script_index = 0
+    for timestamp in filler_times:
+        while script_index < len(scripted) and scripted[script_index]["timestamp"] <= timestamp:
+            log_data.append(scripted[script_index])
+            script_index += 1
+        log_data.append(filler_event(timestamp, packages, red_groups, rng))
+    log_data.extend(scripted[script_index:])
+
+    log_data.append(event(end_time, "MISSION_END", {
+        "outcome": "PARTIAL_SUCCESS" if blue_losses else "SUCCESS",
+        "losses_blue": sorted(set(blue_losses)),
+        "losses_red": ["Assumed Red Air"] + [f"red_ship_{package.index + 1}" for package in packages],
+        "objectives_met": ["Destroy Red Surface Combatants", "Ensure STRIKE RTBs", "Ensure MAGIC survives"],
+        "objectives_failed": ["Minimize friendly losses"] if blue_losses else [],
+    }))
+    return log_data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic sortie log as JSON.")
+    parser.add_argument("events", type=int, help="Number of log entries (>= 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mistake-rate", type=float, default=0.2, help="Chance of each mistake per later engagement")
+    parser.add_argument("--body", action="store_true", help='Wrap as a request body: {"log_data": [...]}')
+    args = parser.parse_args()
+    log_data = generate_sortie(args.events, args.seed, args.mistake_rate)
+    json.dump({"log_data": log_data} if args.body else log_data, sys.stdout)
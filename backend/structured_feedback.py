@@ -0,0 +1,120 @@
+"""
+Structured (JSON) debrief output for /generate and /debrief (structured=true).
+
+Instead of the free-text TIME / EVENT / EVALUATION / ... format, the model
+must call the `record_debrief` tool, whose input schema is the debrief as
+compact JSON. It doesn't repeat the event text: the server attaches each
+entry's log line itself, along with whether the rule checks flagged it.
+The tool input is validated once here, and the parsed form is cached next
+to the raw JSON in the response cache, so clients get ready-to-render
+feedback instead of re-parsing text.
+"""
+import json
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, ValidationError
+
+from feedback_blocks import TIMESTAMP
+from windowed_eval import line_seconds
+
+FEEDBACK_TOOL_NAME = "record_debrief"
+
+FEEDBACK_TOOL = {
+    "name": FEEDBACK_TOOL_NAME,
+    "description": "Records the debrief of the sortie: one entry per evaluated log event, then the overall assessment.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "events": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "timestamp": {"type": "string", "description": "Timestamp of the evaluated log line, e.g. 00h05m15s."},
+                        "evaluation": {"type": "string", "enum": ["Correct", "Incorrect", "Noteworthy Observation"]},
+                        "rationale": {"type": "string"},
+                        "recommendation": {"type": "string", "description": "What the trainee should have done differently; empty if nothing."},
+                        "debrief_note": {"type": "string", "enum": ["Yes", "No", "Optional"]},
+                    },
+                    "required": ["timestamp", "evaluation", "rationale", "debrief_note"],
+                },
+            },
+            "overall_assessment": {"type": "string"},
+            "debrief_notes": {"type": "array", "items": {"type": "string"}, "description": "Critical learning points, most important first."},
+            "processing_errors": {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["events", "overall_assessment"],
+    },
+}
+
+
+class StructuredFeedbackError(Exception):
+    """The model did not return a valid record_debrief tool call."""
+
+
+class EventFeedback(BaseModel):
+    timestamp: str
+    evaluation: Literal["Correct", "Incorrect", "Noteworthy Observation"]
+    rationale: str
+    recommendation: str | None = None
+    debrief_note: Literal["Yes", "No", "Optional"]
+    # Attached by the server from the evaluated log
+    event: str = ""
+    flagged: bool = False
+
+
+class StructuredFeedback(BaseModel):
+    events: List[EventFeedback]
+    overall_assessment: str
+    debrief_notes: List[str] = []
+    processing_errors: List[str] = []
+
+
+def with_feedback_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """The payload with the record_debrief tool attached and forced."""
+    return {**payload, "tools": [FEEDBACK_TOOL], "tool_choice": {"type": "tool", "name": FEEDBACK_TOOL_NAME}}
+
+def tool_input(api_response: Dict[str, Any]) -> Dict[str, Any]:
+    for block in api_response.get("content") or []:
+        if block.get("type") == "tool_use" and block.get("name") == FEEDBACK_TOOL_NAME:
+            return block.get("input") or {}
+    raise StructuredFeedbackError(f"no {FEEDBACK_TOOL_NAME} tool call in the response (stop_reason: {api_response.get('stop_reason')})")
+
+def log_lines_by_time(nl_text: str) -> Dict[str, List[str]]:
+    """Event descriptions of the evaluated log (e.g. 'TIME: 00h05m15s ...' lines) by timestamp."""
+    lines: Dict[str, List[str]] = {}
+    for line in nl_text.split("\n"):
+        if line.startswith("TIME: "):
+            time_str, _, event = line[len("TIME: "):].partition(" ")
+            lines.setdefault(time_str, []).append(event)
+    return lines
+
+def parse_structured_feedback(api_response: Dict[str, Any], nl_text: str) -> Dict[str, Any]:
+    """
+    Validates the record_debrief tool input of a Messages API response and
+    attaches each entry's log line from `nl_text` (the annotated one if
+    several share the timestamp). Returns the response content:
+    {"generated_text": raw JSON, "feedback": parsed debrief}.
+    Raises StructuredFeedbackError if the output doesn't fit the schema.
+    """
+    raw = tool_input(api_response)
+    try:
+        feedback = StructuredFeedback(**raw)
+    except ValidationError as exc:
+        raise StructuredFeedbackError(f"invalid {FEEDBACK_TOOL_NAME} input: {exc}")
+
+    lines = log_lines_by_time(nl_text)
+    for entry in feedback.events:
+        match = TIMESTAMP.search(entry.timestamp)
+        if match is None:
+            raise StructuredFeedbackError(f"invalid timestamp: {entry.timestamp!r}")
+        entry.timestamp = match.group(0)
+        candidates = lines.get(entry.timestamp, [])
+        annotated = [event for event in candidates if "*(" in event]
+        entry.event = (annotated or candidates or [""])[0]
+        entry.flagged = bool(annotated)
+        if entry.recommendation is not None and entry.recommendation.strip().rstrip(".").lower() in ("", "none", "n/a"):
+            entry.recommendation = None
+    feedback.events.sort(key=lambda entry: line_seconds(f"TIME: {entry.timestamp}") or 0)
+
+    return {"generated_text": json.dumps(raw, ensure_ascii=False, separators=(",", ":")), "feedback": feedback.dict()}
@@ -0,0 +1,76 @@
+"""
+Structured, sampled logging for the API.
+
+Records under the "bane" logger are written as one JSON object per line:
+the message is the event name and `extra={"fields": {...}}` adds fields.
+In the API process records go through a QueueHandler and are written to
+stderr by a listener thread, so request handlers never block on terminal
+I/O. Per-request info logs use log_sampled and are kept with probability
+LOG_SAMPLE_RATE; warnings and errors are always written.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Any
+
+# Set from LOG_SAMPLE_RATE by configure_logging (after main.py has loaded .env)
+LOG_SAMPLE_RATE = 0.1
+
+configured_pid: int | None = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(background: bool = True) -> None:
+    """
+    Installs the JSON handler on the "bane" logger, once per process.
+    `background` writes through a queue and listener thread; conversion
+    workers call this with background=False as the pool initializer, since
+    they exit without running atexit hooks that would flush a queue.
+    """
+    global configured_pid, LOG_SAMPLE_RATE
+    if configured_pid == os.getpid():
+        return
+    configured_pid = os.getpid()
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 0.1))
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    handler: logging.Handler = stream_handler
+    if background:
+        # QueueHandler formats the record (keeping the traceback) before queueing it; the listener only writes
+        records: queue.Queue = queue.Queue()
+        stream_handler.setFormatter(logging.Formatter("%(message)s"))
+        listener = logging.handlers.QueueListener(records, stream_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        handler = logging.handlers.QueueHandler(records)
+    handler.setFormatter(JsonFormatter())
+
+    logger = logging.getLogger("bane")
+    logger.handlers = [handler] # Replaces a handler inherited from a forked parent
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+
+def log_sampled(logger: logging.Logger, event: str, **fields: Any) -> None:
+    """Logs an info event for LOG_SAMPLE_RATE of calls (all of them at 1.0)."""
+    if LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE:
+        logger.info(event, extra={"fields": {**fields, "sample_rate": LOG_SAMPLE_RATE}})
@@ -0,0 +1,274 @@
+"""
+Columnar per-asset position tracks with vectorized geometry for the
+mistake rules.
+
+The converter records the positions the rules query (SETUP and MOVEMENT
+positions of the assets a rule tracks, and the positions of detected
+groups) into one Track per id: four array('d') columns kept sorted by
+time as reports arrive, so recording costs a few appends per event and
+queries never re-sort. Queries view the columns as NumPy arrays and
+compute ranges, closure rates and displacements at once. NumPy is
+optional: without it the same queries run as plain Python loops with the
+same results, just slower on long tracks.
+
+Tracks are capped at MAX_TRACK_POINTS reports: past that a track is
+thinned to every other report (keeping the latest), so memory and the
+pickled /live snapshots stay bounded however long the sortie is. The
+trade-off is resolution: on very long sorties positions between the kept
+reports are interpolated, so a closest approach can be off by what the
+tracks moved between two kept reports.
+
+x and y are in nautical miles and z (altitude) in feet, as in the logs.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError: # Optional speed-up; the pure Python geometry gives the same results
+    np = None
+
+FEET_PER_NM = 6076.12
+
+# Reports kept per track before it is thinned to every other one
+MAX_TRACK_POINTS = 4096
+# Samples below which range queries use the Python loops: NumPy's per-call overhead outweighs them
+MIN_VECTORIZED_SAMPLES = 64
+
+Position = Tuple[float, float, float]
+
+
+def position_tuple(position: Any) -> Position | None:
+    """(x, y, z) from a log position dict, or None if it has no usable x/y (z defaults to 0)."""
+    if not isinstance(position, dict):
+        return None
+    try:
+        return float(position["x"]), float(position["y"]), float(position.get("z") or 0)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def distance_nm(p1: Position, p2: Position) -> float:
+    """3D distance in NM between two (x, y, z) positions."""
+    dx, dy, dz = p1[0] - p2[0], p1[1] - p2[1], (p1[2] - p2[2]) / FEET_PER_NM
+    return (dx * dx + dy * dy + dz * dz) ** 0.5
+
+
+# --- Pure Python fallbacks (same formulas as the NumPy calls they replace) ---
+
+def interp(times: Sequence[float], xp: Sequence[float], fp: Sequence[float]) -> List[float]:
+    """np.interp: linear interpolation, holding the first/last value outside xp."""
+    values = []
+    for t in times:
+        j = bisect_right(xp, t) - 1
+        if j < 0:
+            values.append(fp[0])
+        elif j >= len(xp) - 1:
+            values.append(fp[-1])
+        else:
+            slope = (fp[j + 1] - fp[j]) / (xp[j + 1] - xp[j])
+            values.append(slope * (t - xp[j]) + fp[j])
+    return values
+
+
+class Track:
+    """
+    Positions of one asset sorted by time, keeping the last position
+    reported for any repeated timestamp. `rewrites` counts the changes
+    other than appending a later report (out-of-order reports, repeated
+    timestamps and thinning), which invalidate running results.
+    """
+    __slots__ = ("t", "x", "y", "z", "rewrites")
+
+    def __init__(self) -> None:
+        self.t, self.x, self.y, self.z = array("d"), array("d"), array("d"), array("d")
+        self.rewrites = 0
+
+    def append(self, timestamp: float, position: Position) -> None:
+        t = self.t
+        if not t or timestamp > t[-1]: # The usual case: reports arrive in time order
+            t.append(timestamp)
+            self.x.append(position[0])
+            self.y.append(position[1])
+            self.z.append(position[2])
+        else:
+            self.rewrites += 1
+            i = bisect_left(t, timestamp)
+            if t[i] == timestamp:
+                self.x[i], self.y[i], self.z[i] = position
+            else:
+                t.insert(i, timestamp)
+                self.x.insert(i, position[0])
+                self.y.insert(i, position[1])
+                self.z.insert(i, position[2])
+        if len(t) > MAX_TRACK_POINTS:
+            self.thin()
+
+    def thin(self) -> None:
+        """Keeps every other report, always including the latest."""
+        self.rewrites += 1
+        keep_last = len(self.t) % 2 == 0 # Else the last report is already on the even positions
+        for name in ("t", "x", "y", "z"):
+            column = getattr(self, name)
+            thinned = column[::2]
+            if keep_last:
+                thinned.append(column[-1])
+            setattr(self, name, thinned)
+
+    def columns(self, vectorized: bool = True) -> Tuple[Any, Any, Any, Any]:
+        """
+        (t, x, y, z): NumPy views of the columns if available and
+        `vectorized`, else the arrays themselves. Views must not outlive the
+        query (an array with an exported buffer can't grow).
+        """
+        if np is not None and vectorized:
+            return tuple(np.frombuffer(column, dtype=np.float64) for column in (self.t, self.x, self.y, self.z)) # type: ignore[return-value]
+        return self.t, self.x, self.y, self.z
+
+
+class TrackStore:
+    """Tracks by asset (or detected group) id, plus the geometry queries the rules use."""
+
+    def __init__(self) -> None:
+        self.tracks: Dict[str, Track] = {}
+
+    def record(self, asset_id: Any, timestamp: int, position: Any) -> None:
+        """Adds a position report; reports without a string id or usable x/y are skipped."""
+        if not isinstance(asset_id, str):
+            return
+        point = position_tuple(position)
+        if point is None:
+            return
+        track = self.tracks.get(asset_id)
+        if track is None:
+            track = self.tracks[asset_id] = Track()
+        track.append(timestamp, point)
+
+    def __contains__(self, asset_id: str) -> bool:
+        return asset_id in self.tracks
+
+    def last_report_time(self, asset_id: str) -> float | None:
+        """Latest timestamp the asset reported a position at, or None if it never did."""
+        track = self.tracks.get(asset_id)
+        return track.t[-1] if track is not None else None
+
+    def last_position(self, asset_id: str) -> Position | None:
+        """The asset's latest reported position."""
+        track = self.tracks.get(asset_id)
+        return (track.x[-1], track.y[-1], track.z[-1]) if track is not None else None
+
+    def position_at(self, asset_id: str, timestamp: float) -> Position | None:
+        """Interpolated position at `timestamp` (held at the first/last report outside the track)."""
+        if asset_id not in self.tracks:
+            return None
+        t, x, y, z = self.tracks[asset_id].columns()
+        if np is not None:
+            return tuple(float(np.interp(timestamp, t, column)) for column in (x, y, z)) # type: ignore[return-value]
+        return tuple(interp([timestamp], t, column)[0] for column in (x, y, z)) # type: ignore[return-value]
+
+    def displacement(self, asset_id: str, since: float) -> float | None:
+        """Straight-line NM between the asset's position at `since` and its last reported position."""
+        start = self.position_at(asset_id, since)
+        if start is None:
+            return None
+        return distance_nm(start, self.last_position(asset_id))
+
+    def ranges(self, a: str, b: str, since: float | None = None) -> Tuple[Any, Any] | None:
+        """
+        (times, 3D range in NM) between two tracks, sampled at every report
+        of either from the time both are known (and not before `since`).
+        Positions between reports are interpolated; after its last report
+        an asset is held in place. NumPy arrays for windows of at least
+        MIN_VECTORIZED_SAMPLES reports, else lists.
+        """
+        if a not in self.tracks or b not in self.tracks:
+            return None
+        track_a, track_b = self.tracks[a], self.tracks[b]
+        start = max(track_a.t[0], track_b.t[0]) if since is None else max(track_a.t[0], track_b.t[0], since)
+        i, j = bisect_left(track_a.t, start), bisect_left(track_b.t, start)
+        vectorized = len(track_a.t) - i + len(track_b.t) - j >= MIN_VECTORIZED_SAMPLES
+        ta, xa, ya, za = track_a.columns(vectorized)
+        tb, xb, yb, zb = track_b.columns(vectorized)
+
+        if np is not None and vectorized:
+            times = np.union1d(ta[i:], tb[j:])
+            dx = np.interp(times, ta, xa) - np.interp(times, tb, xb)
+            dy = np.interp(times, ta, ya) - np.interp(times, tb, yb)
+            dz = (np.interp(times, ta, za) - np.interp(times, tb, zb)) / FEET_PER_NM
+            return times, np.sqrt(dx * dx + dy * dy + dz * dz)
+
+        times = sorted(set(ta[i:]) | set(tb[j:]))
+        pa = zip(interp(times, ta, xa), interp(times, ta, ya), interp(times, ta, za))
+        pb = zip(interp(times, tb, xb), interp(times, tb, yb), interp(times, tb, zb))
+        return times, [distance_nm(p1, p2) for p1, p2 in zip(pa, pb)]
+
+    def closest_approach(self, a: str, b: str) -> Tuple[float, float, float] | None:
+        """
+        (time, range NM, closure rate in knots) at the minimum range between
+        two tracks. The closure rate is over the interval leading into the
+        minimum (positive = closing), or 0 if there is only one sample.
+        """
+        return ClosestApproach(a, b).update(self)
+
+
+class ClosestApproach:
+    """
+    Running closest approach between two tracks, for rules that query it
+    repeatedly as the sortie grows. Samples up to the earlier of the two
+    tracks' last reports can no longer change (later ones are interpolated
+    towards reports still to come), so their minimum is kept and each
+    update only rescans the samples after it. A rewrite of either track
+    starts the scan over.
+    """
+    __slots__ = ("a", "b", "settled_until", "settled", "rewrites")
+
+    def __init__(self, a: str, b: str) -> None:
+        self.a, self.b = a, b
+        self.settled_until: float | None = None
+        self.settled: Tuple[float, float, float] | None = None # Minimum over the settled samples
+        self.rewrites = (0, 0) # Track rewrites the settled part was computed at
+
+    def update(self, tracks: TrackStore) -> Tuple[float, float, float] | None:
+        """(time, range NM, closure rate in knots) at the minimum range so far, as in TrackStore.closest_approach."""
+        if self.a not in tracks or self.b not in tracks:
+            return None
+        rewrites = (tracks.tracks[self.a].rewrites, tracks.tracks[self.b].rewrites)
+        if rewrites != self.rewrites:
+            self.settled_until, self.settled, self.rewrites = None, None, rewrites
+        sampled = tracks.ranges(self.a, self.b, self.settled_until)
+        if sampled is None:
+            return None
+        times, ranges = sampled
+        vectorized = np is not None and not isinstance(ranges, list)
+        boundary = min(tracks.last_report_time(self.a), tracks.last_report_time(self.b))
+
+        # A resumed scan starts at the settled boundary, which was already counted (with its real closure)
+        first = 1 if self.settled_until is not None and len(times) and times[0] == self.settled_until else 0
+        if vectorized:
+            closures = -np.diff(ranges) / np.diff(times) * 3600
+            settled_end = int(np.searchsorted(times, boundary, side="right"))
+        else:
+            closures = [-(r1 - r0) / (t1 - t0) * 3600 for r0, r1, t0, t1 in zip(ranges, ranges[1:], times, times[1:])]
+            settled_end = bisect_right(times, boundary)
+
+        def minimum(lo: int, hi: int) -> Tuple[float, float, float] | None:
+            if lo >= hi:
+                return None
+            if vectorized:
+                i = lo + int(np.argmin(ranges[lo:hi]))
+            else:
+                i = min(range(lo, hi), key=ranges.__getitem__)
+            return float(times[i]), float(ranges[i]), float(closures[i - 1]) if i > 0 else 0.0
+
+        def earliest_min(*candidates: Tuple[float, float, float] | None) -> Tuple[float, float, float] | None:
+            best = None
+            for candidate in candidates: # In time order, so ties keep the earlier sample
+                if candidate is not None and (best is None or candidate[1] < best[1]):
+                    best = candidate
+            return best
+
+        newly_settled = minimum(first, settled_end)
+        result = earliest_min(self.settled, newly_settled, minimum(max(first, settled_end), len(times)))
+        self.settled = earliest_min(self.settled, newly_settled)
+        self.settled_until = max(boundary, self.settled_until) if self.settled_until is not None else boundary
+        return result
@@ -0,0 +1,338 @@
+"""
+Lexical retrieval over the TTP / doctrine reference documents.
+
+Each document (.docx via word2text, or Markdown/plain text) is split into
+paragraph and table blocks and chunked by heading, so a chunk is one
+section (or part of a long one) with its heading path. Chunks are indexed
+with BM25 over lowercase word tokens; no embeddings or model calls.
+
+Extraction and tokenization are cached on disk as JSON keyed by the sha256
+of the file (plus the chunking settings), so a restart only re-reads
+documents that changed. /generate then adds just the top-k sections that
+match the sortie's NL log to the system prompt, instead of the whole
+document.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+try:
+    from word2text import docx_blocks
+except ImportError: # python-docx not installed: only Markdown / text documents can be indexed
+    docx_blocks = None
+
+# Bump when extraction, chunking or tokenization changes, to invalidate cached indexes
+INDEX_VERSION = 1
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Query term weights: rule annotations (*(Mistake: ...)*) point at the TTPs that matter,
+# the rest of their line gives context, and the other events only break ties
+ANNOTATION_QUERY_WEIGHT = 1.0
+ANNOTATED_LINE_QUERY_WEIGHT = 0.5
+EVENT_QUERY_WEIGHT = 0.1
+
+# Log vocabulary -> the doctrine's words for the same thing
+QUERY_EXPANSIONS = {"nm": ("miles",), "awacs": ("hvaa",), "e": ("awacs", "hvaa")}
+
+# Letters and digits separately, so "150NM" matches "150 miles"
+TOKEN_PATTERN = re.compile(r"[a-z]+|[0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be been by can for from has have if in into is it its of on or should so that the their "
+    "them then there these they this to was were which will with".split()
+)
+ANNOTATION_PATTERN = re.compile(r"\*\((.*?)\)\*")
+
+# Markdown cleanup: bold markers, backslash escapes and _italic_ wrappers
+MARKDOWN_BOLD = re.compile(r"\*\*")
+MARKDOWN_ESCAPE = re.compile(r"\\([\[\]\-_*.#()])")
+MARKDOWN_ITALIC = re.compile(r"(?<!\w)_(.+?)_(?!\w)")
+MARKDOWN_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$")
+
+# (kind, heading level, text), as word2text.docx_blocks returns
+Block = Tuple[str, int, str]
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+def clean_markdown(text: str) -> str:
+    text = MARKDOWN_ESCAPE.sub(r"\1", MARKDOWN_BOLD.sub("", text))
+    return MARKDOWN_ITALIC.sub(r"\1", text).strip()
+
+def is_plain_heading(line: str) -> bool:
+    """A short standalone line without sentence punctuation, e.g. 'HVAA Defense'."""
+    return len(line) <= 60 and line[:1].isupper() and line[-1:] not in ".,;:?!)"
+
+def markdown_blocks(path: str) -> List[Block]:
+    """
+    Paragraphs, tables and headings of a Markdown or plain text document.
+    Headings are '#' lines and all-bold lines (level 1) or short lines
+    without sentence punctuation (level 2).
+    """
+    with open(path, encoding="utf-8") as f:
+        paragraphs = re.split(r"\n\s*\n", f.read())
+
+    blocks: List[Block] = []
+    for paragraph in paragraphs:
+        lines = [line.strip() for line in paragraph.strip().splitlines() if line.strip()]
+        if not lines:
+            continue
+        if lines[0].startswith("|"):
+            rows = []
+            for line in lines:
+                if MARKDOWN_TABLE_SEPARATOR.match(line):
+                    continue
+                cells = [clean_markdown(cell) for cell in line.strip("|").split("|")]
+                if any(cells):
+                    rows.append(" | ".join(cells))
+            if rows:
+                blocks.append(("table", 0, "\n".join(rows)))
+            continue
+
+        first = lines[0]
+        if first.startswith("#"):
+            blocks.append(("heading", len(first) - len(first.lstrip("#")), clean_markdown(first.lstrip("#"))))
+            lines = lines[1:]
+        elif first.startswith("**") and first.endswith("**"):
+            blocks.append(("heading", 1, clean_markdown(first)))
+            lines = lines[1:]
+        elif first.startswith("**") and len(first) <= 80 and not first.split("**")[1].endswith(":"):
+            # Bold title with a trailing remark, e.g. "**Player Tasks and Expected Flow** (Notional Distances)"
+            blocks.append(("heading", 1, clean_markdown(first)))
+            lines = lines[1:]
+        elif "**" not in first and is_plain_heading(clean_markdown(first)):
+            blocks.append(("heading", 2, clean_markdown(first)))
+            lines = lines[1:]
+        text = "\n".join(clean_markdown(line) for line in lines)
+        if text:
+            blocks.append(("text", 0, text))
+    return blocks
+
+def document_blocks(path: str) -> List[Block]:
+    if path.lower().endswith(".docx"):
+        if docx_blocks is None:
+            raise RuntimeError(f"python-docx is required to index {path}")
+        return docx_blocks(path)
+    return markdown_blocks(path)
+
+def split_block(text: str, max_chars: int, keep_header: bool) -> List[str]:
+    """Splits an oversized block on line boundaries, repeating a table's header row in every part."""
+    lines = text.split("\n")
+    header = lines[0] + "\n" if keep_header and len(lines) > 1 else ""
+    parts, current = [], ""
+    for line in lines[1:] if header else lines:
+        if current and len(header) + len(current) + len(line) > max_chars:
+            parts.append(header + current.rstrip("\n"))
+            current = ""
+        current += line + "\n"
+    if current:
+        parts.append(header + current.rstrip("\n"))
+    return parts
+
+def chunk_blocks(blocks: List[Block], source: str, max_chars: int) -> List[Dict[str, Any]]:
+    """
+    Groups blocks into sections under their heading path and packs each
+    section into chunks of at most ~max_chars (never splitting a paragraph
+    or table row). Returns [{"source", "heading", "text"}].
+    """
+    chunks: List[Dict[str, Any]] = []
+    headings: List[Tuple[int, str]] = [] # Open heading path as (level, text)
+    parts: List[str] = []
+
+    def flush() -> None:
+        heading = " > ".join(text for _, text in headings)
+        current = ""
+        for part in parts:
+            if current and len(current) + len(part) > max_chars:
+                chunks.append({"source": source, "heading": heading, "text": current.strip()})
+                current = ""
+            current += part + "\n\n"
+        if current.strip():
+            chunks.append({"source": source, "heading": heading, "text": current.strip()})
+        parts.clear()
+
+    for kind, level, text in blocks:
+        if kind == "heading":
+            flush()
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, text))
+        elif len(text) > max_chars:
+            parts.extend(split_block(text, max_chars, keep_header=kind == "table"))
+        else:
+            parts.append(text)
+    flush()
+    return chunks
+
+
+def query_weights(natural_language_log: str) -> Dict[str, float]:
+    """
+    Distinct log terms (plus QUERY_EXPANSIONS) weighted by where they
+    appear: in a rule annotation, elsewhere on an annotated line, or only
+    in other events. A term keeps its highest weight.
+    """
+    weights: Dict[str, float] = {}
+
+    def add(text: str, weight: float) -> None:
+        # Distinct tokens only: a long log repeats the same few hundred terms thousands of times
+        for token in set(TOKEN_PATTERN.findall(text.lower())) - STOPWORDS:
+            for term in (token, *QUERY_EXPANSIONS.get(token, ())):
+                if weights.get(term, 0.0) < weight:
+                    weights[term] = weight
+
+    add(natural_language_log, EVENT_QUERY_WEIGHT)
+    for line in natural_language_log.split("\n"):
+        if "*(" not in line:
+            continue
+        annotations = ANNOTATION_PATTERN.findall(line)
+        if annotations:
+            add(line, ANNOTATED_LINE_QUERY_WEIGHT)
+            for annotation in annotations:
+                add(annotation, ANNOTATION_QUERY_WEIGHT)
+    return weights
+
+
+class CorpusStats:
+    def __init__(self) -> None:
+        self.documents = 0
+        self.chunks = 0
+        self.corpus_chars = 0
+        self.index_cache_hits = 0
+        self.index_builds = 0
+        self.retrievals = 0
+        self.retrieved_sections = 0
+        self.retrieved_chars = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        stats = dict(vars(self))
+        stats["avg_retrieved_chars"] = self.retrieved_chars / self.retrievals if self.retrievals else 0.0
+        # Share of the full corpus a prompt no longer carries, on average
+        stats["avg_prompt_reduction"] = 1 - stats["avg_retrieved_chars"] / self.corpus_chars if self.corpus_chars and self.retrievals else 0.0
+        return stats
+
+
+class TTPCorpus:
+    """
+    BM25 index over the chunks of one or more documents. Built once (from
+    the disk cache where possible) and read-only afterwards, so retrieval is
+    safe from any thread.
+    """
+
+    def __init__(self, paths: List[str], cache_dir: str, chunk_chars: int = 1500, top_k: int = 4, max_chars: int = 6000) -> None:
+        self.cache_dir = cache_dir
+        self.chunk_chars = chunk_chars
+        self.top_k = top_k
+        self.max_chars = max_chars
+        self.stats = CorpusStats()
+        self.lock = threading.Lock()
+
+        self.chunks: List[Dict[str, Any]] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = {} # term -> [(chunk index, term frequency)]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            for chunk in self.load_document(path):
+                index = len(self.chunks)
+                self.chunks.append({"source": chunk["source"], "heading": chunk["heading"], "text": chunk["text"]})
+                self.lengths.append(chunk["length"])
+                for term, frequency in chunk["terms"].items():
+                    self.postings.setdefault(term, []).append((index, frequency))
+            self.stats.documents += 1
+
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        self.idf = {
+            term: math.log(1 + (len(self.chunks) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+        self.stats.chunks = len(self.chunks)
+        self.stats.corpus_chars = sum(len(chunk["text"]) for chunk in self.chunks)
+
+    @classmethod
+    def from_env(cls) -> "TTPCorpus":
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        default_paths = os.path.join(os.path.dirname(backend_dir), "Wargame Scenario Considerations.md")
+        return cls(
+            [path.strip() for path in os.getenv("TTP_CORPUS_PATHS", default_paths).split(",") if path.strip()],
+            os.getenv("TTP_INDEX_CACHE_DIR", os.path.join(backend_dir, "ttp_index_cache")),
+            chunk_chars=int(os.getenv("TTP_CHUNK_CHARS", 1500)),
+            top_k=int(os.getenv("TTP_TOP_K", 4)),
+            max_chars=int(os.getenv("TTP_MAX_CHARS", 6000)),
+        )
+
+    def load_document(self, path: str) -> List[Dict[str, Any]]:
+        """Chunks of one document with their term counts, from the hash-keyed cache or freshly extracted."""
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read())
+        digest.update(f"{INDEX_VERSION}:{self.chunk_chars}".encode())
+        cache_path = os.path.join(self.cache_dir, digest.hexdigest() + ".json")
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                chunks = json.load(f)
+            self.stats.index_cache_hits += 1
+            return chunks
+        except (OSError, ValueError):
+            pass
+
+        chunks = chunk_blocks(document_blocks(path), os.path.basename(path), self.chunk_chars)
+        for chunk in chunks:
+            tokens = tokenize(chunk["heading"] + "\n" + chunk["text"])
+            chunk["length"] = len(tokens)
+            chunk["terms"] = dict(Counter(tokens))
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(chunks, f, ensure_ascii=False)
+        os.replace(cache_path + ".tmp", cache_path)
+        self.stats.index_builds += 1
+        return chunks
+
+    def search(self, query_weights: Dict[str, float], top_k: int) -> List[Tuple[float, int]]:
+        """(BM25 score, chunk index) of the best `top_k` chunks for weighted query terms."""
+        scores: Dict[int, float] = {}
+        for term, weight in query_weights.items():
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[index] / self.average_length)
+                scores[index] = scores.get(index, 0.0) + weight * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(((score, index) for index, score in scores.items()), reverse=True)[:top_k]
+
+    def retrieve(self, natural_language_log: str, top_k: int | None = None) -> List[Dict[str, Any]]:
+        """
+        The sections most relevant to a sortie's NL log, best first, within
+        `max_chars` in total (see query_weights).
+        """
+        top_k = self.top_k if top_k is None else top_k
+        if top_k <= 0 or not self.chunks:
+            return []
+        weights = query_weights(natural_language_log)
+
+        sections, chars = [], 0
+        for score, index in self.search(weights, top_k):
+            chunk = self.chunks[index]
+            if sections and chars + len(chunk["text"]) > self.max_chars:
+                break
+            sections.append({**chunk, "score": round(score, 3)})
+            chars += len(chunk["text"])
+        with self.lock:
+            self.stats.retrievals += 1
+            self.stats.retrieved_sections += len(sections)
+            self.stats.retrieved_chars += chars
+        return sections
+
+
+def format_sections(sections: List[Dict[str, Any]]) -> str:
+    """Retrieved sections as a system prompt block."""
+    parts = ["**Reference TTPs (sections of the scenario doctrine most relevant to this log):**"]
+    for section in sections:
+        parts.append(f"### {section['heading'] or section['source']}\n{section['text']}")
+    return "\n\n".join(parts)
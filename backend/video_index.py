@@ -0,0 +1,317 @@
+"""
+Sortie video library: keyframe indexes of MP4 recordings for seeking.
+
+VideoModal seeks a recording to the mission time of a TIME: line. With the
+moov box at the front of the file (as in our recordings) and HTTP Range
+support, a player only needs the bytes from the keyframe at or before that
+time. The index maps each keyframe of the video track to its presentation
+time and byte offset, so /videos/{name}/seek can tell a client exactly which
+byte range to fetch for an event.
+
+Only the moov box is read to build an index, never the media data. Indexes
+are cached in memory and on disk as JSON keyed by the file's name, size and
+modification time, so a restart doesn't re-parse unchanged recordings.
+"""
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from bisect import bisect_right
+from typing import Any, BinaryIO, Dict, Iterator, List, Tuple
+
+# Bump when the index format or parsing changes, to invalidate cached indexes
+INDEX_VERSION = 1
+
+VIDEO_EXTENSIONS = (".mp4", ".m4v", ".mov")
+
+# Samples per track beyond which a sample table is taken as corrupt (~46 h at 60 fps)
+MAX_SAMPLES = 10_000_000
+
+
+class VideoIndexError(Exception):
+    """The file is not an MP4 we can index (no moov box or no video track)."""
+
+
+# --- MP4 box parsing ---
+
+def iter_boxes(data: bytes, start: int = 0, end: int | None = None) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload start, box end) of the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise VideoIndexError(f"corrupt {box_type!r} box at offset {offset}")
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+def find_moov(f: BinaryIO) -> Tuple[int, bytes]:
+    """Offset and contents of the top-level moov box, found by skipping over the other boxes."""
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        header = f.read(16)
+        size, box_type = struct.unpack_from(">I4s", header)
+        if size == 1:
+            if len(header) < 16:
+                break
+            size = struct.unpack_from(">Q", header, 8)[0]
+        elif size == 0:
+            size = file_size - offset
+        if size < 8:
+            break
+        if box_type == b"moov":
+            f.seek(offset)
+            moov = f.read(size)
+            if len(moov) != size:
+                raise VideoIndexError(f"truncated moov box ({len(moov)} of {size} bytes)")
+            return offset, moov
+        offset += size
+    raise VideoIndexError("no moov box")
+
+def child_boxes(data: bytes, start: int, end: int) -> Dict[bytes, Tuple[int, int]]:
+    return {box_type: (payload, box_end) for box_type, payload, box_end in iter_boxes(data, start, end)}
+
+def full_box_entries(data: bytes, start: int, fmt: str) -> List[Tuple[int, ...]]:
+    """Entries of a version/flags + entry_count table box (stts, stss, stsc, stco, ...)."""
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    size = struct.calcsize(fmt)
+    if start + 8 + count * size > len(data):
+        raise VideoIndexError(f"{count} table entries run past the moov box")
+    return [struct.unpack_from(fmt, data, start + 8 + i * size) for i in range(count)]
+
+def media_timescale(data: bytes, mdhd: int) -> int:
+    version = data[mdhd]
+    return struct.unpack_from(">I", data, mdhd + (20 if version == 1 else 12))[0]
+
+def edit_shift(data: bytes, edts: Tuple[int, int] | None, movie_timescale: int, timescale: int) -> float:
+    """
+    Seconds to add to media times for presentation times: leading empty
+    edits delay the track, the first media edit skips its media_time.
+    """
+    if edts is None:
+        return 0.0
+    elst = child_boxes(data, *edts).get(b"elst")
+    if elst is None:
+        return 0.0
+    version = data[elst[0]]
+    fmt = ">QqHH" if version == 1 else ">IiHH"
+    delay = 0.0
+    for duration, media_time, _, _ in full_box_entries(data, elst[0], fmt):
+        if media_time == -1:
+            delay += duration / movie_timescale
+            continue
+        return delay - media_time / timescale
+    return delay
+
+def sample_offsets(data: bytes, stbl: Dict[bytes, Tuple[int, int]], sample_count: int) -> List[int]:
+    """File offset of every sample, from the chunk offsets (stco/co64), samples per chunk (stsc) and sizes (stsz)."""
+    if b"co64" in stbl:
+        chunk_offsets = [entry[0] for entry in full_box_entries(data, stbl[b"co64"][0], ">Q")]
+    else:
+        chunk_offsets = [entry[0] for entry in full_box_entries(data, stbl[b"stco"][0], ">I")]
+    stsz = stbl[b"stsz"][0]
+    uniform_size, count = struct.unpack_from(">II", data, stsz + 4)
+    if count > MAX_SAMPLES:
+        raise VideoIndexError(f"implausible sample count {count}")
+    sizes = [uniform_size] * count if uniform_size else list(struct.unpack_from(f">{count}I", data, stsz + 12))
+
+    stsc = full_box_entries(data, stbl[b"stsc"][0], ">III")
+    offsets: List[int] = []
+    for i, (first_chunk, per_chunk, _) in enumerate(stsc):
+        last_chunk = stsc[i + 1][0] - 1 if i + 1 < len(stsc) else len(chunk_offsets)
+        for chunk in range(first_chunk, last_chunk + 1):
+            offset = chunk_offsets[chunk - 1]
+            for _ in range(per_chunk):
+                if len(offsets) == sample_count:
+                    return offsets
+                offsets.append(offset)
+                offset += sizes[len(offsets) - 1]
+    return offsets
+
+def video_track_keyframes(data: bytes, trak: Tuple[int, int], movie_timescale: int) -> List[Tuple[float, int]] | None:
+    """(presentation seconds, byte offset) of each keyframe of a trak box, or None if it is not a video track."""
+    mdia = child_boxes(data, *trak).get(b"mdia")
+    if mdia is None:
+        return None
+    mdia_boxes = child_boxes(data, *mdia)
+    hdlr = mdia_boxes.get(b"hdlr")
+    if hdlr is None or data[hdlr[0] + 8:hdlr[0] + 12] != b"vide":
+        return None
+    timescale = media_timescale(data, mdia_boxes[b"mdhd"][0])
+    stbl = child_boxes(data, *child_boxes(data, *mdia_boxes[b"minf"])[b"stbl"])
+
+    decode_times: List[int] = []
+    decode_time = 0
+    for count, delta in full_box_entries(data, stbl[b"stts"][0], ">II"):
+        if len(decode_times) + count > MAX_SAMPLES:
+            raise VideoIndexError("implausible sample count in stts")
+        for _ in range(count):
+            decode_times.append(decode_time)
+            decode_time += delta
+    composition = [0] * len(decode_times)
+    if b"ctts" in stbl:
+        index = 0
+        fmt = ">Ii" if data[stbl[b"ctts"][0]] == 1 else ">II" # Version 0 offsets are unsigned, though encoders write signed ones too
+        for count, offset in full_box_entries(data, stbl[b"ctts"][0], fmt):
+            if offset >= 2 ** 31:
+                offset -= 2 ** 32
+            count = min(count, len(composition) - index)
+            composition[index:index + count] = [offset] * count
+            index += count
+
+    offsets = sample_offsets(data, stbl, len(decode_times))
+    shift = edit_shift(data, child_boxes(data, *trak).get(b"edts"), movie_timescale, timescale)
+    # No stss box: every sample is a keyframe
+    sync = [entry[0] for entry in full_box_entries(data, stbl[b"stss"][0], ">I")] if b"stss" in stbl else range(1, len(offsets) + 1)
+    keyframes = [
+        (round(max(0.0, (decode_times[n - 1] + composition[n - 1]) / timescale + shift), 3), offsets[n - 1])
+        for n in sync if n <= len(offsets)
+    ]
+    return sorted(keyframes)
+
+def build_index(path: str) -> Dict[str, Any]:
+    """
+    Keyframe index of an MP4 file, reading only its moov box. Raises
+    VideoIndexError for files that aren't (complete) MP4s.
+    """
+    try:
+        return parse_index(path)
+    except (struct.error, KeyError, IndexError) as exc: # Box sizes and counts pointing past the data
+        raise VideoIndexError(f"corrupt or truncated MP4: {exc}") from exc
+
+def parse_index(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        moov_offset, moov = find_moov(f)
+        file_size = f.seek(0, os.SEEK_END)
+    moov_boxes = list(iter_boxes(moov, 8))
+    mvhd = next((payload for box_type, payload, _ in moov_boxes if box_type == b"mvhd"), None)
+    if mvhd is None:
+        raise VideoIndexError("no mvhd box")
+    version = moov[mvhd]
+    movie_timescale, duration = struct.unpack_from(">IQ" if version == 1 else ">II", moov, mvhd + (20 if version == 1 else 12))
+
+    for box_type, payload, box_end in moov_boxes:
+        if box_type == b"trak":
+            keyframes = video_track_keyframes(moov, (payload, box_end), movie_timescale)
+            if keyframes:
+                return {
+                    "size": file_size,
+                    "duration": round(duration / movie_timescale, 3) if movie_timescale else 0.0,
+                    "moov": [moov_offset, moov_offset + len(moov)],
+                    "keyframes": keyframes,
+                }
+    raise VideoIndexError("no video track with samples")
+
+
+class VideoLibraryStats:
+    def __init__(self) -> None:
+        self.index_builds = 0
+        self.index_cache_hits = 0
+        self.seeks = 0
+        self.index_seconds_total = 0.0
+
+    def as_dict(self, indexed: int) -> Dict[str, Any]:
+        stats = dict(vars(self))
+        stats["indexed_videos"] = indexed
+        stats["avg_index_build_ms"] = (self.index_seconds_total / self.index_builds * 1000) if self.index_builds else 0.0
+        return stats
+
+
+class VideoLibrary:
+    """
+    The recordings in `video_dir`, with their keyframe indexes. Index
+    builds run in worker threads; the in-memory cache is guarded by a lock.
+    """
+
+    def __init__(self, video_dir: str, cache_dir: str) -> None:
+        self.video_dir = os.path.abspath(video_dir)
+        self.cache_dir = cache_dir
+        self.stats = VideoLibraryStats()
+        self.indexes: Dict[str, Dict[str, Any]] = {} # cache key -> index
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "VideoLibrary":
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        return cls(
+            os.getenv("VIDEO_DIR", os.path.dirname(backend_dir)),
+            os.getenv("VIDEO_INDEX_CACHE_DIR", os.path.join(backend_dir, "video_index_cache")),
+        )
+
+    def path(self, name: str) -> str | None:
+        """Path of a video by file name, or None if there is no such video (names never leave video_dir)."""
+        if os.path.basename(name) != name or not name.lower().endswith(VIDEO_EXTENSIONS):
+            return None
+        path = os.path.join(self.video_dir, name)
+        return path if os.path.isfile(path) else None
+
+    def names(self) -> List[str]:
+        return sorted(name for name in os.listdir(self.video_dir) if self.path(name) is not None)
+
+    def index(self, path: str) -> Dict[str, Any]:
+        """Keyframe index of a video, from memory, the disk cache, or freshly built. Blocking: call from a thread."""
+        stat = os.stat(path)
+        key = hashlib.sha256(f"{INDEX_VERSION}:{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+        with self.lock:
+            index = self.indexes.get(key)
+        if index is not None:
+            return index
+
+        cache_path = os.path.join(self.cache_dir, key + ".json")
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                index = json.load(f)
+            self.stats.index_cache_hits += 1
+        except (OSError, ValueError):
+            start = time.perf_counter()
+            index = build_index(path)
+            self.stats.index_builds += 1
+            self.stats.index_seconds_total += time.perf_counter() - start
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(index, f)
+            os.replace(cache_path + ".tmp", cache_path)
+
+        with self.lock:
+            self.indexes[key] = index
+        return index
+
+    def warm(self) -> None:
+        """Indexes every video up front (on startup), so the first seek doesn't pay for it."""
+        for name in self.names():
+            try:
+                self.index(os.path.join(self.video_dir, name))
+            except (OSError, VideoIndexError):
+                pass # Reported when the video is requested
+
+    def seek(self, index: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+        """
+        The keyframe at or before `seconds` and the byte range from it up to
+        the next keyframe: what a player needs (after the moov box) to start
+        playback there.
+        """
+        self.stats.seeks += 1
+        keyframes = index["keyframes"]
+        position = max(0, bisect_right([keyframe_time for keyframe_time, _ in keyframes], seconds) - 1)
+        keyframe_time, start = keyframes[position]
+        end = keyframes[position + 1][1] if position + 1 < len(keyframes) else index["size"]
+        if end <= start: # Keyframes are in presentation order; interleaved offsets can run backwards
+            end = index["size"]
+        return {
+            "time": seconds,
+            "keyframe_time": keyframe_time,
+            "byte_range": [start, end - 1],
+            "range_header": f"bytes={start}-{end - 1}",
+            "moov": index["moov"],
+        }
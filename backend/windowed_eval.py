@@ -0,0 +1,156 @@
+"""
+Splitting long NL logs into overlapping time windows for map-reduce evaluation.
+
+Each window has a set of focus lines (the events the model evaluates for
+that window) plus read-only context lines on either side, widened to pull in
+nearby annotated key events, so mistakes near a boundary are seen with their
+lead-up in both windows. The per-window feedback is merged back into one
+chronological list of TIME: blocks before the reduce pass.
+"""
+from typing import List
+
+from feedback_blocks import TIMESTAMP, block_seconds, extract_event_blocks
+
+
+def line_seconds(line: str) -> int | None:
+    """Timestamp of a 'TIME: hhHmmMssS ...' NL log line in seconds, or None."""
+    if not line.startswith("TIME:"):
+        return None
+    match = TIMESTAMP.search(line)
+    if not match:
+        return None
+    hours, minutes, seconds = (int(part) for part in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+def is_key_event(line: str) -> bool:
+    """Annotated lines (mistakes, notes) and processing errors are the events worth overlapping."""
+    return "*(" in line or "ERROR" in line
+
+
+class LogWindow:
+    """Focus lines [start, end) of the NL log plus context lines [context_start, context_end)."""
+
+    def __init__(self, lines: List[str], start: int, end: int, context_start: int, context_end: int) -> None:
+        self.lines = lines
+        self.start = start
+        self.end = end
+        self.context_start = context_start
+        self.context_end = context_end
+
+    @property
+    def focus_lines(self) -> List[str]:
+        return self.lines[self.start:self.end]
+
+    @property
+    def before_lines(self) -> List[str]:
+        return self.lines[self.context_start:self.start]
+
+    @property
+    def after_lines(self) -> List[str]:
+        return self.lines[self.end:self.context_end]
+
+    def time_range(self) -> str:
+        focus = self.focus_lines
+        first = focus[0].split(" ")[1] if focus[0].startswith("TIME:") else "?"
+        last = focus[-1].split(" ")[1] if focus[-1].startswith("TIME:") else "?"
+        return f"{first}-{last}"
+
+
+def widen_context(lines: List[str], edge: int, step: int, overlap_lines: int) -> int:
+    """
+    Moves `edge` up to `overlap_lines` lines away from the focus (step -1 for
+    before, +1 for after), then up to `overlap_lines` further if that reaches
+    an annotated key event.
+    """
+    if step < 0:
+        edge = max(0, edge - overlap_lines)
+        widened = edge
+        for index in range(edge - 1, max(-1, edge - 1 - overlap_lines), -1):
+            if is_key_event(lines[index]):
+                widened = index
+        return widened
+
+    edge = min(len(lines), edge + overlap_lines)
+    widened = edge
+    for index in range(edge, min(len(lines), edge + overlap_lines)):
+        if is_key_event(lines[index]):
+            widened = index + 1
+    return widened
+
+
+def split_log_windows(nl_log: str, window_seconds: int, max_chars: int, overlap_lines: int) -> List[LogWindow]:
+    """
+    Splits the NL log into consecutive windows. A new window starts when the
+    current one would span more than `window_seconds` of mission time or
+    exceed `max_chars` of text. The SETUP line is passed separately as
+    mission context, so it is not part of any window.
+    """
+    lines = [line for line in nl_log.split("\n") if line.strip()]
+    body_start = 1 if lines and "Mission Start." in lines[0] else 0
+
+    boundaries = [body_start]
+    window_start_seconds = None
+    window_chars = 0
+    for index in range(body_start, len(lines)):
+        line = lines[index]
+        seconds = line_seconds(line)
+        if window_start_seconds is None:
+            window_start_seconds = seconds
+        too_long = seconds is not None and window_start_seconds is not None and seconds - window_start_seconds >= window_seconds
+        too_big = window_chars + len(line) > max_chars
+        if index > boundaries[-1] and (too_long or too_big):
+            boundaries.append(index)
+            window_start_seconds = seconds
+            window_chars = 0
+        window_chars += len(line) + 1
+    boundaries.append(len(lines))
+
+    windows = []
+    for start, end in zip(boundaries, boundaries[1:]):
+        if start >= end:
+            continue
+        context_start = max(body_start, widen_context(lines, start, -1, overlap_lines))
+        context_end = widen_context(lines, end, 1, overlap_lines)
+        windows.append(LogWindow(lines, start, end, context_start, context_end))
+    return windows
+
+
+def mission_setup_line(nl_log: str) -> str | None:
+    first_line = nl_log.split("\n", 1)[0]
+    return first_line if "Mission Start." in first_line else None
+
+
+def build_window_text(window: LogWindow, setup_line: str | None, index: int, total: int, summary_lines: List[str] | None = None) -> str:
+    """User message for one window: mission setup (and summary), context before, focus events, context after."""
+    sections = []
+    if setup_line:
+        sections.append(f"MISSION SETUP (context only, do not evaluate):\n{setup_line}")
+    if summary_lines:
+        sections.append("MISSION SUMMARY (context only, do not evaluate):\n" + "\n".join(summary_lines))
+    if window.before_lines:
+        sections.append("PRECEDING EVENTS (context only, do not evaluate):\n" + "\n".join(window.before_lines))
+    sections.append(f"EVENTS TO EVALUATE (window {index} of {total}, {window.time_range()}):\n" + "\n".join(window.focus_lines))
+    if window.after_lines:
+        sections.append("FOLLOWING EVENTS (context only, do not evaluate):\n" + "\n".join(window.after_lines))
+    return "\n\n".join(sections)
+
+
+def merge_window_feedback(window_outputs: List[str]) -> str:
+    """
+    Merges per-window feedback into one chronological list of TIME: blocks,
+    dropping exact duplicates from overlapping windows. Outputs without any
+    TIME: block (e.g. from a custom prompt) are kept verbatim.
+    """
+    blocks: List[str] = []
+    seen = set()
+    loose_text: List[str] = []
+    for output in window_outputs:
+        event_blocks = extract_event_blocks(output)
+        if not event_blocks and output.strip():
+            loose_text.append(output.strip())
+        for block in event_blocks:
+            if block not in seen:
+                seen.add(block)
+                blocks.append(block)
+    blocks.sort(key=block_seconds) # Stable, so blocks with equal times keep window order
+    return "\n\n".join(blocks + loose_text)
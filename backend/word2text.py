@@ -1,4 +1,11 @@
+from typing import List, Tuple
+
 from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+# (kind, heading level, text): kind is "heading", "text" or "table" (rows joined by newlines, cells by " | ")
+Block = Tuple[str, int, str]
 
 def word_to_text(docx_path: str) -> str:
     """
@@ -9,4 +16,46 @@ def word_to_text(docx_path: str) -> str:
     text = []
     for para in doc.paragraphs:
         text.append(para.text)
-    return '\n'.join(text) 
\ No newline at end of file
+    return '\n'.join(text)
+
+def heading_level(para: Paragraph) -> int:
+    """Heading level of a paragraph: from its Title/Heading N style, 1 for a short all-bold line, else 0."""
+    style = para.style.name if para.style is not None else ""
+    if style == "Title":
+        return 1
+    if style.startswith("Heading"):
+        level = style[len("Heading"):].strip()
+        return int(level) if level.isdigit() else 1
+    runs = [run for run in para.runs if run.text.strip()]
+    if runs and all(run.bold for run in runs) and len(para.text) <= 80:
+        return 1
+    return 0
+
+def docx_blocks(docx_path: str) -> List[Block]:
+    """
+    Paragraphs and tables of a Word (.docx) document in document order,
+    with headings marked, for chunking by section (see ttp_corpus).
+    """
+    doc = Document(docx_path)
+    blocks: List[Block] = []
+    for child in doc.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            para = Paragraph(child, doc)
+            text = para.text.strip()
+            if text:
+                level = heading_level(para)
+                blocks.append(("heading" if level else "text", level, text))
+        elif tag == "tbl":
+            rows = []
+            for row in Table(child, doc).rows:
+                cells = []
+                for cell in row.cells:
+                    text = cell.text.strip()
+                    if not cells or text != cells[-1]: # Merged cells repeat once per grid column
+                        cells.append(text)
+                if any(cells):
+                    rows.append(" | ".join(cells))
+            if rows:
+                blocks.append(("table", 0, "\n".join(rows)))
+    return blocks
@@ -18,9 +18,12 @@ const VideoModal: React.FC<VideoModalProps> = ({ isOpen, onClose, timestamp }) =
     return parseInt(hours) * 3600 + parseInt(minutes) * 60 + parseInt(seconds);
   };
 
+  const seekTime = parseTimestamp(timestamp);
+
+  // Seek as soon as the moov box is in: the backend serves Range requests, so
+  // the player then fetches only the bytes from the keyframe before seekTime
   const handleVideoLoad = (event: React.SyntheticEvent<HTMLVideoElement>) => {
     const video = event.currentTarget;
-    const seekTime = parseTimestamp(timestamp);
     video.currentTime = seekTime;
   };
 
@@ -30,8 +33,9 @@ const VideoModal: React.FC<VideoModalProps> = ({ isOpen, onClose, timestamp }) =
         <video
           className={styles.video}
           controls
-          onLoadedData={handleVideoLoad}
-          src="/video_000410.mp4"
+          preload="metadata"
+          onLoadedMetadata={handleVideoLoad}
+          src={`http://127.0.0.1:8000/videos/video_000410.mp4#t=${seekTime}`}
         />
       </div>
     </div>
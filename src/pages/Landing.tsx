@@ -61,11 +61,11 @@ const Landing = () => {
     setLogError(null);
 
     try {
-      // First API call - convert JSON to natural language
+      // Single API call - convert JSON to natural language and generate AI suggestions server-side
       const fileContent = await uploadedLogFile.file.text();
       const jsonData = JSON.parse(fileContent);
 
-      const response = await fetch("http://127.0.0.1:8000/json_to_nl_log", {
+      const response = await fetch("http://127.0.0.1:8000/debrief", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -73,39 +73,23 @@ const Landing = () => {
         },
         body: JSON.stringify({
           log_data: jsonData,
-        }),
-      });
-
-      if (!response.ok) {
-        throw new Error("Failed to convert log");
-      }
-
-      const nlLogData = await response.json();
-
-      // Second API call - generate AI suggestions
-      const newResponse = await fetch("http://127.0.0.1:8000/generate", {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Accept: "application/json",
-        },
-        body: JSON.stringify({
-          user_text: nlLogData.natural_language_log,
           system_prompt: "default",
+          structured: true,
         }),
       });
 
-      if (!newResponse.ok) {
-        throw new Error("Failed to generate suggestions");
+      if (!response.ok) {
+        throw new Error("Failed to generate debrief");
       }
 
-      const finalData = await newResponse.json();
+      const debriefData = await response.json();
       
       // Navigate to results page with data
       navigate('/results', { 
         state: { 
-          eventLog: nlLogData.natural_language_log,
-          aiFeedback: finalData.generated_text 
+          eventLog: debriefData.natural_language_log,
+          aiFeedback: debriefData.generated_text,
+          structuredFeedback: debriefData.feedback
         } 
       });
       
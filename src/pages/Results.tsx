@@ -2,7 +2,7 @@ import { useEffect, useState } from "react";
 import { useNavigate, useLocation } from "react-router-dom";
 import styles from "./Results.module.css";
 import { LogEntry, parseEventLog } from "../utils/parseEventLog";
-import { parseFeedback, FeedbackSummary } from "../utils/parseFeedback";
+import { parseFeedback, fromStructuredFeedback, FeedbackSummary } from "../utils/parseFeedback";
 import VideoModal from "../components/VideoModal";
 
 const Results = () => {
@@ -18,10 +18,13 @@ const Results = () => {
   // Get the data passed from Landing page
   const eventLog = location.state?.eventLog;
   const aiFeedback = location.state?.aiFeedback;
+  const structuredFeedback = location.state?.structuredFeedback;
   
-  // Parse the event log and feedback
+  // Parse the event log and feedback (structured feedback arrives already parsed)
   const logEntries = parseEventLog(eventLog);
-  const parsedFeedback: FeedbackSummary = parseFeedback(aiFeedback);
+  const parsedFeedback: FeedbackSummary = structuredFeedback
+    ? fromStructuredFeedback(structuredFeedback)
+    : parseFeedback(aiFeedback);
 
   const handleTimestampClick = (entry: LogEntry) => {
     // TODO: Implement video seeking logic here
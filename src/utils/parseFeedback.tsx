@@ -12,6 +12,22 @@ export interface FeedbackSummary {
   overallEvaluation?: string;
 }
 
+// Debrief as returned by the backend in structured mode (already validated server-side)
+export interface StructuredFeedback {
+  events: {
+    timestamp: string;
+    event: string;
+    evaluation: string;
+    rationale: string;
+    recommendation: string | null;
+    debrief_note: string;
+    flagged: boolean;
+  }[];
+  overall_assessment: string;
+  debrief_notes: string[];
+  processing_errors: string[];
+}
+
 const removeAnnotations = (text: string): string => {
   // Remove any text that matches the pattern "*(TEXT)*"
   return text.replace(/\*\([^)]*\)\*/g, '').trim();
@@ -88,4 +104,16 @@ export const parseFeedback = (feedbackText: string): FeedbackSummary => {
     debriefNotes: debriefNotes.length > 0 ? debriefNotes : undefined,
     overallEvaluation: overallEvaluation || undefined
   };
-}; 
\ No newline at end of file
+}; 
+
+export const fromStructuredFeedback = (feedback: StructuredFeedback): FeedbackSummary => ({
+  events: feedback.events.map((entry) => ({
+    timestamp: entry.timestamp,
+    event: removeAnnotations(entry.event),
+    evaluation: entry.evaluation,
+    rationale: entry.rationale,
+    recommendation: entry.recommendation ?? 'None',
+  })),
+  debriefNotes: feedback.debrief_notes.length > 0 ? feedback.debrief_notes : undefined,
+  overallEvaluation: feedback.overall_assessment || undefined,
+});